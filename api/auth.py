@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import hmac
+import base64
+import getpass
+import hashlib
+import secrets
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+# PBKDF2-HMAC-SHA256; deliberately slow, which is why verified headers are cached
+HASH_ALGORITHM = 'pbkdf2_sha256'
+DEFAULT_ITERATIONS = 310000
+SALT_BYTES = 16
+
+# Environment variable naming a users file, as an alternative to server.py --users-file
+USERS_FILE_ENV_VAR = 'MOMO_USERS_FILE'
+
+
+def hash_password(password: str, iterations: int = DEFAULT_ITERATIONS, salt: Optional[bytes] = None) -> str:
+    salt = salt or secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f'{HASH_ALGORITHM}${iterations}${salt.hex()}${digest.hex()}'
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    try:
+        algorithm, iterations, salt_hex, digest_hex = encoded.split('$')
+        if algorithm != HASH_ALGORITHM:
+            return False
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), bytes.fromhex(salt_hex), int(iterations))
+        return hmac.compare_digest(digest.hex(), digest_hex)
+    except ValueError:
+        return False
+
+
+class CredentialStore:
+    def verify(self, username: str, password: str) -> bool:
+        raise NotImplementedError
+
+
+class StaticCredentialStore(CredentialStore):
+    """A single hard-coded account; the default, matching the documented admin login."""
+
+    def __init__(self, username: str = 'admin', password: str = 'password123'):
+        self.username = username
+        self.password = password
+
+    def verify(self, username: str, password: str) -> bool:
+        # Evaluate both comparisons to avoid leaking which one failed through timing
+        username_ok = hmac.compare_digest(username.encode('utf-8'), self.username.encode('utf-8'))
+        password_ok = hmac.compare_digest(password.encode('utf-8'), self.password.encode('utf-8'))
+        return username_ok and password_ok
+
+
+class FileCredentialStore(CredentialStore):
+    """Users file with one `username:pbkdf2_sha256$iterations$salt$hash` line per user.
+
+    The file is re-read when its modification time changes, so users can be added
+    or removed without a restart.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._users: Dict[str, str] = {}
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+        self._reload_if_changed()
+
+    def _reload_if_changed(self):
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return
+        with self._lock:
+            self._users = read_users_file(self.path)
+            self._mtime_ns = mtime_ns
+
+    def verify(self, username: str, password: str) -> bool:
+        try:
+            self._reload_if_changed()
+        except OSError:
+            pass
+        encoded = self._users.get(username)
+        if encoded is None:
+            # Hash anyway so unknown users take as long as wrong passwords
+            hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), b'\0' * SALT_BYTES, DEFAULT_ITERATIONS)
+            return False
+        return verify_password(password, encoded)
+
+
+def read_users_file(path: str) -> Dict[str, str]:
+    users = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and ':' in line:
+                username, encoded = line.split(':', 1)
+                users[username] = encoded
+    return users
+
+
+def write_users_file(path: str, users: Dict[str, str]):
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        f.write('# MoMo SMS API users (username:pbkdf2_sha256$iterations$salt$hash)\n')
+        for username, encoded in sorted(users.items()):
+            f.write(f'{username}:{encoded}\n')
+    os.chmod(temporary_path, 0o600)
+    os.replace(temporary_path, path)
+
+
+class VerifiedCredentialCache:
+    """Bounded LRU of recently verified Authorization headers, each valid for ttl seconds.
+
+    Keys are SHA-256 digests of the header, so no plaintext password is kept around.
+    A removed user or changed password stops working within ttl seconds.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(auth_header: str) -> bytes:
+        return hashlib.sha256(auth_header.encode('utf-8')).digest()
+
+    def get(self, auth_header: str) -> Optional[str]:
+        key = self._key(auth_header)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __contains__(self, auth_header: str) -> bool:
+        # Peek without touching LRU order or hit/miss counters
+        entry = self._entries.get(self._key(auth_header))
+        return entry is not None and entry[1] >= time.monotonic()
+
+    def put(self, auth_header: str, username: str):
+        key = self._key(auth_header)
+        with self._lock:
+            self._entries[key] = (username, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Authenticator:
+    def __init__(self, credential_store: CredentialStore, cache: Optional[VerifiedCredentialCache] = None):
+        self.credential_store = credential_store
+        self.cache = cache if cache is not None else VerifiedCredentialCache()
+
+    def is_cached(self, auth_header: Optional[str]) -> bool:
+        return bool(auth_header) and auth_header in self.cache
+
+    def authenticate(self, auth_header: Optional[str]) -> Optional[str]:
+        # Returns the username for valid Basic credentials, otherwise None
+        if not auth_header or not auth_header.startswith('Basic '):
+            return None
+
+        username = self.cache.get(auth_header)
+        if username is not None:
+            return username
+
+        try:
+            decoded_credentials = base64.b64decode(auth_header[6:], validate=True).decode('utf-8')
+            username, password = decoded_credentials.split(':', 1)
+        except ValueError:
+            return None
+
+        if not self.credential_store.verify(username, password):
+            return None
+
+        self.cache.put(auth_header, username)
+        return username
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the MoMo SMS API users file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add_parser = subparsers.add_parser('add-user', help='Add a user or change their password')
+    add_parser.add_argument('users_file')
+    add_parser.add_argument('username')
+    add_parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS,
+                            help=f'PBKDF2 iterations (default: {DEFAULT_ITERATIONS})')
+    remove_parser = subparsers.add_parser('remove-user', help='Remove a user')
+    remove_parser.add_argument('users_file')
+    remove_parser.add_argument('username')
+    args = parser.parse_args()
+
+    users = read_users_file(args.users_file) if os.path.exists(args.users_file) else {}
+
+    if args.command == 'add-user':
+        if ':' in args.username:
+            sys.exit("Usernames cannot contain ':'")
+        password = getpass.getpass(f"Password for {args.username}: ")
+        if password != getpass.getpass("Repeat password: "):
+            sys.exit("Passwords do not match")
+        users[args.username] = hash_password(password, args.iterations)
+        print(f"User {args.username} saved to {args.users_file}")
+    else:
+        if users.pop(args.username, None) is None:
+            sys.exit(f"No such user: {args.username}")
+        print(f"User {args.username} removed from {args.users_file}")
+
+    write_users_file(args.users_file, users)
+
+
+if __name__ == "__main__":
+    main()
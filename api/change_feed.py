@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+import json
+import time
+import socket
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+
+# How often the broadcaster retries sockets that could not take all their data
+BACKLOG_RETRY_INTERVAL = 0.05
+
+
+class _Subscriber:
+    __slots__ = ('connection', 'last_id', 'backlog', 'stalled_since')
+
+    def __init__(self, connection: socket.socket, last_id: int):
+        self.connection = connection
+        self.last_id = last_id
+        # Encoded events the socket has not taken yet, and since when it has had any
+        self.backlog = bytearray()
+        self.stalled_since: Optional[float] = None
+
+
+class ChangeFeed:
+    """Server-Sent Events fan-out of store changes with a replay buffer.
+
+    Event ids are the store's change version, which every pre-fork worker
+    replays in the same order, so a client can resume on any worker with
+    Last-Event-ID as long as the id is still in the ring buffer. A single
+    broadcaster thread writes to all subscriber sockets without blocking, so
+    open streams do not hold request worker threads and a slow client does
+    not hold up the others: what its socket cannot take is buffered, and it
+    is dropped once that buffer passes max_backlog bytes or has not drained
+    for send_timeout seconds. It resumes by reconnecting.
+    """
+
+    def __init__(self, store, capacity: int = 1024, max_subscribers: int = 1000,
+                 heartbeat_interval: float = 15.0, poll_interval: float = 0.5, send_timeout: float = 2.0,
+                 max_backlog: int = 1 << 20):
+        self.store = store
+        self.max_subscribers = max_subscribers
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.send_timeout = send_timeout
+        self.max_backlog = max_backlog
+        self._events: deque = deque(maxlen=capacity)
+        self._subscribers: List[_Subscriber] = []
+        # Places taken by reserve() for streams whose headers are still being sent
+        self._reserved = 0
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        # Set by retire(): the event id clients should resume from on the replacement feed
+        self._retired_at: Optional[int] = None
+        store.add_listener(self.publish)
+
+    def publish(self, op: str, transaction: Dict[str, Any]):
+        # Called with the store lock held: encode now (the dict may change later), send elsewhere
+        event_id = self.store.version
+        payload = json.dumps({'op': op, 'transaction': transaction})
+        event = f'id: {event_id}\nevent: {op}\ndata: {payload}\n\n'.encode('utf-8')
+        with self._condition:
+            self._events.append((event_id, event))
+            self._condition.notify()
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def reserve(self) -> bool:
+        # Takes a place for a new stream before its response is started; False when the feed is full.
+        # Follow with subscribe(), or release() if the stream is not opened after all
+        with self._condition:
+            if len(self._subscribers) + self._reserved >= self.max_subscribers:
+                return False
+            self._reserved += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._reserved -= 1
+
+    def subscribe(self, connection: socket.socket, last_event_id: Optional[int] = None):
+        # Takes over a connection, in the place taken by reserve(), whose response headers have been sent
+        connection.settimeout(self.send_timeout)
+        # The store lock orders this against publish, so no change falls between snapshot and stream
+        with self.store._lock, self._condition:
+            self._reserved -= 1
+            if self._retired_at is not None:
+                # Picked up just before the store was replaced; send the client to the new feed
+                self._send(connection, self._reset_event(self._retired_at))
+                self._close(connection)
+                return
+            current = self.store.version
+            resumable = last_event_id is None or self._can_resume(last_event_id, current)
+            subscriber = _Subscriber(connection, current if last_event_id is None or not resumable else last_event_id)
+
+        if not resumable:
+            # The gap is no longer buffered (or the id predates a restart): tell the client to refetch
+            if not self._send(connection, self._reset_event(current)):
+                self._close(connection)
+                return
+
+        # From here on only the broadcaster writes to it, never blocking
+        connection.setblocking(False)
+        with self._condition:
+            self._subscribers.append(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._broadcast, name='change-feed', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def retire(self, next_event_id: int):
+        # The store was replaced (e.g. the data file was reloaded): every open stream gets a
+        # reset pointing at next_event_id and is closed, so clients refetch and reconnect
+        with self._condition:
+            self._retired_at = next_event_id
+            subscribers, self._subscribers = self._subscribers, []
+            self._condition.notify()
+        if self._thread is None:
+            return
+        # The broadcaster may be writing to these sockets; let it finish its round first
+        self._thread.join()
+        for subscriber in subscribers:
+            subscriber.connection.settimeout(self.send_timeout)
+            self._send(subscriber.connection, bytes(subscriber.backlog) + self._reset_event(next_event_id))
+            self._close(subscriber.connection)
+
+    @staticmethod
+    def _reset_event(event_id: int) -> bytes:
+        return f'id: {event_id}\nevent: reset\ndata: {{}}\n\n'.encode('utf-8')
+
+    def _can_resume(self, last_event_id: int, current: int) -> bool:
+        if last_event_id > current:
+            return False
+        if last_event_id == current:
+            return True
+        return bool(self._events) and self._events[0][0] <= last_event_id + 1
+
+    def _broadcast(self):
+        last_sent = time.monotonic()
+        while True:
+            # Replica stores only learn about other workers' writes when refreshed
+            self.store.refresh()
+            with self._condition:
+                if self._retired_at is not None:
+                    return
+                if not self._pending():
+                    backlogged = any(subscriber.backlog for subscriber in self._subscribers)
+                    self._condition.wait(BACKLOG_RETRY_INTERVAL if backlogged else self.poll_interval)
+                if self._retired_at is not None:
+                    return
+                events = list(self._events)
+                subscribers = list(self._subscribers)
+
+            now = time.monotonic()
+            heartbeat = now - last_sent >= self.heartbeat_interval
+            dropped = []
+            for subscriber in subscribers:
+                chunks = [event for event_id, event in events if event_id > subscriber.last_id]
+                if chunks:
+                    subscriber.backlog += b''.join(chunks)
+                    subscriber.last_id = events[-1][0]
+                elif heartbeat and not subscriber.backlog:
+                    subscriber.backlog += b': keep-alive\n\n'
+                if not subscriber.backlog:
+                    continue
+                if not self._flush(subscriber) or len(subscriber.backlog) > self.max_backlog:
+                    dropped.append(subscriber)
+                elif not subscriber.backlog:
+                    subscriber.stalled_since = None
+                elif subscriber.stalled_since is None:
+                    subscriber.stalled_since = now
+                elif now - subscriber.stalled_since > self.send_timeout:
+                    dropped.append(subscriber)
+            if heartbeat:
+                last_sent = now
+
+            if dropped:
+                with self._condition:
+                    for subscriber in dropped:
+                        if subscriber in self._subscribers:
+                            self._subscribers.remove(subscriber)
+                for subscriber in dropped:
+                    self._close(subscriber.connection)
+
+    def _pending(self) -> bool:
+        if not self._events:
+            return False
+        newest = self._events[-1][0]
+        return any(subscriber.last_id < newest for subscriber in self._subscribers)
+
+    @staticmethod
+    def _flush(subscriber: _Subscriber) -> bool:
+        # Writes as much of the backlog as the socket takes right now; False if the client is gone
+        try:
+            while subscriber.backlog:
+                sent = subscriber.connection.send(subscriber.backlog)
+                del subscriber.backlog[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            return False
+        return True
+
+    @staticmethod
+    def _send(connection: socket.socket, data: bytes) -> bool:
+        # Blocking write with the connection's send_timeout, outside the broadcaster
+        try:
+            connection.sendall(data)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _close(connection: socket.socket):
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        connection.close()
+
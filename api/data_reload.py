@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import os
+import threading
+from typing import Callable, Optional, Tuple
+
+
+class DataFileWatcher:
+    """Polls a file's identity and calls on_change(path) on a background thread when it changes.
+
+    The identity is (device, inode, size, mtime), so both in-place rewrites and
+    a new file renamed over the old one are noticed. A change is only reported
+    once two consecutive polls agree, so a file that is still being copied in
+    is not read half-written.
+    """
+
+    def __init__(self, path: str, on_change: Callable[[str], None], interval: float = 2.0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _signature(self) -> Optional[Tuple[int, int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='data-file-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        current = self._signature()
+        pending = None
+        while not self._stopped.wait(self.interval):
+            signature = self._signature()
+            if signature is None or signature == current:
+                pending = None
+                continue
+            if signature != pending:
+                # Changed since the last poll; wait until it holds still
+                pending = signature
+                continue
+            current, pending = signature, None
+            try:
+                self.on_change(self.path)
+            except Exception as e:
+                print(f"Reloading {self.path} failed: {e}")
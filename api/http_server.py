@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+import json
+import time
+import queue
+import socket
+import selectors
+import threading
+from http.server import HTTPServer
+
+from metrics import metrics  # pyright: ignore[reportMissingImports]
+
+
+# A shed connection is kept open this long after its 503, reading what the client still sends,
+# so closing it with unread request bytes does not reset the connection before the 503 is read
+SHED_LINGER_SECONDS = 1.0
+# Beyond this many lingering connections, new shed connections are closed right after their 503
+MAX_LINGERING = 256
+
+
+class BoundedThreadingHTTPServer(HTTPServer):
+    """HTTP server with a fixed worker pool and a bounded queue of accepted connections.
+
+    When the queue is full, or a connection waited longer than max_queue_wait,
+    the client gets an immediate 503 with Retry-After instead of joining an
+    ever-growing backlog, so latency for admitted requests stays bounded.
+    Shedding never blocks: the 503 is written without waiting on the client,
+    and a single background thread drains and closes shed connections.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, max_workers: int = 16, queue_size: int = 64,
+                 max_queue_wait: float = 5.0, request_timeout: float = 30.0, listen_backlog: int = 128, bind_and_activate: bool = True):
+        self.max_workers = max_workers
+        self.max_queue_wait = max_queue_wait
+        self.request_timeout = request_timeout
+        self.request_queue_size = listen_backlog
+        self.pending = queue.Queue(maxsize=queue_size)
+        self._detached = set()
+        # Shed connections handed to the linger thread, and those it is draining (socket -> deadline)
+        self._lingering = queue.Queue()
+        self._linger_deadlines = {}
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+        self._workers = []
+        for index in range(max_workers):
+            worker = threading.Thread(target=self._work, name=f'http-worker-{index}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        threading.Thread(target=self._linger, name='http-shed', daemon=True).start()
+
+        metrics.register_gauge('momo_http_queue_depth', 'Accepted connections waiting for a worker.',
+                               self.pending.qsize)
+
+    def process_request(self, request, client_address):
+        try:
+            self.pending.put_nowait((request, client_address, time.monotonic()))
+        except queue.Full:
+            self._shed(request, 'queue_full')
+
+    def _work(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            request, client_address, accepted_at = item
+            if time.monotonic() - accepted_at > self.max_queue_wait:
+                # The client has most likely given up already; don't spend a worker on it
+                self._shed(request, 'queue_timeout')
+                continue
+            try:
+                # Idle or very slow clients must not pin a worker indefinitely
+                request.settimeout(self.request_timeout)
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def detach(self, request):
+        # The handler handed the connection to something else (e.g. a stream); don't close it
+        self._detached.add(request)
+
+    def shutdown_request(self, request):
+        if request in self._detached:
+            self._detached.discard(request)
+            return
+        super().shutdown_request(request)
+
+    def _shed(self, request, reason: str, retry_after: int = 1):
+        metrics.record_shed(reason)
+        body = json.dumps({
+            "success": False,
+            "error": {"code": "HTTP_503", "message": "Server is over capacity, please retry later"}
+        }).encode('utf-8')
+        response = (f'HTTP/1.0 503 Service Unavailable\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(body)}\r\n'
+                    f'Retry-After: {retry_after}\r\n'
+                    f'Connection: close\r\n\r\n').encode('latin-1') + body
+        # Called on the accept thread when the queue is full, so nothing here may wait on the client
+        try:
+            request.setblocking(False)
+            self._discard_input(request)
+            request.send(response)
+            request.shutdown(socket.SHUT_WR)
+        except OSError:
+            request.close()
+            return
+        if len(self._linger_deadlines) + self._lingering.qsize() >= MAX_LINGERING:
+            request.close()
+            return
+        self._lingering.put((request, time.monotonic() + SHED_LINGER_SECONDS))
+
+    @staticmethod
+    def _discard_input(request) -> bool:
+        # Reads what has arrived without blocking; True once the client has closed its side
+        while True:
+            try:
+                if not request.recv(65536):
+                    return True
+            except BlockingIOError:
+                return False
+
+    def _linger(self):
+        # Drains shed connections until the client closes them or their deadline passes
+        selector = selectors.DefaultSelector()
+        deadlines = self._linger_deadlines
+        while True:
+            while True:
+                try:
+                    item = self._lingering.get(block=not deadlines)
+                except queue.Empty:
+                    break
+                if item is None:
+                    for request in deadlines:
+                        request.close()
+                    selector.close()
+                    return
+                request, deadline = item
+                deadlines[request] = deadline
+                selector.register(request, selectors.EVENT_READ)
+            done = {key.fileobj for key, _ in selector.select(timeout=0.05) if self._closed_by_client(key.fileobj)}
+            now = time.monotonic()
+            done.update(request for request, deadline in deadlines.items() if deadline <= now)
+            for request in done:
+                selector.unregister(request)
+                del deadlines[request]
+                request.close()
+
+    def _closed_by_client(self, request) -> bool:
+        try:
+            return self._discard_input(request)
+        except OSError:
+            return True
+
+    def server_close(self):
+        super().server_close()
+        self._lingering.put(None)
+        for _ in self._workers:
+            try:
+                self.pending.put_nowait(None)
+            except queue.Full:
+                break
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import time
+import threading
+from typing import Dict, Any, Callable, List, Tuple
+
+
+# Log-linear (HDR-style) buckets: every power of two is split into 2**SUB_BUCKET_BITS
+# equal sub-buckets, so any recorded value is within 1/16 (6.25%) of its bucket
+SUB_BUCKET_BITS = 4
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+MAX_BUCKETS = 64 * SUB_BUCKET_COUNT
+
+# Prometheus `le` boundaries (seconds) the fine-grained buckets are folded into
+PROMETHEUS_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+PROMETHEUS_QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+
+def bucket_index(value: int) -> int:
+    if value < SUB_BUCKET_COUNT:
+        return max(0, value)
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKET_COUNT
+
+
+def bucket_upper_bound(index: int) -> int:
+    # Exclusive upper bound of the values stored in a bucket
+    octave = index >> SUB_BUCKET_BITS
+    if octave == 0:
+        return index + 1
+    shift = octave - 1
+    top = (index & (SUB_BUCKET_COUNT - 1)) + SUB_BUCKET_COUNT
+    return (top + 1) << shift
+
+
+class LatencyHistogram:
+    """Fixed-memory latency histogram over integer nanoseconds."""
+
+    __slots__ = ('counts', 'count', 'total', 'max_value')
+
+    def __init__(self):
+        self.counts = [0] * MAX_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max_value = 0
+
+    def record(self, value_ns: int):
+        self.counts[bucket_index(value_ns)] += 1
+        self.count += 1
+        self.total += value_ns
+        if value_ns > self.max_value:
+            self.max_value = value_ns
+
+    def percentile(self, fraction: float) -> int:
+        if not self.count:
+            return 0
+        target = max(1, int(round(fraction * self.count)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(bucket_upper_bound(index) - 1, self.max_value)
+        return self.max_value
+
+    def cumulative_counts(self, boundaries_ns: List[int]) -> List[int]:
+        # Counts of values <= each boundary, for Prometheus histogram buckets
+        results = []
+        seen = 0
+        index = 0
+        for boundary in boundaries_ns:
+            while index < MAX_BUCKETS and bucket_upper_bound(index) - 1 <= boundary:
+                seen += self.counts[index]
+                index += 1
+            results.append(seen)
+        return results
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests_in_flight = 0
+        self.latency: Dict[Tuple[str, str, int], LatencyHistogram] = {}
+        self.response_bytes: Dict[Tuple[str, str, int], int] = {}
+        self.gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self.counters: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self.shed: Dict[str, int] = {}
+
+    def request_started(self):
+        with self._lock:
+            self.requests_in_flight += 1
+
+    def request_finished(self, method: str, route: str, status: int, duration_ns: int, bytes_written: int):
+        key = (method, route, status)
+        with self._lock:
+            self.requests_in_flight -= 1
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = LatencyHistogram()
+                self.response_bytes[key] = 0
+            histogram.record(duration_ns)
+            self.response_bytes[key] += bytes_written
+
+    def record_shed(self, reason: str):
+        # Connections rejected before reaching a handler, e.g. because the queue was full
+        with self._lock:
+            self.shed[reason] = self.shed.get(reason, 0) + 1
+
+    def register_gauge(self, name: str, help_text: str, func: Callable[[], float]):
+        self.gauges[name] = (help_text, func)
+
+    def register_counter(self, name: str, help_text: str, func: Callable[[], float]):
+        # func returns a running total that only goes up (or resets with the process); name ends in _total
+        self.counters[name] = (help_text, func)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': self.requests_in_flight,
+                'latency': {key: self._copy(histogram) for key, histogram in self.latency.items()},
+                'response_bytes': dict(self.response_bytes),
+                'shed': dict(self.shed)
+            }
+
+    @staticmethod
+    def _copy(histogram: LatencyHistogram) -> LatencyHistogram:
+        copy = LatencyHistogram()
+        copy.counts = list(histogram.counts)
+        copy.count = histogram.count
+        copy.total = histogram.total
+        copy.max_value = histogram.max_value
+        return copy
+
+    def render_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        boundaries_ns = [int(b * 1e9) for b in PROMETHEUS_BUCKETS]
+        lines = []
+
+        lines.append('# HELP momo_http_request_duration_seconds HTTP request latency by route and status.')
+        lines.append('# TYPE momo_http_request_duration_seconds histogram')
+        for (method, route, status), histogram in sorted(snapshot['latency'].items()):
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            for boundary, cumulative in zip(PROMETHEUS_BUCKETS, histogram.cumulative_counts(boundaries_ns)):
+                lines.append(f'momo_http_request_duration_seconds_bucket{{{labels},le="{boundary}"}} {cumulative}')
+            lines.append(f'momo_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'momo_http_request_duration_seconds_sum{{{labels}}} {histogram.total / 1e9:.9f}')
+            lines.append(f'momo_http_request_duration_seconds_count{{{labels}}} {histogram.count}')
+
+        lines.append('# HELP momo_http_request_latency_seconds HTTP request latency quantiles from the HDR histogram.')
+        lines.append('# TYPE momo_http_request_latency_seconds gauge')
+        for (method, route, status), histogram in sorted(snapshot['latency'].items()):
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            for quantile in PROMETHEUS_QUANTILES:
+                value = histogram.percentile(quantile) / 1e9
+                lines.append(f'momo_http_request_latency_seconds{{{labels},quantile="{quantile}"}} {value:.9f}')
+
+        lines.append('# HELP momo_http_response_bytes_total Response body bytes written.')
+        lines.append('# TYPE momo_http_response_bytes_total counter')
+        for (method, route, status), written in sorted(snapshot['response_bytes'].items()):
+            lines.append(f'momo_http_response_bytes_total{{method="{method}",route="{route}",status="{status}"}} {written}')
+
+        lines.append('# HELP momo_http_requests_shed_total Connections answered with 503 before reaching a handler.')
+        lines.append('# TYPE momo_http_requests_shed_total counter')
+        for reason, count in sorted(snapshot['shed'].items()):
+            lines.append(f'momo_http_requests_shed_total{{reason="{reason}"}} {count}')
+
+        lines.append('# HELP momo_http_requests_in_flight Requests currently being handled.')
+        lines.append('# TYPE momo_http_requests_in_flight gauge')
+        lines.append(f'momo_http_requests_in_flight {snapshot["in_flight"]}')
+
+        lines.append('# HELP momo_process_start_time_seconds Start time of the process since the Unix epoch.')
+        lines.append('# TYPE momo_process_start_time_seconds gauge')
+        lines.append(f'momo_process_start_time_seconds {self.started_at:.3f}')
+
+        for name, (help_text, func) in sorted(self.gauges.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {func()}')
+
+        for name, (help_text, func) in sorted(self.counters.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name} {func()}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry shared by all request handlers
+metrics = MetricsRegistry()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+import os
+import gc
+import sys
+import json
+import socket
+import shutil
+import signal
+import secrets
+import tempfile
+import threading
+from http.server import HTTPServer
+from multiprocessing.connection import Listener, Client
+from typing import Dict, Any, Optional, Callable
+
+# Add the dsa directory to the path to import our modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dsa'))
+
+from transaction_store import TransactionStore, DuplicateReferenceError, StoreBusyError  # pyright: ignore[reportMissingImports]
+
+
+class ChangeJournal:
+    """Append-only NDJSON log of store changes, written by the owner and tailed by workers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def append(self, op: str, transaction: Dict[str, Any]):
+        # One write per line so readers never see a torn record followed by more data
+        self._file.write(json.dumps({'op': op, 'transaction': transaction}) + '\n')
+        self._file.flush()
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+class WriteOwner:
+    """Applies every write on the authoritative store; workers reach it over a local socket."""
+
+    def __init__(self, store: TransactionStore, address: str, authkey: bytes):
+        self.store = store
+        self.listener = Listener(address, family='AF_UNIX', authkey=authkey)
+
+    def serve_forever(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def _serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    return
+                connection.send(self._execute(request))
+
+    def _execute(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            op = request['op']
+            if op == 'create':
+                return {'id': self.store.create(request['data'])['id']}
+            if op == 'update':
+                transaction = self.store.update(request['transaction_id'], request['changes'])
+                return {'id': transaction['id'] if transaction else None}
+            if op == 'delete':
+                return {'transaction': self.store.delete(request['transaction_id'])}
+            return {'error': 'internal', 'message': f"Unknown operation: {op}"}
+        except DuplicateReferenceError as e:
+            return {'error': 'duplicate_reference', 'reference': e.reference, 'existing_id': e.existing_id}
+        except StoreBusyError as e:
+            return {'error': 'busy', 'message': str(e), 'retry_after': e.retry_after}
+        except ValueError as e:
+            return {'error': 'invalid', 'message': str(e)}
+        except Exception as e:
+            return {'error': 'internal', 'message': str(e)}
+
+    def close(self):
+        self.listener.close()
+
+
+class ReplicaStore(TransactionStore):
+    """Worker-side store: reads from the forked copy, writes go through the owner.
+
+    Changes are picked up from the owner's journal before each request (one fstat
+    when nothing changed) and right after this worker's own writes.
+    """
+
+    def __init__(self, source: TransactionStore, journal_path: str, journal_offset: int,
+                 owner_address: str, authkey: bytes):
+        # Share the forked indexes copy-on-write instead of rebuilding them
+        self.search_engine = source.search_engine
+        # The forked indexes may hold the source store's lock (e.g. time segments built in the parent), so
+        # this store must write under that same lock. It is free in the child: the fork ran while holding it
+        self._lock = source._lock
+        self._next_id = source._next_id
+        self._listeners = []
+        self._write_gates = []
+        self.version = source.version
+
+        self._journal = open(journal_path, 'rb')
+        self._journal.seek(journal_offset)
+        self._journal_offset = journal_offset
+        self._owner_address = owner_address
+        self._authkey = authkey
+        self._connection = None
+        self._rpc_lock = threading.Lock()
+
+    def refresh(self):
+        if os.fstat(self._journal.fileno()).st_size == self._journal_offset:
+            return
+        with self._lock:
+            while True:
+                line = self._journal.readline()
+                if not line.endswith(b'\n'):
+                    # Partial line still being written; re-read it next time
+                    self._journal.seek(self._journal_offset)
+                    break
+                self._journal_offset += len(line)
+                change = json.loads(line)
+                self.apply_change(change['op'], change['transaction'])
+
+    def _call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        with self._rpc_lock:
+            if self._connection is None:
+                self._connection = Client(self._owner_address, family='AF_UNIX', authkey=self._authkey)
+            try:
+                self._connection.send(request)
+                reply = self._connection.recv()
+            except (EOFError, OSError):
+                self._connection = None
+                raise
+
+        error = reply.get('error')
+        if error == 'duplicate_reference':
+            raise DuplicateReferenceError(reply['reference'], reply['existing_id'])
+        if error == 'invalid':
+            raise ValueError(reply['message'])
+        if error == 'busy':
+            raise StoreBusyError(reply['message'], reply['retry_after'])
+        if error:
+            raise RuntimeError(reply['message'])
+
+        # Read-your-writes: the owner journals a change before replying
+        self.refresh()
+        return reply
+
+    def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self.get(self._call({'op': 'create', 'data': data})['id'])
+
+    def update(self, transaction_id: int, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        reply = self._call({'op': 'update', 'transaction_id': transaction_id, 'changes': changes})
+        return self.get(reply['id']) if reply['id'] is not None else None
+
+    def delete(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        return self._call({'op': 'delete', 'transaction_id': transaction_id})['transaction']
+
+
+class ReusePortMixin:
+    # Every worker binds its own socket to the same port; the kernel balances connections
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def _run_worker(handler_class, server_class, server_options: Dict[str, Any], port: int, replica: ReplicaStore,
+                warm_up: Optional[Callable[[], None]] = None):
+    handler_class.use_store(replica)
+    if warm_up is not None:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    server = type(f'ReusePort{server_class.__name__}', (ReusePortMixin, server_class), {})
+    httpd = server(('', port), handler_class, **server_options)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def serve_prefork(handler_class, port: int, processes: int, server_class=HTTPServer,
+                  server_options: Optional[Dict[str, Any]] = None,
+                  worker_warm_up: Optional[Callable[[], None]] = None):
+    # worker_warm_up runs in each worker on a background thread once it serves from its replica store
+    if not hasattr(os, 'fork') or not hasattr(socket, 'SO_REUSEPORT'):
+        print("Pre-fork mode needs os.fork and SO_REUSEPORT (Linux/BSD/macOS)")
+        return
+
+    # Load once in the parent, which stays the single owner of all writes
+    store = handler_class.get_store()
+    workdir = tempfile.mkdtemp(prefix='momo-prefork-')
+    journal = ChangeJournal(os.path.join(workdir, 'changes.ndjson'))
+    store.add_listener(journal.append)
+
+    owner_address = os.path.join(workdir, 'owner.sock')
+    authkey = secrets.token_bytes(32)
+    owner = WriteOwner(store, owner_address, authkey)
+    threading.Thread(target=owner.serve_forever, daemon=True).start()
+
+    # Keep the loaded objects out of GC passes so workers do not un-share their pages
+    gc.freeze()
+
+    workers: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int):
+        # Fork under the store lock so the journal offset matches the copied data
+        sys.stdout.flush()
+        sys.stderr.flush()
+        with store._lock:
+            offset = journal.tell()
+            pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                replica = ReplicaStore(store, journal.path, offset, owner_address, authkey)
+                _run_worker(handler_class, server_class, server_options or {}, port, replica, worker_warm_up)
+            except Exception as e:
+                print(f"Worker {index} failed: {e}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        workers[pid] = index
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # Workers inherit this too, so SIGTERM shuts everything down cleanly
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(processes):
+        spawn(index)
+    print(f"MoMo SMS API Server running on port {port} with {processes} worker processes")
+
+    try:
+        while workers:
+            pid, status = os.wait()
+            index = workers.pop(pid, None)
+            if index is not None and not stopping:
+                print(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+                spawn(index)
+    except KeyboardInterrupt:
+        stopping = True
+        print("\nServer stopped.")
+    finally:
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(workers):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        owner.close()
+        journal.close()
+        shutil.rmtree(workdir, ignore_errors=True)
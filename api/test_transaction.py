@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
+import os
+import time
+import sqlite3
 import requests
 from requests.auth import HTTPBasicAuth
+from concurrent.futures import ThreadPoolExecutor
 
 def test_api():
     base_url = "http://localhost:8000"
@@ -63,6 +67,60 @@ def test_api():
         print(f"❌ GET transactions without auth - Error: {e}")
         failed += 1
     
+    try:
+        response = requests.get(f"{base_url}/transactions?per_page=5&fields=id,amount,timestamp", auth=auth)
+        rows = response.json().get('data', {}).get('transactions', [])
+        if response.status_code == 200 and rows and all(set(row) == {'id', 'amount', 'timestamp'} for row in rows):
+            print("✅ GET transactions with field projection")
+            passed += 1
+        else:
+            print(f"❌ GET transactions with field projection - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET transactions with field projection - Error: {e}")
+        failed += 1
+    
+    try:
+        response = requests.get(f"{base_url}/transactions?sort=-amount&per_page=5", auth=auth)
+        amounts = [t['amount'] for t in response.json().get('data', {}).get('transactions', [])]
+        if response.status_code == 200 and amounts and amounts == sorted(amounts, reverse=True):
+            print("✅ GET transactions sorted by amount")
+            passed += 1
+        else:
+            print(f"❌ GET transactions sorted by amount - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET transactions sorted by amount - Error: {e}")
+        failed += 1
+    
+    try:
+        response = requests.get(f"{base_url}/transactions?from=2024-09-16&to=2024-09-17&per_page=100", auth=auth)
+        timestamps = [t['timestamp'] for t in response.json().get('data', {}).get('transactions', [])]
+        if response.status_code == 200 and timestamps and all('2024-09-16' <= ts < '2024-09-18' for ts in timestamps):
+            print("✅ GET transactions in a time window")
+            passed += 1
+        else:
+            print(f"❌ GET transactions in a time window - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET transactions in a time window - Error: {e}")
+        failed += 1
+
+    try:
+        response = requests.get(f"{base_url}/transactions?type=Payment&min_amount=1000&explain=1", auth=auth)
+        data = response.json().get('data', {})
+        plan = data.get('plan', {})
+        if response.status_code == 200 and plan.get('driving_index') and \
+                all(t['type'] == 'Payment' and t['amount'] >= 1000 for t in data.get('transactions', [])):
+            print("✅ GET filtered transactions with explain")
+            passed += 1
+        else:
+            print(f"❌ GET filtered transactions with explain - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET filtered transactions with explain - Error: {e}")
+        failed += 1
+
     # GET /transactions/{id} tests
     print("\nGET /transactions/{id} Tests:")
     try:
@@ -113,6 +171,32 @@ def test_api():
         print(f"❌ GET transaction with edge case ID - Error: {e}")
         failed += 1
     
+    # GET /transactions/by-reference/{ref} tests
+    print("\nGET /transactions/by-reference/{ref} Tests:")
+    try:
+        response = requests.get(f"{base_url}/transactions/by-reference/TXN001234567", auth=auth)
+        if response.status_code == 200 and response.json()['data']['transaction']['reference'] == 'TXN001234567':
+            print("✅ GET transaction by reference")
+            passed += 1
+        else:
+            print(f"❌ GET transaction by reference - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET transaction by reference - Error: {e}")
+        failed += 1
+    
+    try:
+        response = requests.get(f"{base_url}/transactions/by-reference/TXN_DOES_NOT_EXIST", auth=auth)
+        if response.status_code == 404:
+            print("✅ GET transaction by unknown reference")
+            passed += 1
+        else:
+            print(f"❌ GET transaction by unknown reference - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET transaction by unknown reference - Error: {e}")
+        failed += 1
+    
     # POST /transactions tests
     print("\nPOST /transactions Tests:")
     try:
@@ -128,6 +212,19 @@ def test_api():
         print(f"❌ POST valid transaction - Error: {e}")
         failed += 1
     
+    try:
+        data = {"type": "Transfer", "amount": 1000, "sender": "+250788123456", "receiver": "+250789234567", "reference": "TXN001234567"}
+        response = requests.post(f"{base_url}/transactions", json=data, auth=auth)
+        if response.status_code == 409:
+            print("✅ POST transaction with duplicate reference")
+            passed += 1
+        else:
+            print(f"❌ POST transaction with duplicate reference - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ POST transaction with duplicate reference - Error: {e}")
+        failed += 1
+    
     try:
         data = {"type": "Transfer", "amount": 1000}  # Missing sender and receiver
         response = requests.post(f"{base_url}/transactions", json=data, auth=auth)
@@ -207,6 +304,22 @@ def test_api():
         print(f"❌ PUT update with invalid data - Error: {e}")
         failed += 1
     
+    try:
+        # Builds the timestamp sorted index first, so a bad value would have to be reindexed
+        requests.get(f"{base_url}/transactions?sort=timestamp&per_page=1", auth=auth)
+        before = requests.get(f"{base_url}/transactions/1", auth=auth).json()['data']['transaction']
+        response = requests.put(f"{base_url}/transactions/1", json={"timestamp": 5}, auth=auth)
+        after = requests.get(f"{base_url}/transactions/1", auth=auth).json()['data']['transaction']
+        if response.status_code == 400 and after['timestamp'] == before['timestamp']:
+            print("✅ PUT update with invalid timestamp")
+            passed += 1
+        else:
+            print(f"❌ PUT update with invalid timestamp - Status: {response.status_code}, timestamp: {after['timestamp']}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ PUT update with invalid timestamp - Error: {e}")
+        failed += 1
+    
     try:
         data = {}
         response = requests.put(f"{base_url}/transactions/1", json=data, auth=auth)
@@ -277,7 +390,176 @@ def test_api():
     except Exception as e:
         print(f"❌ DELETE transaction with edge case ID - Error: {e}")
         failed += 1
+
+    # Multi-get and batch query tests
+    print("\nMulti-get and Batch Query Tests:")
+    try:
+        response = requests.get(f"{base_url}/transactions?ids=2,1,999999", auth=auth)
+        data = response.json().get('data', {})
+        if response.status_code == 200 and [t['id'] for t in data.get('transactions', [])] == [2, 1] \
+                and data.get('missing') == [999999]:
+            print("✅ GET transactions by ids")
+            passed += 1
+        else:
+            print(f"❌ GET transactions by ids - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET transactions by ids - Error: {e}")
+        failed += 1
+    
+    try:
+        queries = [{"ids": [1]}, {"filter": {"type": "Transfer"}, "aggregate": ["count", "sum"]}, {"filter": {"bogus": 1}}]
+        response = requests.post(f"{base_url}/query/batch", json={"queries": queries}, auth=auth)
+        results = response.json().get('data', {}).get('results', [])
+        if response.status_code == 200 and [r['success'] for r in results] == [True, True, False]:
+            print("✅ POST batch query")
+            passed += 1
+        else:
+            print(f"❌ POST batch query - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ POST batch query - Error: {e}")
+        failed += 1
+
+    # GET /analytics tests
+    print("\nGET /analytics Tests:")
+    try:
+        response = requests.get(f"{base_url}/analytics?quantiles=0.5,0.95", auth=auth)
+        total = response.json().get('data', {}).get('total', {})
+        if response.status_code == 200 and total.get('count', 0) > 0 and set(total.get('amount_quantiles', {})) == {'0.5', '0.95'}:
+            print("✅ GET analytics summary")
+            passed += 1
+        else:
+            print(f"❌ GET analytics summary - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET analytics summary - Error: {e}")
+        failed += 1
+
+    # GET /accounts/{number} graph tests
+    print("\nGET /accounts/{number} Tests:")
+    try:
+        response = requests.get(f"{base_url}/accounts/%2B250788123456/counterparties?limit=5", auth=auth)
+        counterparties = response.json().get('data', {}).get('counterparties', [])
+        if response.status_code == 200 and counterparties:
+            print("✅ GET top counterparties")
+            passed += 1
+        else:
+            print(f"❌ GET top counterparties - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET top counterparties - Error: {e}")
+        failed += 1
+    
+    try:
+        response = requests.get(f"{base_url}/accounts/%2B250788123456/balance?at=2024-12-31T23:59:59Z", auth=auth)
+        if response.status_code == 200 and 'balance' in response.json()['data']:
+            print("✅ GET account balance at timestamp")
+            passed += 1
+        else:
+            print(f"❌ GET account balance at timestamp - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET account balance at timestamp - Error: {e}")
+        failed += 1
     
+    try:
+        response = requests.get(f"{base_url}/accounts/%2B250788123456/neighborhood?hops=2", auth=auth)
+        if response.status_code == 200 and len(response.json()['data']['nodes']) > 1:
+            print("✅ GET account neighborhood")
+            passed += 1
+        else:
+            print(f"❌ GET account neighborhood - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET account neighborhood - Error: {e}")
+        failed += 1
+
+    # GET /anomalies tests
+    print("\nGET /anomalies Tests:")
+    try:
+        cursor = requests.get(f"{base_url}/anomalies", auth=auth).json()['data']['cursor']
+        outgoing = {"type": "Transfer", "amount": 25000, "sender": "+250788000111", "receiver": "+250788000222",
+                    "timestamp": "2024-10-01T09:00:00Z"}
+        returned = dict(outgoing, sender=outgoing["receiver"], receiver=outgoing["sender"],
+                        amount=24500, timestamp="2024-10-01T10:00:00Z")
+        requests.post(f"{base_url}/transactions", json=outgoing, auth=auth)
+        created = requests.post(f"{base_url}/transactions", json=returned, auth=auth).json()['data']['transaction']
+        response = requests.get(f"{base_url}/anomalies?kind=round_trip&since={cursor}", auth=auth)
+        flagged = [flag['transaction_id'] for flag in response.json().get('data', {}).get('flags', [])]
+        if response.status_code == 200 and created['id'] in flagged:
+            print("✅ GET anomalies flags a round trip")
+            passed += 1
+        else:
+            print(f"❌ GET anomalies flags a round trip - Status: {response.status_code}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ GET anomalies flags a round trip - Error: {e}")
+        failed += 1
+
+    # GET /transactions/stream tests
+    print("\nGET /transactions/stream Tests:")
+    try:
+        stream = requests.get(f"{base_url}/transactions/stream", auth=auth, stream=True, timeout=5)
+        data = {"type": "Transfer", "amount": 1000, "sender": "+250788123456", "receiver": "+250789234567"}
+        requests.post(f"{base_url}/transactions", json=data, auth=auth)
+        event_type = None
+        for line in stream.iter_lines(chunk_size=1, decode_unicode=True):
+            if line.startswith('event: '):
+                event_type = line[len('event: '):]
+                break
+        stream.close()
+        if stream.headers.get('Content-Type') == 'text/event-stream' and event_type == 'create':
+            print("✅ Stream receives create event")
+            passed += 1
+        else:
+            print(f"❌ Stream receives create event - Event: {event_type}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ Stream receives create event - Error: {e}")
+        failed += 1
+
+    # Write-behind tests; run when the server was started with the same sqlite:/// MOMO_DATABASE_URL
+    database_url = os.environ.get('MOMO_DATABASE_URL', '')
+    if database_url.startswith('sqlite:///'):
+        print("\nWrite-behind Tests:")
+        try:
+            data = {"type": "Payment", "amount": 4321, "sender": "+250788123456", "receiver": "+250790345678"}
+            created = requests.post(f"{base_url}/transactions", json=data, auth=auth).json()['data']['transaction']
+            row = None
+            deadline = time.time() + 10
+            while row is None and time.time() < deadline:
+                with sqlite3.connect(database_url[len('sqlite:///'):]) as connection:
+                    row = connection.execute("SELECT amount FROM Transactions WHERE transaction_id = ?",
+                                             (created['id'],)).fetchone()
+                if row is None:
+                    time.sleep(0.1)
+            if row is not None and float(row[0]) == 4321:
+                print("✅ POST persisted to the database")
+                passed += 1
+            else:
+                print(f"❌ POST persisted to the database - Row: {row}")
+                failed += 1
+        except Exception as e:
+            print(f"❌ POST persisted to the database - Error: {e}")
+            failed += 1
+
+    # Concurrency tests
+    print("\nConcurrency Tests:")
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(lambda _: requests.get(f"{base_url}/transactions/1", auth=auth), range(32)))
+        statuses = [r.status_code for r in responses]
+        if all(status in [200, 429, 503] for status in statuses) and 200 in statuses:
+            print("✅ Concurrent GET requests")
+            passed += 1
+        else:
+            print(f"❌ Concurrent GET requests - Statuses: {sorted(set(statuses))}")
+            failed += 1
+    except Exception as e:
+        print(f"❌ Concurrent GET requests - Error: {e}")
+        failed += 1
+
     print("\n" + "=" * 30)
     print(f"Passed: {passed}")
     print(f"Failed: {failed}")
@@ -1,46 +1,297 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import sys
 import json
-import base64
+import time
+import math
+import functools
+import importlib
+import threading
 import urllib.parse
-from typing import Dict, Any, Optional, List
+from typing import TYPE_CHECKING, Dict, Any, Optional, List
 from http.server import BaseHTTPRequestHandler
 
-# Add the dsa directory to the path to import our modules
+# Add the dsa and api directories to the path to import our modules
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'dsa'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from xml_parser import SMSDataParser  # pyright: ignore[reportMissingImports]
-from search_algorithms import TransactionSearch  # pyright: ignore[reportMissingImports]
+from transaction_store import TransactionStore, DuplicateReferenceError, StoreBusyError  # pyright: ignore[reportMissingImports]
+from query_engine import (QueryError, MAX_BATCH_QUERIES, QUERY_FILTERS, parse_ids, parse_fields, parse_sort,
+                          project, get_many, select, run_query, prepare_indexes)  # pyright: ignore[reportMissingImports]
+from metrics import metrics  # pyright: ignore[reportMissingImports]
+from auth import Authenticator, StaticCredentialStore  # pyright: ignore[reportMissingImports]
+from rate_limit import TokenBucketLimiter  # pyright: ignore[reportMissingImports]
+from change_feed import ChangeFeed  # pyright: ignore[reportMissingImports]
+
+if TYPE_CHECKING:
+    from analytics import AnalyticsIndex  # pyright: ignore[reportMissingImports]
+    from graph_index import TransactionGraph  # pyright: ignore[reportMissingImports]
+    from ledger import BalanceLedger  # pyright: ignore[reportMissingImports]
+    from anomaly import AnomalyDetector  # pyright: ignore[reportMissingImports]
+    from write_behind import WriteBehindQueue  # pyright: ignore[reportMissingImports]
+
+
+DEFAULT_DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'data', 'raw', 'modified_sms_v2.xml')
+
+# Structures derived from the store, by handler attribute: (module, class). The module is
+# imported when the first request needs the structure, so startup never pays for it
+DERIVED_INDEXES = {
+    'analytics': ('analytics', 'AnalyticsIndex'),
+    'graph': ('graph_index', 'TransactionGraph'),
+    'ledger': ('ledger', 'BalanceLedger'),
+    'anomalies': ('anomaly', 'AnomalyDetector'),
+}
+
+# What warm_up() builds ahead of the first request: nothing, the store, or the store and every index
+WARM_UP_LEVELS = ('none', 'store', 'all')
+
+# Route templates used as metric labels; anything else is "unmatched" to bound cardinality
+ROUTES = [
+    '/transactions',
+    '/transactions/stream',
+    '/transactions/by-reference/{ref}',
+    '/transactions/{id}',
+    '/metrics',
+    '/analytics',
+    '/accounts/{number}/balance',
+    '/accounts/{number}/counterparties',
+    '/accounts/{number}/flow/{other}',
+    '/accounts/{number}/neighborhood',
+    '/anomalies',
+    '/query/batch',
+]
+
+# One alternation with a group per template, so a request costs a single match
+_ROUTE_PATTERN = re.compile('|'.join(f"({re.sub(r'{[^}]+}', '[^/]+', template)})" for template in ROUTES))
+
+
+def _derived_index_class(name: str):
+    module_name, class_name = DERIVED_INDEXES[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _route_template(raw_path: str) -> str:
+    match = _ROUTE_PATTERN.fullmatch(raw_path.split('?', 1)[0])
+    return ROUTES[match.lastindex - 1] if match else 'unmatched'
+
+
+def _instrumented(dispatch):
+    # Records latency, status and bytes written for every request through dispatch
+    @functools.wraps(dispatch)
+    def wrapper(self):
+        start = time.perf_counter_ns()
+        self._status_code = 500
+        self._bytes_written = 0
+        metrics.request_started()
+        try:
+            dispatch(self)
+        finally:
+            metrics.request_finished(self.command, _route_template(self.path), self._status_code,
+                                     time.perf_counter_ns() - start, self._bytes_written)
+    return wrapper
 
 
 class TransactionAPIHandler(BaseHTTPRequestHandler):
+    # A handler instance is created per request, so the data lives on the class
+    store: Optional[TransactionStore] = None
+    change_feed: Optional[ChangeFeed] = None
+    analytics: Optional['AnalyticsIndex'] = None
+    graph: Optional['TransactionGraph'] = None
+    ledger: Optional['BalanceLedger'] = None
+    anomalies: Optional['AnomalyDetector'] = None
+    _store_lock = threading.Lock()
+    data_file = DEFAULT_DATA_FILE
+    # Unix time the current store's data was loaded
+    loaded_at = 0.0
+    authenticator = Authenticator(StaticCredentialStore())
+    rate_limiter: Optional[TokenBucketLimiter] = None
+    write_behind: Optional['WriteBehindQueue'] = None
+
     def __init__(self, *args, **kwargs):
-        # Load transaction data
-        self.transactions = self._load_transaction_data()
-        self.search_engine = TransactionSearch(self.transactions)
+        self.store = self.get_store()
+        self.store.refresh()
+        self.transactions = self.store.transactions
+        self.search_engine = self.store.search_engine
         super().__init__(*args, **kwargs)
 
-    def _authenticate(self) -> bool:
-        auth_header = self.headers.get('Authorization')
-        
-        if not auth_header or not auth_header.startswith('Basic '):
-            return False
-        
-        try:
-            encoded_credentials = auth_header[6:]
-            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
-            username, password = decoded_credentials.split(':', 1)
-            
-            return username == 'admin' and password == 'password123'
-            
-        except Exception:
+    @classmethod
+    def get_store(cls) -> TransactionStore:
+        if TransactionAPIHandler.store is None:
+            with TransactionAPIHandler._store_lock:
+                if TransactionAPIHandler.store is None:
+                    store = TransactionStore(cls._load_transaction_data())
+                    if TransactionAPIHandler.write_behind is not None:
+                        TransactionAPIHandler.write_behind.attach(store)
+                    TransactionAPIHandler.change_feed = ChangeFeed(store)
+                    TransactionAPIHandler.store = store
+                    TransactionAPIHandler.loaded_at = time.time()
+        return TransactionAPIHandler.store
+
+    @classmethod
+    def use_data_file(cls, path: str):
+        TransactionAPIHandler.data_file = path
+
+    @classmethod
+    def reload_store(cls) -> bool:
+        """Rebuild the store and the derived indexes in use from data_file, then swap them in.
+
+        Everything is built off to the side on the calling thread; requests keep
+        using the current store until a single swap under the store lock, and
+        requests already running finish against the store they started with.
+        Writes made through the API since the last load are replaced by the
+        file's contents.
+        """
+        transactions = cls._load_transaction_data()
+        if not transactions:
+            print("Reload skipped, still serving the previous data")
             return False
+        store = TransactionStore(transactions)
+        current = TransactionAPIHandler.store
+        if current is not None:
+            if current.search_engine.reference_dict is not None:
+                store.reference_index()
+            for field in list(current.search_engine.sorted_indexes):
+                store.sorted_index(field)
+            for field in list(current.search_engine.value_indexes):
+                store.value_index(field)
+            if current.search_engine.time_index is not None:
+                store.time_segments()
+        indexes = {name: _derived_index_class(name)(store) for name in DERIVED_INDEXES
+                   if getattr(TransactionAPIHandler, name) is not None}
+        change_feed = ChangeFeed(store)
+        # The file's contents are not written to the database, only API writes made from now on
+        if TransactionAPIHandler.write_behind is not None:
+            TransactionAPIHandler.write_behind.attach(store)
 
-    def do_GET(self):
+        with TransactionAPIHandler._store_lock:
+            previous_feed = TransactionAPIHandler.change_feed
+            if current is not None:
+                # Keep event ids increasing so Last-Event-IDs from the old data never look current
+                store.version = current.version + 1
+            for name, index in indexes.items():
+                setattr(TransactionAPIHandler, name, index)
+            TransactionAPIHandler.change_feed = change_feed
+            TransactionAPIHandler.store = store
+            TransactionAPIHandler.loaded_at = time.time()
+        if previous_feed is not None:
+            previous_feed.retire(store.version)
+        print(f"Reloaded {len(store)} transactions from {cls.data_file}")
+        return True
+
+    @classmethod
+    def use_store(cls, store: TransactionStore):
+        TransactionAPIHandler.change_feed = ChangeFeed(store)
+        TransactionAPIHandler.store = store
+        # Pre-fork workers: writes are persisted by the owner process that applies them
+        TransactionAPIHandler.write_behind = None
+
+    @classmethod
+    def use_write_behind(cls, write_behind: Optional['WriteBehindQueue']):
+        # Persists every API write to the relational database; set before the store is loaded
+        TransactionAPIHandler.write_behind = write_behind
+
+    @classmethod
+    def warm_up(cls, level: str = 'store', derived: bool = True):
+        """Loads the data ahead of the first request; with 'all', also every index and derived structure.
+
+        Meant for a background thread started next to the listening socket:
+        requests arriving meanwhile wait for, or share, the same lazy builds.
+        derived=False leaves out the structures bound to the store object
+        (DERIVED_INDEXES), e.g. in a pre-fork parent whose workers serve from
+        their own replica store.
+        """
+        if level == 'none':
+            return
+        start = time.perf_counter()
+        store = cls.get_store()
+        if level == 'all':
+            prepare_indexes(store)
+            if derived:
+                for name in DERIVED_INDEXES:
+                    cls._store_index(name)
+        print(f"Warm-up ({level}) finished in {time.perf_counter() - start:.2f}s")
+
+    @classmethod
+    def _store_index(cls, name: str, factory=None):
+        # Structures derived from the store, built on first use and rebuilt if the store is replaced
+        factory = factory or _derived_index_class(name)
+        store = cls.get_store()
+        index = getattr(TransactionAPIHandler, name)
+        if index is None or index.store is not store:
+            with TransactionAPIHandler._store_lock:
+                index = getattr(TransactionAPIHandler, name)
+                if index is None or index.store is not store:
+                    index = factory(store)
+                    setattr(TransactionAPIHandler, name, index)
+        return index
+
+    @classmethod
+    def get_change_feed(cls) -> ChangeFeed:
+        return cls._store_index('change_feed', ChangeFeed)
+
+    @classmethod
+    def get_analytics(cls) -> 'AnalyticsIndex':
+        # One pass over the store on first use, then maintained on every write
+        return cls._store_index('analytics')
+
+    @classmethod
+    def get_graph(cls) -> 'TransactionGraph':
+        return cls._store_index('graph')
+
+    @classmethod
+    def get_ledger(cls) -> 'BalanceLedger':
+        return cls._store_index('ledger')
+
+    @classmethod
+    def get_anomalies(cls) -> 'AnomalyDetector':
+        # Replays the store in time order on first use, then checks every create as it is applied
+        return cls._store_index('anomalies')
+
+    @classmethod
+    def use_authenticator(cls, authenticator: Authenticator):
+        TransactionAPIHandler.authenticator = authenticator
+
+    @classmethod
+    def use_rate_limiter(cls, rate_limiter: Optional[TokenBucketLimiter]):
+        TransactionAPIHandler.rate_limiter = rate_limiter
+
+    def _admit(self) -> bool:
+        # Authenticates and rate limits the request, sending the error response if it is refused
+        limiter = self.rate_limiter
+        if limiter is not None and not self.authenticator.is_cached(self.headers.get('Authorization')):
+            # Unverified credentials cost a slow hash, so charge them to the client address first
+            if self._rate_limited(limiter, f"ip:{self.client_address[0]}"):
+                return False
         if not self._authenticate():
             self._send_error_response(401, "Unauthorized. Please provide valid Basic Authentication credentials.")
+            return False
+        if limiter is not None and self._rate_limited(limiter, f"user:{self.username}@{self.client_address[0]}"):
+            return False
+        return True
+
+    def _rate_limited(self, limiter: TokenBucketLimiter, key: str) -> bool:
+        retry_after = limiter.acquire(key)
+        if retry_after:
+            self._send_error_response(429, "Too many requests, please slow down", "RATE_LIMITED",
+                                      {'Retry-After': str(math.ceil(retry_after))})
+            return True
+        return False
+
+    def _authenticate(self) -> bool:
+        # Verified headers are cached, so slow password hashing is paid once per client
+        self.username = self.authenticator.authenticate(self.headers.get('Authorization'))
+        return self.username is not None
+
+    def send_response(self, code, message=None):
+        self._status_code = code
+        super().send_response(code, message)
+
+    @_instrumented
+    def do_GET(self):
+        if not self._admit():
             return
         
         parsed_url = urllib.parse.urlparse(self.path)
@@ -48,6 +299,22 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
         
         if path == '/transactions':
             self._handle_get_all_transactions()
+        elif path == '/metrics':
+            self._handle_get_metrics()
+        elif path == '/analytics':
+            self._handle_get_analytics()
+        elif path.startswith('/accounts/'):
+            self._handle_account_query(path)
+        elif path == '/anomalies':
+            self._handle_get_anomalies()
+        elif path == '/transactions/stream':
+            self._handle_transaction_stream()
+        elif path.startswith('/transactions/by-reference/'):
+            reference = urllib.parse.unquote(path[len('/transactions/by-reference/'):])
+            if reference:
+                self._handle_get_transaction_by_reference(reference)
+            else:
+                self._send_error_response(400, "Invalid transaction reference")
         elif path.startswith('/transactions/'):
             transaction_id = self._get_transaction_id_from_path()
             if transaction_id:
@@ -57,19 +324,21 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
         else:
             self._send_error_response(404, "Endpoint not found")
     
+    @_instrumented
     def do_POST(self):
-        if not self._authenticate():
-            self._send_error_response(401, "Unauthorized. Please provide valid Basic Authentication credentials.")
+        if not self._admit():
             return
         
         if self.path == '/transactions':
             self._handle_create_transaction()
+        elif self.path == '/query/batch':
+            self._handle_batch_query()
         else:
             self._send_error_response(404, "Endpoint not found")
     
+    @_instrumented
     def do_PUT(self):
-        if not self._authenticate():
-            self._send_error_response(401, "Unauthorized. Please provide valid Basic Authentication credentials.")
+        if not self._admit():
             return
         
         parsed_url = urllib.parse.urlparse(self.path)
@@ -84,9 +353,9 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
         else:
             self._send_error_response(404, "Endpoint not found")
     
+    @_instrumented
     def do_DELETE(self):
-        if not self._authenticate():
-            self._send_error_response(401, "Unauthorized. Please provide valid Basic Authentication credentials.")
+        if not self._admit():
             return
         
         parsed_url = urllib.parse.urlparse(self.path)
@@ -101,12 +370,13 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
         else:
             self._send_error_response(404, "Endpoint not found")
     
-    def _load_transaction_data(self) -> List[Dict[str, Any]]:
+    @classmethod
+    def _load_transaction_data(cls) -> List[Dict[str, Any]]:
+        # The parser and its XML backends are only needed once the data is loaded, after the port is open
+        from xml_parser import SMSDataParser  # pyright: ignore[reportMissingImports]
+
         try:
-            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            xml_file_path = os.path.join(project_root, 'data', 'raw', 'modified_sms_v2.xml')
-            
-            parser = SMSDataParser(xml_file_path)
+            parser = SMSDataParser(cls.data_file)
             transactions = parser.parse_xml()
             
             if not transactions:
@@ -120,18 +390,32 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
             print(f"Error loading transaction data: {e}")
             return []
     
-    def _send_response(self, status_code: int, data: Dict[str, Any]):   
+    def _send_response(self, status_code: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
         
         response_json = json.dumps(data, indent=2)
-        self.wfile.write(response_json.encode('utf-8'))
+        body = response_json.encode('utf-8')
+        self._bytes_written = len(body)
+        self.wfile.write(body)
     
-    def _send_error_response(self, status_code: int, error_message: str, error_code: str = None):
+    def _send_text_response(self, status_code: int, text: str, content_type: str = 'text/plain; charset=utf-8'):
+        body = text.encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self._bytes_written = len(body)
+        self.wfile.write(body)
+    
+    def _send_error_response(self, status_code: int, error_message: str, error_code: str = None,
+                             headers: Optional[Dict[str, str]] = None):
         error_data = {
             "success": False,
             "error": {
@@ -139,7 +423,12 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
                 "message": error_message
             }
         }
-        self._send_response(status_code, error_data)
+        self._send_response(status_code, error_data, headers)
+    
+    def _send_write_backlog_response(self, error: StoreBusyError):
+        # The database is behind on persisting earlier writes; nothing was applied
+        self._send_error_response(503, f"Too many writes waiting to be persisted ({error}), please retry later",
+                                  "WRITE_BACKLOG", {'Retry-After': str(math.ceil(error.retry_after))})
     
     def _send_success_response(self, data: Any, message: str = None):
         response_data = {
@@ -161,6 +450,10 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
         except Exception:
             return None
     
+    def _requested_fields(self) -> Optional[List[str]]:
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        return parse_fields(query_params.get('fields', [None])[0])
+    
     def _get_transaction_id_from_path(self) -> Optional[int]:
         try:
             parsed_url = urllib.parse.urlparse(self.path)
@@ -176,46 +469,232 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
             parsed_url = urllib.parse.urlparse(self.path)
             query_params = urllib.parse.parse_qs(parsed_url.query)
             
-            # Filter by type if specified
-            transaction_type = query_params.get('type', [None])[0]
-            if transaction_type:
-                filtered_transactions = [t for t in self.transactions if t.get('type') == transaction_type]
-            else:
-                filtered_transactions = self.transactions
+            # Multi-get: ?ids=1,2,3 returns those transactions in one response
+            fields = parse_fields(query_params.get('fields', [None])[0])
+            raw_ids = query_params.get('ids', [None])[0]
+            if raw_ids is not None:
+                ids = parse_ids(raw_id for raw_id in raw_ids.split(',') if raw_id)
+                result = get_many(self.store, ids)
+                result['transactions'] = project(result['transactions'], fields)
+                self._send_success_response(result)
+                return
+            
+            # Filters (?type=Payment&sender=...&min_amount=1000&from=2024-09-01&to=2024-09);
+            # the query planner picks the index to read and the order the rest are checked in
+            filters = {name: query_params[name][0] for name in QUERY_FILTERS if query_params.get(name, [''])[0]}
+            explain = query_params.get('explain', ['0'])[0].lower() in ('1', 'true')
             
-            # Pagination
+            # Sorting (?sort=amount, ?sort=-timestamp) and pagination
+            sort = parse_sort(query_params.get('sort', [None])[0])
             page = int(query_params.get('page', [1])[0])
             per_page = int(query_params.get('per_page', [20])[0])
             
-            start_idx = (page - 1) * per_page
-            end_idx = start_idx + per_page
-            
-            paginated_transactions = filtered_transactions[start_idx:end_idx]
-            
-            response_data = {
-                "transactions": paginated_transactions,
-                "pagination": {
-                    "page": page,
-                    "per_page": per_page,
-                    "total": len(filtered_transactions),
-                    "total_pages": (len(filtered_transactions) + per_page - 1) // per_page
-                }
-            }
+            response_data = select(self.store, filters, sort, page, per_page, explain)
+            response_data['transactions'] = project(response_data['transactions'], fields)
             
             self._send_success_response(response_data)
             
+        except QueryError as e:
+            self._send_error_response(400, str(e), "INVALID_QUERY")
         except Exception as e:
             self._send_error_response(500, f"Internal server error: {str(e)}")
     
     def _handle_get_transaction(self, transaction_id: int):
         try:
+            fields = self._requested_fields()
             transaction = self.search_engine.dictionary_lookup_by_id(transaction_id)
             
             if transaction:
-                self._send_success_response({"transaction": transaction})
+                self._send_success_response({"transaction": project([transaction], fields)[0]})
             else:
                 self._send_error_response(404, f"Transaction with ID {transaction_id} not found", "TRANSACTION_NOT_FOUND")
                 
+        except QueryError as e:
+            self._send_error_response(400, str(e), "INVALID_QUERY")
+        except Exception as e:
+            self._send_error_response(500, f"Internal server error: {str(e)}")
+    
+    def _handle_get_metrics(self):
+        try:
+            self._send_text_response(200, metrics.render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+        except Exception as e:
+            self._send_error_response(500, f"Internal server error: {str(e)}")
+    
+    def _handle_get_analytics(self):
+        from analytics import DEFAULT_QUANTILES  # pyright: ignore[reportMissingImports]
+        try:
+            query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            start_month = query_params.get('from', [None])[0]
+            end_month = query_params.get('to', [None])[0]
+            for month in (start_month, end_month):
+                if month is not None and not re.fullmatch(r'\d{4}-\d{2}', month):
+                    raise QueryError("from and to must be months in YYYY-MM format")
+            
+            raw_quantiles = query_params.get('quantiles', [None])[0]
+            try:
+                quantiles = [float(q) for q in raw_quantiles.split(',')] if raw_quantiles else list(DEFAULT_QUANTILES)
+            except ValueError:
+                raise QueryError("quantiles must be numbers between 0 and 1")
+            if not quantiles or any(not 0 <= q <= 1 for q in quantiles):
+                raise QueryError("quantiles must be numbers between 0 and 1")
+            
+            summary = self.get_analytics().summary(start_month, end_month, query_params.get('type', [None])[0], quantiles)
+            self._send_success_response(summary)
+            
+        except QueryError as e:
+            self._send_error_response(400, str(e), "INVALID_QUERY")
+        except Exception as e:
+            self._send_error_response(500, f"Internal server error: {str(e)}")
+    
+    def _handle_get_anomalies(self):
+        from anomaly import ANOMALY_KINDS  # pyright: ignore[reportMissingImports]
+        try:
+            query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            kind = query_params.get('kind', [None])[0]
+            if kind is not None and kind not in ANOMALY_KINDS:
+                raise QueryError(f"kind must be one of {', '.join(ANOMALY_KINDS)}")
+            try:
+                since = int(query_params.get('since', [0])[0])
+                limit = int(query_params.get('limit', [100])[0])
+            except ValueError:
+                raise QueryError("since and limit must be integers")
+            if not 1 <= limit <= 1000:
+                raise QueryError("limit must be between 1 and 1000")
+            
+            # Poll with ?since=<cursor> to receive only flags raised after the previous response
+            self._send_success_response(self.get_anomalies().recent_flags(since, kind, limit))
+            
+        except QueryError as e:
+            self._send_error_response(400, str(e), "INVALID_QUERY")
+        except Exception as e:
+            self._send_error_response(500, f"Internal server error: {str(e)}")
+    
+    def _handle_account_query(self, path: str):
+        from graph_index import DIRECTIONS  # pyright: ignore[reportMissingImports]
+        try:
+            parts = [urllib.parse.unquote(part) for part in path.strip('/').split('/')]
+            query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            
+            if len(parts) == 3 and parts[2] == 'balance':
+                # Completed transactions only; ?at= gives the balance as of that ISO 8601 timestamp
+                balance = self.get_ledger().balance(parts[1], query_params.get('at', [None])[0])
+                if balance is None:
+                    self._send_error_response(404, f"No completed transactions for account {parts[1]}", "ACCOUNT_NOT_FOUND")
+                else:
+                    self._send_success_response(balance)
+                return
+            
+            graph = self.get_graph()
+            if len(parts) == 4 and parts[2] == 'flow':
+                self._send_success_response(graph.flow(parts[1], parts[3]))
+                return
+            if len(parts) != 3 or parts[2] not in ('counterparties', 'neighborhood'):
+                self._send_error_response(404, "Endpoint not found")
+                return
+            
+            number = parts[1]
+            if number not in graph:
+                self._send_error_response(404, f"No transactions for account {number}", "ACCOUNT_NOT_FOUND")
+                return
+            
+            direction = query_params.get('direction', ['out' if parts[2] == 'counterparties' else 'both'])[0]
+            if direction not in DIRECTIONS:
+                raise QueryError(f"direction must be one of {', '.join(DIRECTIONS)}")
+            
+            if parts[2] == 'counterparties':
+                by = query_params.get('by', ['amount'])[0]
+                limit = int(query_params.get('limit', [10])[0])
+                if by not in ('amount', 'count') or not 1 <= limit <= 1000:
+                    raise QueryError("by must be amount or count, and limit between 1 and 1000")
+                counterparties = graph.top_counterparties(number, direction, by, limit)
+                self._send_success_response({"number": number, "counterparties": counterparties})
+            else:
+                hops = int(query_params.get('hops', [2])[0])
+                limit = int(query_params.get('limit', [500])[0])
+                if not 1 <= hops <= 4 or not 1 <= limit <= 5000:
+                    raise QueryError("hops must be between 1 and 4, and limit between 1 and 5000")
+                self._send_success_response(graph.neighborhood(number, hops, direction, limit))
+            
+        except (QueryError, ValueError) as e:
+            self._send_error_response(400, str(e), "INVALID_QUERY")
+        except Exception as e:
+            self._send_error_response(500, f"Internal server error: {str(e)}")
+    
+    def _handle_transaction_stream(self):
+        detach = getattr(self.server, 'detach', None)
+        if detach is None:
+            self._send_error_response(501, "Streaming is not supported by this server")
+            return
+        
+        # EventSource sends Last-Event-ID when reconnecting; the query parameter covers the first connect
+        query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        last_event_id = self.headers.get('Last-Event-ID') or query_params.get('last_event_id', [None])[0]
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            self._send_error_response(400, "Last-Event-ID must be an integer")
+            return
+        
+        # The place is taken before the 200 goes out, so a full feed can still answer 503
+        feed = self.get_change_feed()
+        if not feed.reserve():
+            self._send_error_response(503, "Too many open streams, please retry later", headers={'Retry-After': '5'})
+            return
+        
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('X-Accel-Buffering', 'no')
+            self.end_headers()
+            self.wfile.write(b'retry: 3000\n\n')
+            self.wfile.flush()
+        except Exception:
+            feed.release()
+            raise
+        
+        # Hand the socket to the feed's broadcaster and free this worker thread
+        feed.subscribe(self.connection, last_event_id)
+        detach(self.connection)
+    
+    def _handle_get_transaction_by_reference(self, reference: str):
+        try:
+            fields = self._requested_fields()
+            transaction = self.store.get_by_reference(reference)
+            
+            if transaction:
+                self._send_success_response({"transaction": project([transaction], fields)[0]})
+            else:
+                self._send_error_response(404, f"Transaction with reference {reference} not found", "TRANSACTION_NOT_FOUND")
+                
+        except QueryError as e:
+            self._send_error_response(400, str(e), "INVALID_QUERY")
+        except Exception as e:
+            self._send_error_response(500, f"Internal server error: {str(e)}")
+    
+    def _handle_batch_query(self):
+        try:
+            data = self._parse_json_body()
+            queries = data.get('queries') if isinstance(data, dict) else None
+            
+            if not isinstance(queries, list) or not queries:
+                self._send_error_response(400, "Request body must contain a non-empty 'queries' list")
+                return
+            if len(queries) > MAX_BATCH_QUERIES:
+                self._send_error_response(400, f"At most {MAX_BATCH_QUERIES} queries per batch", "INVALID_QUERY")
+                return
+            
+            # An invalid query fails on its own; the rest of the batch still runs
+            results = []
+            for query in queries:
+                try:
+                    results.append({"success": True, "data": run_query(self.store, query)})
+                except QueryError as e:
+                    results.append({"success": False, "error": {"code": "INVALID_QUERY", "message": str(e)}})
+            
+            self._send_success_response({"results": results})
+            
         except Exception as e:
             self._send_error_response(500, f"Internal server error: {str(e)}")
     
@@ -234,32 +713,15 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
                     self._send_error_response(400, f"Missing required field: {field}")
                     return
             
-            # Generate new transaction ID
-            max_id = max([t['id'] for t in self.transactions]) if self.transactions else 0
-            new_id = max_id + 1
-            
-            # Create new transaction
-            new_transaction = {
-                'id': new_id,
-                'type': data['type'],
-                'amount': float(data['amount']),
-                'currency': data.get('currency', 'RWF'),
-                'sender': data['sender'],
-                'receiver': data['receiver'],
-                'timestamp': data.get('timestamp', '2024-09-27T12:00:00Z'),
-                'status': data.get('status', 'Completed'),
-                'reference': data.get('reference', f'TXN{new_id:09d}'),
-                'description': data.get('description', '')
-            }
-            
-            # Add to transactions list
-            self.transactions.append(new_transaction)
-            
-            # Update search engine
-            self.search_engine = TransactionSearch(self.transactions)
+            # Create new transaction; the store assigns the ID and indexes it
+            new_transaction = self.store.create(data)
             
             self._send_success_response({"transaction": new_transaction}, "Transaction created successfully")
             
+        except DuplicateReferenceError as e:
+            self._send_error_response(409, str(e), "DUPLICATE_REFERENCE")
+        except StoreBusyError as e:
+            self._send_write_backlog_response(e)
         except ValueError as e:
             self._send_error_response(400, f"Invalid data format: {str(e)}")
         except Exception as e:
@@ -267,31 +729,24 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
     
     def _handle_update_transaction(self, transaction_id: int):
         try:
-            transaction = self.search_engine.dictionary_lookup_by_id(transaction_id)
-            
-            if not transaction:
-                self._send_error_response(404, f"Transaction with ID {transaction_id} not found", "TRANSACTION_NOT_FOUND")
-                return
-            
             data = self._parse_json_body()
             
             if not data:
                 self._send_error_response(400, "Request body must contain valid JSON")
                 return
             
-            # Update transaction fields
-            for field, value in data.items():
-                if field in transaction:
-                    if field == 'amount':
-                        transaction[field] = float(value)
-                    else:
-                        transaction[field] = value
-            
-            # Update search engine
-            self.search_engine = TransactionSearch(self.transactions)
+            # Update transaction fields; None if it does not exist (or was deleted meanwhile)
+            transaction = self.store.update(transaction_id, data)
+            if transaction is None:
+                self._send_error_response(404, f"Transaction with ID {transaction_id} not found", "TRANSACTION_NOT_FOUND")
+                return
             
             self._send_success_response({"transaction": transaction}, "Transaction updated successfully")
             
+        except DuplicateReferenceError as e:
+            self._send_error_response(409, str(e), "DUPLICATE_REFERENCE")
+        except StoreBusyError as e:
+            self._send_write_backlog_response(e)
         except ValueError as e:
             self._send_error_response(400, f"Invalid data format: {str(e)}")
         except Exception as e:
@@ -299,19 +754,51 @@ class TransactionAPIHandler(BaseHTTPRequestHandler):
     
     def _handle_delete_transaction(self, transaction_id: int):
         try:
-            transaction = self.search_engine.dictionary_lookup_by_id(transaction_id)
-            
-            if not transaction:
+            # Remove transaction from the list and its indexes; None if it does not exist (or was deleted meanwhile)
+            transaction = self.store.delete(transaction_id)
+            if transaction is None:
                 self._send_error_response(404, f"Transaction with ID {transaction_id} not found", "TRANSACTION_NOT_FOUND")
                 return
             
-            # Remove transaction from list
-            self.transactions = [t for t in self.transactions if t['id'] != transaction_id]
-            
-            # Update search engine
-            self.search_engine = TransactionSearch(self.transactions)
-            
             self._send_success_response({"deleted_transaction": transaction}, "Transaction deleted successfully")
             
+        except StoreBusyError as e:
+            self._send_write_backlog_response(e)
         except Exception as e:
-            self._send_error_response(500, f"Internal server error: {str(e)}")
\ No newline at end of file
+            self._send_error_response(500, f"Internal server error: {str(e)}")
+
+
+metrics.register_gauge('momo_stream_subscribers', 'Open /transactions/stream connections.',
+                       lambda: TransactionAPIHandler.change_feed.subscriber_count() if TransactionAPIHandler.change_feed is not None else 0)
+metrics.register_gauge('momo_store_transactions', 'Transactions held in the in-memory store.',
+                       lambda: len(TransactionAPIHandler.store) if TransactionAPIHandler.store is not None else 0)
+metrics.register_gauge('momo_anomalies_flagged', 'Transactions flagged by the anomaly detector since it started.',
+                       lambda: sum(TransactionAPIHandler.anomalies.counts.values()) if TransactionAPIHandler.anomalies is not None else 0)
+metrics.register_gauge('momo_data_loaded_timestamp_seconds', 'Unix time the served data file was last loaded.',
+                       lambda: TransactionAPIHandler.loaded_at)
+
+
+def _write_behind_value(read):
+    return lambda: read(TransactionAPIHandler.write_behind) if TransactionAPIHandler.write_behind is not None else 0
+
+
+metrics.register_gauge('momo_write_behind_lag_seconds', 'Age of the oldest API write not yet committed to the database.',
+                       _write_behind_value(lambda queue: queue.lag_seconds()))
+metrics.register_gauge('momo_write_behind_pending_changes', 'API writes waiting to be committed to the database.',
+                       _write_behind_value(lambda queue: queue.queued_changes))
+metrics.register_counter('momo_write_behind_flushed_changes_total', 'API writes committed to the database since startup.',
+                         _write_behind_value(lambda queue: queue.flushed_changes))
+metrics.register_counter('momo_write_behind_coalesced_changes_total', 'API writes folded into a later write to the same transaction.',
+                         _write_behind_value(lambda queue: queue.coalesced_changes))
+metrics.register_counter('momo_write_behind_flush_batches_total', 'Batches committed to the database since startup.',
+                         _write_behind_value(lambda queue: queue.flushed_batches))
+metrics.register_gauge('momo_write_behind_last_flush_seconds', 'Duration of the latest batch commit.',
+                       _write_behind_value(lambda queue: queue.last_flush_seconds))
+metrics.register_counter('momo_write_behind_flush_errors_total', 'Batch commits that failed and were retried.',
+                         _write_behind_value(lambda queue: queue.flush_errors))
+metrics.register_counter('momo_write_behind_refused_changes_total', 'Writes the database refused, logged to System_Logs as errors.',
+                         _write_behind_value(lambda queue: queue.refused_changes))
+metrics.register_counter('momo_write_behind_throttled_writes_total', 'API writes that waited for room in the write-behind queue.',
+                         _write_behind_value(lambda queue: queue.throttled_writes))
+metrics.register_counter('momo_write_behind_rejected_writes_total', 'API writes answered 503 because the write-behind queue stayed full.',
+                         _write_behind_value(lambda queue: queue.rejected_writes))
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import sys
+import json
+import time
+import base64
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+import http.client
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+
+# Add the dsa and api directories to the path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_root, 'dsa'))
+sys.path.append(os.path.join(project_root, 'api'))
+
+from timing import measure, call_overhead_ns  # pyright: ignore[reportMissingImports]
+from data_generator import TransactionGenerator, TRANSACTION_TYPES, write_xml  # pyright: ignore[reportMissingImports]
+from xml_parser import SMSDataParser  # pyright: ignore[reportMissingImports]
+from xml_backends import available_backends  # pyright: ignore[reportMissingImports]
+from columnar import export_transactions, pyarrow  # pyright: ignore[reportMissingImports]
+from search_algorithms import TransactionSearch  # pyright: ignore[reportMissingImports]
+from transaction_store import TransactionStore  # pyright: ignore[reportMissingImports]
+from transaction_api import TransactionAPIHandler, WARM_UP_LEVELS  # pyright: ignore[reportMissingImports]
+from write_behind import WriteBehindQueue, RelationalWriter, PendingChange  # pyright: ignore[reportMissingImports]
+
+
+DEFAULT_SIZES = '1e3,1e4,1e5'
+DEFAULT_GROUPS = 'parse,export,search,http,persist,startup'
+# Seconds a started server may take to answer before the startup benchmark gives up
+STARTUP_TIMEOUT = 120.0
+AUTH_HEADER = 'Basic ' + base64.b64encode(b'admin:password123').decode('ascii')
+
+
+def synthetic_transactions(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    return list(TransactionGenerator(seed=seed, accounts=max(100, count // 10)).generate(count))
+
+
+class _LoopbackConnection:
+    # Socket stand-in so requests go through the real BaseHTTPRequestHandler path
+    def __init__(self, raw_request: bytes):
+        self._rfile = io.BytesIO(raw_request)
+        self.bytes_sent = 0
+
+    def makefile(self, mode, *args, **kwargs):
+        return self._rfile
+
+    def sendall(self, data):
+        self.bytes_sent += len(data)
+
+
+class _QuietHandler(TransactionAPIHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _raw_request(method: str, path: str, body: Optional[Dict[str, Any]] = None) -> bytes:
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    head = (f'{method} {path} HTTP/1.1\r\n'
+            f'Host: localhost\r\n'
+            f'Authorization: {AUTH_HEADER}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+            f'Connection: close\r\n\r\n')
+    return head.encode('latin-1') + payload
+
+
+def _send(raw_request: bytes) -> int:
+    connection = _LoopbackConnection(raw_request)
+    _QuietHandler(connection, ('127.0.0.1', 0), None)
+    return connection.bytes_sent
+
+
+def benchmark_parsing(transactions, workdir, options) -> List[Dict[str, Any]]:
+    xml_path = os.path.join(workdir, f'sms_{len(transactions)}.xml')
+    with open(xml_path, 'w', encoding='utf-8') as f:
+        write_xml(transactions, f)
+    file_size = os.path.getsize(xml_path)
+
+    def parse_full(backend=None):
+        SMSDataParser(xml_path, backend=backend).parse_xml()
+
+    def parse_streaming():
+        for _ in SMSDataParser(xml_path).iter_transactions():
+            pass
+
+    # The same file through each installed backend, for a like-for-like MB/s comparison
+    benchmarks = [('parse_xml', parse_full), ('iter_transactions', parse_streaming)]
+    benchmarks += [(f'parse_xml[{backend}]', lambda backend=backend: parse_full(backend))
+                   for backend in available_backends()]
+    results = []
+    for name, func in benchmarks:
+        # Parsing prints a summary line per call; keep the report readable
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            stats = measure(func, warmup_batches=1, repeats=options.repeats, min_batch_ns=0,
+                            max_total_ns=options.time_budget_ns)
+        finally:
+            sys.stdout = stdout
+        stats['mb_per_sec'] = file_size / 1e6 / (stats['mean_ns'] / 1e9)
+        results.append({'group': 'parse', 'name': name, 'stats': stats})
+    os.remove(xml_path)
+    return results
+
+
+def benchmark_export(transactions, workdir, options) -> List[Dict[str, Any]]:
+    # Pretty JSON as written by save_to_json() against the typed columnar formats; MB/s is output bytes
+    def save_json(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(transactions, f, indent=2, ensure_ascii=False)
+
+    benchmarks = [('save_to_json', 'json', save_json),
+                  ('export[arrow,pure]', 'arrow', lambda path: export_transactions(transactions, path, use_pyarrow=False))]
+    if pyarrow is not None:
+        benchmarks += [('export[arrow]', 'arrow', lambda path: export_transactions(transactions, path)),
+                       ('export[parquet]', 'parquet', lambda path: export_transactions(transactions, path))]
+    results = []
+    for name, extension, func in benchmarks:
+        path = os.path.join(workdir, f'export_{len(transactions)}.{extension}')
+        stats = measure(lambda: func(path), warmup_batches=1, repeats=options.repeats, min_batch_ns=0,
+                        max_total_ns=options.time_budget_ns)
+        stats['output_bytes'] = os.path.getsize(path)
+        stats['mb_per_sec'] = stats['output_bytes'] / 1e6 / (stats['mean_ns'] / 1e9)
+        results.append({'group': 'export', 'name': name, 'stats': stats})
+        os.remove(path)
+    return results
+
+
+def benchmark_search(transactions, options) -> List[Dict[str, Any]]:
+    rng = random.Random(options.seed)
+    search_engine = TransactionSearch(transactions)
+    ids = [(rng.randint(1, len(transactions)),) for _ in range(1000)]
+    references = [(f'TXN{i:09d}',) for (i,) in ids]
+    amounts = [(rng.choice(transactions)['amount'],) for _ in range(100)]
+    ranges = [(low, low + 10000.0) for low in (float(rng.randrange(0, 100000, 100)) for _ in range(100))]
+    types = [(t,) for t in TRANSACTION_TYPES]
+    # One-day windows around random transactions
+    days = [(day, day + 'T23:59:59Z') for day in (rng.choice(transactions)['timestamp'][:10] for _ in range(100))]
+
+    cases = [
+        ('build_indexes', lambda: TransactionSearch(transactions), [()]),
+        ('linear_search_by_id', search_engine.linear_search_by_id, ids),
+        ('dictionary_lookup_by_id', search_engine.dictionary_lookup_by_id, ids),
+        ('dictionary_lookup_by_reference', search_engine.dictionary_lookup_by_reference, references),
+        ('linear_search_by_amount_range', search_engine.linear_search_by_amount_range, ranges),
+        ('linear_search_by_type', search_engine.linear_search_by_type, types),
+        ('linear_search_by_time_range', search_engine.linear_search_by_time_range, days),
+        ('segment_search_by_time_range', search_engine.segment_search_by_time_range, days),
+        ('binary_search_by_amount', search_engine.binary_search_by_amount, amounts),
+    ]
+    results = []
+    for name, func, args_list in cases:
+        stats = measure(func, args_list, repeats=options.repeats, max_total_ns=options.time_budget_ns)
+        results.append({'group': 'search', 'name': name, 'stats': stats})
+    return results
+
+
+def benchmark_http(transactions, options) -> List[Dict[str, Any]]:
+    rng = random.Random(options.seed)
+    TransactionAPIHandler.store = TransactionStore([dict(t) for t in transactions])
+    ids = [rng.randint(1, len(transactions)) for _ in range(1000)]
+    new_transaction = {'type': 'Transfer', 'amount': 1000, 'sender': '+250788123456', 'receiver': '+250789234567'}
+
+    def create_and_delete():
+        # Each created row is deleted again so the store size stays constant
+        _send(_raw_request('POST', '/transactions', new_transaction))
+        new_id = TransactionAPIHandler.store.transactions[-1]['id']
+        _send(_raw_request('DELETE', f'/transactions/{new_id}'))
+
+    cases = [
+        ('GET /transactions', [(_raw_request('GET', '/transactions?page=1&per_page=20'),)]),
+        ('GET /transactions?type=', [(_raw_request('GET', '/transactions?type=Payment'),)]),
+        ('GET /transactions/{id}', [(_raw_request('GET', f'/transactions/{i}'),) for i in ids]),
+        ('GET /transactions/by-reference/{ref}', [(_raw_request('GET', f'/transactions/by-reference/TXN{i:09d}'),) for i in ids]),
+        ('PUT /transactions/{id}', [(_raw_request('PUT', f'/transactions/{i}', {'description': 'Updated'}),) for i in ids]),
+    ]
+    results = []
+    for name, args_list in cases:
+        stats = measure(_send, args_list, repeats=options.repeats, max_total_ns=options.time_budget_ns)
+        results.append({'group': 'http', 'name': name, 'stats': stats})
+    stats = measure(create_and_delete, repeats=options.repeats, max_total_ns=options.time_budget_ns)
+    results.append({'group': 'http', 'name': 'POST+DELETE /transactions', 'stats': stats})
+    TransactionAPIHandler.store = None
+    return results
+
+
+def benchmark_persist(transactions, workdir, options) -> List[Dict[str, Any]]:
+    # A commit per change (what a synchronous insert per request would add to its latency) against
+    # batched commits, and the API write path with the write-behind queue attached to the store
+    database_url = f'sqlite:///{os.path.join(workdir, f"persist_{len(transactions)}.db")}'
+    writer = RelationalWriter(database_url)
+    writer.connect()
+    changes = []
+    for transaction in transactions[:1000]:
+        change = PendingChange(transaction['id'], 0.0)
+        change.fold('create', transaction, '2024-01-01 00:00:00')
+        changes.append(change)
+    batch_size = min(500, len(changes))
+
+    results = []
+    stats = measure(lambda change: writer.write([change]), [(change,) for change in changes],
+                    warmup_batches=1, repeats=options.repeats, min_batch_ns=0, max_total_ns=options.time_budget_ns)
+    results.append({'group': 'persist', 'name': 'commit per change', 'stats': stats})
+    stats = measure(lambda: writer.write(changes[:batch_size]), warmup_batches=1, repeats=options.repeats,
+                    min_batch_ns=0, max_total_ns=options.time_budget_ns)
+    results.append({'group': 'persist', 'name': f'commit per batch of {batch_size}', 'stats': stats})
+    writer.close()
+
+    write_behind = WriteBehindQueue(RelationalWriter(database_url), max_pending=1 << 30)
+    write_behind.start()
+    TransactionAPIHandler.store = TransactionStore([dict(t) for t in transactions])
+    write_behind.attach(TransactionAPIHandler.store)
+    new_transaction = {'type': 'Transfer', 'amount': 1000, 'sender': '+250788123456', 'receiver': '+250789234567'}
+
+    def create_and_delete():
+        _send(_raw_request('POST', '/transactions', new_transaction))
+        new_id = TransactionAPIHandler.store.transactions[-1]['id']
+        _send(_raw_request('DELETE', f'/transactions/{new_id}'))
+
+    stats = measure(create_and_delete, repeats=options.repeats, max_total_ns=options.time_budget_ns)
+    results.append({'group': 'persist', 'name': 'POST+DELETE [write-behind]', 'stats': stats})
+    write_behind.close()
+    TransactionAPIHandler.store = None
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _time_to_first_response(xml_path: str, warm_up: str):
+    # Starts server.py as a fresh process and polls until GET /transactions/1 succeeds;
+    # the kill afterwards costs about a millisecond and is included in the timing
+    port = _free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(project_root, 'server.py'), '--port', str(port),
+                               '--data-file', xml_path, '--warm-up', warm_up],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    try:
+        while True:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=STARTUP_TIMEOUT)
+            try:
+                connection.request('GET', '/transactions/1', headers={'Authorization': AUTH_HEADER})
+                status = connection.getresponse().status
+                if status != 200:
+                    raise RuntimeError(f"first response was HTTP {status}")
+                return
+            except ConnectionRefusedError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("server exited or did not start listening")
+                time.sleep(0.002)
+            finally:
+                connection.close()
+    finally:
+        server.kill()
+        server.wait()
+
+
+def benchmark_startup(transactions, workdir, options) -> List[Dict[str, Any]]:
+    # Process start to first answered id lookup: interpreter, imports, loading the file and the request itself
+    xml_path = os.path.join(workdir, f'startup_{len(transactions)}.xml')
+    with open(xml_path, 'w', encoding='utf-8') as f:
+        write_xml(transactions, f)
+    results = []
+    for warm_up in WARM_UP_LEVELS:
+        stats = measure(lambda: _time_to_first_response(xml_path, warm_up), warmup_batches=1,
+                        repeats=options.repeats, min_batch_ns=0, max_total_ns=options.time_budget_ns)
+        results.append({'group': 'startup', 'name': f'first response [warm-up={warm_up}]',
+                        'stats': stats})
+    os.remove(xml_path)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    baseline_stats = {(r['group'], r['name'], r['size']): r['stats'] for r in baseline['results']}
+    regressions = 0
+    print()
+    print(f"COMPARISON AGAINST {baseline['metadata'].get('commit') or 'baseline'} (p50, threshold {threshold:.0%}):")
+    for result in current['results']:
+        previous = baseline_stats.get((result['group'], result['name'], result['size']))
+        if not previous:
+            continue
+        change = result['stats']['p50_ns'] / previous['p50_ns'] - 1 if previous['p50_ns'] else 0.0
+        marker = 'REGRESSION' if change > threshold else ('improved' if change < -threshold else '')
+        regressions += change > threshold
+        print(f"  {result['group']:<7} {result['name']:<38} n={result['size']:<9} {change:+8.1%} {marker}")
+    return regressions
+
+
+def print_report(results: List[Dict[str, Any]]):
+    print(f"{'group':<7} {'benchmark':<38} {'n':>9} {'p50':>12} {'p90':>12} {'p99':>12} {'ops/s':>12} {'MB/s':>8}")
+    print("-" * 115)
+    for result in results:
+        stats = result['stats']
+        throughput = f"{stats['mb_per_sec']:.1f}" if 'mb_per_sec' in stats else ''
+        print(f"{result['group']:<7} {result['name']:<38} {result['size']:>9} "
+              f"{_format_ns(stats['p50_ns']):>12} {_format_ns(stats['p90_ns']):>12} "
+              f"{_format_ns(stats['p99_ns']):>12} {stats['ops_per_sec']:>12.1f} {throughput:>8}")
+
+
+def _format_ns(value: float) -> str:
+    for unit, scale in (('s', 1e9), ('ms', 1e6), ('us', 1e3)):
+        if value >= scale:
+            return f"{value / scale:.2f} {unit}"
+    return f"{value:.0f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MoMo SMS benchmark suite')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f'Comma-separated dataset sizes, e.g. 1e3,1e5,1e7 (default: {DEFAULT_SIZES})')
+    parser.add_argument('--groups', default=DEFAULT_GROUPS, help='Benchmark groups to run (default: all)')
+    parser.add_argument('--repeats', type=int, default=30, help='Timed batches per benchmark (default: 30)')
+    parser.add_argument('--time-budget', type=float, default=2.0, help='Max timed seconds per benchmark (default: 2)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for datasets and inputs')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON file from a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative p50 slowdown reported as regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on any regression')
+    args = parser.parse_args()
+    args.time_budget_ns = int(args.time_budget * 1e9)
+
+    sizes = [int(float(size)) for size in args.sizes.split(',')]
+    groups = set(args.groups.split(','))
+
+    report = {
+        'metadata': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'call_overhead_ns': call_overhead_ns(),
+            'sizes': sizes,
+            'seed': args.seed
+        },
+        'results': []
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            print(f"Running benchmarks with {size} transactions...", file=sys.stderr)
+            transactions = synthetic_transactions(size, args.seed)
+            results = []
+            if 'parse' in groups:
+                results += benchmark_parsing(transactions, workdir, args)
+            if 'export' in groups:
+                results += benchmark_export(transactions, workdir, args)
+            if 'search' in groups:
+                results += benchmark_search(transactions, args)
+            if 'http' in groups:
+                results += benchmark_http(transactions, args)
+            if 'persist' in groups:
+                results += benchmark_persist(transactions, workdir, args)
+            if 'startup' in groups:
+                results += benchmark_startup(transactions, workdir, args)
+            for result in results:
+                result['size'] = size
+            report['results'] += results
+
+    print_report(report['results'])
+    print(f"\nLoop overhead per call: {report['metadata']['call_overhead_ns']:.0f} ns")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
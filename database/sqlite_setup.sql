@@ -0,0 +1,70 @@
+-- =====================================================
+-- MoMo SMS Data Analytics Platform - SQLite Schema
+-- The tables of database_setup.sql in SQLite syntax, for running the API's
+-- write-behind persistence without a MySQL server (see api/write_behind.py).
+-- Safe to run on every start: nothing is dropped.
+-- =====================================================
+
+PRAGMA foreign_keys = ON;
+
+CREATE TABLE IF NOT EXISTS Users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    full_name VARCHAR(100) NOT NULL,
+    phone_number VARCHAR(20) UNIQUE NOT NULL,
+    email VARCHAR(100),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS Transaction_Categories (
+    category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_name VARCHAR(50) NOT NULL UNIQUE,
+    description TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT chk_category_name CHECK (category_name IN ('Transfer', 'Payment', 'Deposit', 'Withdrawal', 'Bill Payment', 'Airtime Purchase', 'Cash In', 'Cash Out'))
+);
+
+CREATE TABLE IF NOT EXISTS Transactions (
+    transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sender_id INTEGER NOT NULL REFERENCES Users(user_id) ON DELETE RESTRICT,
+    receiver_id INTEGER NOT NULL REFERENCES Users(user_id) ON DELETE RESTRICT,
+    category_id INTEGER NOT NULL REFERENCES Transaction_Categories(category_id) ON DELETE RESTRICT,
+    amount DECIMAL(10,2) NOT NULL,
+    currency VARCHAR(10) DEFAULT 'RWF',
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    status VARCHAR(20) DEFAULT 'Completed',
+    reference_number VARCHAR(50) UNIQUE,
+    description TEXT,
+
+    CONSTRAINT chk_amount_positive CHECK (amount > 0),
+    CONSTRAINT chk_status_valid CHECK (status IN ('Pending', 'Completed', 'Failed', 'Cancelled')),
+    CONSTRAINT chk_currency_valid CHECK (currency IN ('RWF', 'USD', 'EUR', 'GBP')),
+    CONSTRAINT chk_not_self_transfer CHECK (sender_id != receiver_id)
+);
+
+CREATE TABLE IF NOT EXISTS System_Logs (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transaction_id INTEGER REFERENCES Transactions(transaction_id) ON DELETE SET NULL,
+    log_type VARCHAR(20) NOT NULL,
+    message TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    user_id INTEGER REFERENCES Users(user_id) ON DELETE SET NULL,
+
+    CONSTRAINT chk_log_type CHECK (log_type IN ('INFO', 'ERROR', 'WARNING', 'SUCCESS', 'DEBUG'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_sender ON Transactions(sender_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_receiver ON Transactions(receiver_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON Transactions(timestamp);
+CREATE INDEX IF NOT EXISTS idx_logs_transaction ON System_Logs(transaction_id);
+CREATE INDEX IF NOT EXISTS idx_logs_created_at ON System_Logs(created_at);
+
+INSERT OR IGNORE INTO Transaction_Categories (category_name, description) VALUES
+('Transfer', 'Peer-to-peer money transfer between users'),
+('Payment', 'Payment for goods and services'),
+('Deposit', 'Cash deposit to mobile money account'),
+('Withdrawal', 'Cash withdrawal from mobile money account'),
+('Bill Payment', 'Payment of utility bills and services'),
+('Airtime Purchase', 'Purchase of mobile phone airtime'),
+('Cash In', 'Cash deposit from agent or bank'),
+('Cash Out', 'Cash withdrawal through agent');
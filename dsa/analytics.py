@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+from sketches import HyperLogLog, KLLSketch
+
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+# Fields whose change moves a transaction between buckets or changes what its bucket holds
+SKETCHED_FIELDS = ('timestamp', 'type', 'amount', 'sender', 'receiver')
+
+
+def _sketched_values(transaction: Dict[str, Any]) -> Tuple:
+    return tuple(transaction.get(field) for field in SKETCHED_FIELDS)
+
+
+def bucket_of(transaction: Dict[str, Any]) -> Tuple[str, str]:
+    # Calendar month of the timestamp (YYYY-MM) and transaction type
+    return (transaction.get('timestamp') or '')[:7] or 'unknown', transaction.get('type') or 'unknown'
+
+
+class BucketSketches:
+    __slots__ = ('count', 'total_amount', 'senders', 'receivers', 'amounts')
+
+    def __init__(self, precision: int, k: int):
+        self.count = 0
+        self.total_amount = 0.0
+        self.senders = HyperLogLog(precision)
+        self.receivers = HyperLogLog(precision)
+        self.amounts = KLLSketch(k)
+
+    def add(self, transaction: Dict[str, Any]):
+        self.count += 1
+        amount = float(transaction.get('amount') or 0)
+        self.total_amount += amount
+        self.amounts.update(amount)
+        if transaction.get('sender'):
+            self.senders.add(transaction['sender'])
+        if transaction.get('receiver'):
+            self.receivers.add(transaction['receiver'])
+
+    def merge(self, other: 'BucketSketches'):
+        self.count += other.count
+        self.total_amount += other.total_amount
+        self.senders.merge(other.senders)
+        self.receivers.merge(other.receivers)
+        self.amounts.merge(other.amounts)
+
+    def summary(self, quantiles: List[float]) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'total_amount': self.total_amount,
+            'distinct_senders': self.senders.count(),
+            'distinct_receivers': self.receivers.count(),
+            'amount_quantiles': {str(q): value for q, value in zip(quantiles, self.amounts.quantiles(quantiles))}
+        }
+
+
+class AnalyticsIndex:
+    """Mergeable sketches per (month, type) bucket, kept current through store listeners.
+
+    Sketches cannot forget an item, so updates and deletes mark the affected
+    buckets dirty; dirty buckets are rebuilt on the next query from the ids each
+    bucket holds, so a rebuild reads only their rows, never the whole store.
+    """
+
+    def __init__(self, store, precision: int = 12, k: int = 200):
+        self.store = store
+        self.precision = precision
+        self.k = k
+        self.buckets: Dict[Tuple[str, str], BucketSketches] = {}
+        # id -> (bucket key, sketched field values), to find what an update or delete invalidates
+        self._sketched_by_id: Dict[int, Tuple[Tuple[str, str], Tuple]] = {}
+        self._ids_by_bucket: Dict[Tuple[str, str], Set[int]] = {}
+        self._dirty = set()
+        with store._lock:
+            for transaction in store.transactions:
+                self._add(transaction)
+            store.add_listener(self.on_change)
+
+    def _add(self, transaction: Dict[str, Any]):
+        key = bucket_of(transaction)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = BucketSketches(self.precision, self.k)
+        bucket.add(transaction)
+        self._sketched_by_id[transaction['id']] = (key, _sketched_values(transaction))
+        self._ids_by_bucket.setdefault(key, set()).add(transaction['id'])
+
+    def on_change(self, op: str, transaction: Dict[str, Any]):
+        # Store listener, called with the store lock held
+        if op == 'create':
+            self._add(transaction)
+            return
+        previous = self._sketched_by_id.pop(transaction['id'], None)
+        if previous is not None:
+            self._ids_by_bucket[previous[0]].discard(transaction['id'])
+        if op == 'update':
+            values = _sketched_values(transaction)
+            key = bucket_of(transaction)
+            self._sketched_by_id[transaction['id']] = (key, values)
+            self._ids_by_bucket.setdefault(key, set()).add(transaction['id'])
+            if previous is not None and previous[1] == values:
+                # e.g. only the status or description changed
+                return
+            self._dirty.add(key)
+        if previous is not None:
+            self._dirty.add(previous[0])
+
+    def _rebuild_dirty(self):
+        with self.store._lock:
+            if not self._dirty:
+                return
+            # A key stays dirty until its bucket is rebuilt, so a failed rebuild is retried on the next query
+            for key in list(self._dirty):
+                self.buckets.pop(key, None)
+                ids = self._ids_by_bucket.get(key)
+                if ids:
+                    bucket = BucketSketches(self.precision, self.k)
+                    for transaction_id in sorted(ids):
+                        bucket.add(self.store.get(transaction_id))
+                    self.buckets[key] = bucket
+                else:
+                    self._ids_by_bucket.pop(key, None)
+                self._dirty.discard(key)
+
+    def summary(self, start_month: Optional[str] = None, end_month: Optional[str] = None,
+                transaction_type: Optional[str] = None,
+                quantiles: List[float] = DEFAULT_QUANTILES) -> Dict[str, Any]:
+        """Per-month and overall figures for months in [start_month, end_month] (YYYY-MM, inclusive)."""
+        if self._dirty:
+            self._rebuild_dirty()
+
+        months: Dict[str, BucketSketches] = {}
+        total = BucketSketches(self.precision, self.k)
+        # Merging touches only the small per-bucket sketches, so holding the lock is cheap
+        with self.store._lock:
+            for (month, bucket_type), bucket in sorted(self.buckets.items()):
+                if start_month and month < start_month or end_month and month > end_month:
+                    continue
+                if transaction_type and bucket_type != transaction_type:
+                    continue
+                if month not in months:
+                    months[month] = BucketSketches(self.precision, self.k)
+                months[month].merge(bucket)
+                total.merge(bucket)
+
+        return {
+            'months': [dict(month=month, **merged.summary(quantiles)) for month, merged in months.items()],
+            'total': total.summary(quantiles),
+            'error_bounds': {
+                'distinct_relative_error': round(total.senders.relative_error, 4),
+                'quantile_rank_error': round(1.7 / self.k, 4)
+            }
+        }
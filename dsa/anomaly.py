@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+import math
+import itertools
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+
+ANOMALY_KINDS = ('amount_spike', 'burst', 'round_trip')
+
+# Weight of the newest amount in a sender's moving mean and variance
+EWMA_ALPHA = 0.1
+# Transactions a sender needs before its amounts are judged
+MIN_HISTORY = 5
+# An amount is a spike above mean + SPIKE_SIGMAS * std, with std at least SPIKE_STD_FLOOR * mean
+SPIKE_SIGMAS = 4.0
+SPIKE_STD_FLOOR = 0.25
+# More than BURST_LIMIT transactions from one sender within BURST_WINDOW seconds
+BURST_LIMIT = 10
+BURST_WINDOW = 300
+# B -> A within ROUND_TRIP_WINDOW seconds of A -> B, for an amount within ROUND_TRIP_TOLERANCE of it
+ROUND_TRIP_WINDOW = 24 * 3600
+ROUND_TRIP_TOLERANCE = 0.1
+# Memory bounds: least recently seen senders and pairs are forgotten first
+MAX_SENDERS = 100_000
+MAX_PAIRS = 100_000
+MAX_FLAGS = 10_000
+
+
+def _epoch_seconds(timestamp: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+class SenderState:
+    """Exponentially weighted amount statistics and the latest timestamps of one sender."""
+
+    __slots__ = ('count', 'mean', 'variance', 'recent')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+        # The last BURST_LIMIT + 1 timestamps are all a sliding-window count over BURST_LIMIT needs
+        self.recent = deque(maxlen=BURST_LIMIT + 1)
+
+    def update(self, amount: float):
+        # Incremental exponentially weighted mean and variance
+        diff = amount - self.mean
+        increment = EWMA_ALPHA * diff if self.count else diff
+        self.mean += increment
+        self.variance = (1 - EWMA_ALPHA) * (self.variance + diff * increment) if self.count else 0.0
+        self.count += 1
+
+
+class AnomalyDetector:
+    """Streaming checks on transactions as they arrive, in bounded memory.
+
+    - amount_spike: an amount far above the sender's exponentially weighted mean
+    - burst: more than BURST_LIMIT transactions from a sender within BURST_WINDOW
+    - round_trip: a transfer back to the sender of a similar amount within ROUND_TRIP_WINDOW
+
+    Time checks use the transactions' own timestamps, so a parsed export and the
+    live API are judged alike. Per-sender and per-pair state lives in LRU maps
+    capped at MAX_SENDERS and MAX_PAIRS; the most recent MAX_FLAGS flags are
+    kept, each with an increasing flag id to poll from. With a store, its
+    transactions are replayed in time order and every create after that is
+    checked through a store listener.
+    """
+
+    def __init__(self, store=None, max_senders: int = MAX_SENDERS, max_pairs: int = MAX_PAIRS,
+                 max_flags: int = MAX_FLAGS):
+        self.store = store
+        self.max_senders = max_senders
+        self.max_pairs = max_pairs
+        self.senders: 'OrderedDict[str, SenderState]' = OrderedDict()
+        # (sender, receiver) -> (epoch seconds, amount, id) of the pair's latest transaction
+        self.pairs: 'OrderedDict[Tuple[str, str], Tuple[float, float, int]]' = OrderedDict()
+        self.flags = deque(maxlen=max_flags)
+        self.counts = dict.fromkeys(ANOMALY_KINDS, 0)
+        self.observed = 0
+        self._next_flag_id = 1
+        self._lock = threading.Lock()
+        if store is not None:
+            with store._lock:
+                self.observe_many(sorted(store.transactions, key=lambda t: (t.get('timestamp') or '', t['id'])))
+                store.add_listener(self.on_change)
+
+    def on_change(self, op: str, transaction: Dict[str, Any]):
+        # Store listener, called with the store lock held
+        if op == 'create':
+            self.observe(transaction)
+
+    def observe_many(self, transactions: Iterable[Dict[str, Any]]) -> int:
+        flagged = 0
+        for transaction in transactions:
+            flagged += bool(self.observe(transaction))
+        return flagged
+
+    def observe(self, transaction: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Checks one transaction, updates the sender's state and returns the flags it raised."""
+        sender, receiver = transaction.get('sender'), transaction.get('receiver')
+        if not sender:
+            return []
+        amount = float(transaction.get('amount') or 0)
+        seconds = _epoch_seconds(transaction.get('timestamp'))
+        raised = []
+
+        with self._lock:
+            self.observed += 1
+            state = self._sender(sender)
+            if state.count >= MIN_HISTORY:
+                threshold = state.mean + SPIKE_SIGMAS * max(math.sqrt(state.variance), SPIKE_STD_FLOOR * state.mean)
+                if amount > threshold:
+                    raised.append(('amount_spike', f"{amount:g} against a moving mean of {state.mean:.0f}"))
+            state.update(amount)
+
+            if seconds is not None:
+                state.recent.append(seconds)
+                if len(state.recent) == state.recent.maxlen and seconds - state.recent[0] <= BURST_WINDOW:
+                    raised.append(('burst', f"{len(state.recent)} transactions within "
+                                            f"{seconds - state.recent[0]:.0f}s"))
+                if receiver:
+                    previous = self.pairs.get((receiver, sender))
+                    if previous is not None and 0 <= seconds - previous[0] <= ROUND_TRIP_WINDOW \
+                            and abs(amount - previous[1]) <= ROUND_TRIP_TOLERANCE * previous[1]:
+                        raised.append(('round_trip', f"returns {previous[1]:g} from transaction {previous[2]} "
+                                                     f"after {seconds - previous[0]:.0f}s"))
+                    self._remember_pair((sender, receiver), (seconds, amount, transaction.get('id')))
+
+            return [self._flag(kind, detail, transaction) for kind, detail in raised]
+
+    def _sender(self, sender: str) -> SenderState:
+        state = self.senders.get(sender)
+        if state is None:
+            state = self.senders[sender] = SenderState()
+            if len(self.senders) > self.max_senders:
+                self.senders.popitem(last=False)
+        else:
+            self.senders.move_to_end(sender)
+        return state
+
+    def _remember_pair(self, pair: Tuple[str, str], latest: Tuple[float, float, int]):
+        self.pairs[pair] = latest
+        self.pairs.move_to_end(pair)
+        if len(self.pairs) > self.max_pairs:
+            self.pairs.popitem(last=False)
+
+    def _flag(self, kind: str, detail: str, transaction: Dict[str, Any]) -> Dict[str, Any]:
+        flag = {
+            'flag_id': self._next_flag_id,
+            'kind': kind,
+            'detail': detail,
+            'transaction_id': transaction.get('id'),
+            'sender': transaction.get('sender'),
+            'receiver': transaction.get('receiver'),
+            'amount': transaction.get('amount'),
+            'timestamp': transaction.get('timestamp')
+        }
+        self._next_flag_id += 1
+        self.counts[kind] += 1
+        self.flags.append(flag)
+        return flag
+
+    def recent_flags(self, since: int = 0, kind: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        # Flags with flag_id > since, oldest first; poll again with the returned cursor
+        with self._lock:
+            # Flag ids in the buffer are consecutive, so the first one after since is found by offset
+            start = max(0, since - self.flags[0]['flag_id'] + 1) if self.flags else 0
+            newer = itertools.islice(self.flags, start, None)
+            flags = list(itertools.islice((flag for flag in newer if kind is None or flag['kind'] == kind), limit))
+            return {
+                'flags': flags,
+                'cursor': flags[-1]['flag_id'] if flags else max(since, self._next_flag_id - 1),
+                'counts': dict(self.counts),
+                'observed': self.observed
+            }
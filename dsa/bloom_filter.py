@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import math
+import hashlib
+
+
+class BloomFilter:
+    """Fixed-size probabilistic set: no false negatives, tunable false positives."""
+
+    def __init__(self, expected_items: int, false_positive_rate: float = 1e-6):
+        expected_items = max(1, int(expected_items))
+        self.expected_items = expected_items
+        self.false_positive_rate = false_positive_rate
+        self.num_bits = max(64, int(math.ceil(-expected_items * math.log(false_positive_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / expected_items * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing (Kirsch-Mitzenmacher) from a single 128-bit digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> bool:
+        # Returns True if the item was (probably) already present
+        bits = self.bits
+        present = True
+        for position in self._positions(item):
+            byte_index = position >> 3
+            mask = 1 << (position & 7)
+            if not bits[byte_index] & mask:
+                present = False
+                bits[byte_index] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def size_in_bytes(self) -> int:
+        return len(self.bits)
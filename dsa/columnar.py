@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import struct
+from array import array
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# Transaction fields and their Arrow types; timestamps become timestamp[s, tz=UTC]
+COLUMNS = (
+    ('id', 'int64'),
+    ('type', 'utf8'),
+    ('amount', 'float64'),
+    ('currency', 'utf8'),
+    ('sender', 'utf8'),
+    ('receiver', 'utf8'),
+    ('timestamp', 'timestamp'),
+    ('status', 'utf8'),
+    ('reference', 'utf8'),
+    ('description', 'utf8')
+)
+# Rows per record batch / Parquet row group; memory use is bounded by one batch
+DEFAULT_BATCH_ROWS = 65536
+FORMATS = ('arrow', 'parquet')
+EXTENSIONS = {'.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow', '.parquet': 'parquet'}
+PARQUET_COMPRESSION = 'zstd'
+
+ARROW_MAGIC = b'ARROW1'
+_CONTINUATION = b'\xff\xff\xff\xff'
+# Arrow format constants (Schema.fbs / Message.fbs)
+_METADATA_V5 = 4
+_HEADER_SCHEMA = 1
+_HEADER_RECORD_BATCH = 3
+_TYPE_INT, _TYPE_FLOATING_POINT, _TYPE_UTF8, _TYPE_TIMESTAMP = 2, 3, 5, 10
+_PRECISION_DOUBLE = 2
+_TIME_UNIT_SECOND = 0
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    if fmt is None:
+        fmt = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise ValueError(f"Cannot tell the format of {path}; use one of {', '.join(EXTENSIONS)} or pass the format")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown columnar format '{fmt}' (choose from {', '.join(FORMATS)})")
+    if fmt == 'parquet' and pyarrow is None:
+        raise ValueError("Parquet export requires the pyarrow package (pip install pyarrow); use .arrow instead")
+    return fmt
+
+
+def _epoch_seconds(timestamp: Optional[str]) -> Optional[int]:
+    # Timestamps without an offset are UTC, as in the write-behind, not the host's local time
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    columns = {name: [row.get(name) for row in rows] for name, _ in COLUMNS}
+    columns['timestamp'] = [_epoch_seconds(value) for value in columns['timestamp']]
+    return columns
+
+
+# A minimal FlatBuffers encoder, enough for Arrow's IPC metadata. Objects are laid out
+# front to back: a table's vtable just before it, its children after it, so every
+# uoffset points forward as the format requires.
+
+class _Table:
+    __slots__ = ('fields',)
+
+    def __init__(self, *fields: Tuple[int, str, Any]):
+        # (slot, struct format or 'offset', value)
+        self.fields = fields
+
+
+class _String:
+    __slots__ = ('value',)
+
+    def __init__(self, value: str):
+        self.value = value.encode('utf-8')
+
+
+class _Vector:
+    __slots__ = ('items',)
+
+    def __init__(self, items: List[Any]):
+        self.items = items
+
+
+class _StructVector:
+    # Vector of 8-byte aligned structs, e.g. Arrow's Block, FieldNode and Buffer
+    __slots__ = ('format', 'items')
+
+    def __init__(self, format: str, items: List[Tuple]):
+        self.format = format
+        self.items = items
+
+
+class _FlatBufferEncoder:
+    def __init__(self):
+        self.buf = bytearray()
+
+    def encode(self, root: _Table) -> bytes:
+        self.buf += bytes(4)
+        struct.pack_into('<I', self.buf, 0, self._write(root))
+        self._align(8)
+        return bytes(self.buf)
+
+    def _align(self, alignment: int, extra: int = 0):
+        # Pad so that the next write, after extra bytes, starts on an alignment boundary
+        self.buf += bytes(-(len(self.buf) + extra) % alignment)
+
+    def _write(self, obj) -> int:
+        if isinstance(obj, _Table):
+            return self._write_table(obj)
+        if isinstance(obj, _String):
+            self._align(4)
+            position = len(self.buf)
+            self.buf += struct.pack('<I', len(obj.value)) + obj.value + b'\0'
+            return position
+        if isinstance(obj, _StructVector):
+            self._align(8, extra=4)
+            position = len(self.buf)
+            self.buf += struct.pack('<I', len(obj.items))
+            self.buf += b''.join(struct.pack(obj.format, *item) for item in obj.items)
+            return position
+        self._align(4)
+        position = len(self.buf)
+        self.buf += struct.pack('<I', len(obj.items)) + bytes(4 * len(obj.items))
+        for index, item in enumerate(obj.items):
+            self._patch(position + 4 + 4 * index, self._write(item))
+        return position
+
+    def _write_table(self, table: _Table) -> int:
+        # Inline fields go largest first after the vtable offset, each aligned to its size
+        slots = max((slot for slot, _, _ in table.fields), default=-1) + 1
+        layout = []
+        size = 4
+        for slot, fmt, value in sorted(table.fields, key=lambda field: -self._size(field[1])):
+            width = self._size(fmt)
+            size += -size % width
+            layout.append((slot, fmt, value, size))
+            size += width
+        vtable = [0] * slots
+        for slot, _, _, offset in layout:
+            vtable[slot] = offset
+
+        self._align(2)
+        vtable_position = len(self.buf)
+        self.buf += struct.pack(f'<HH{slots}H', 4 + 2 * slots, size, *vtable)
+        self._align(8)
+        position = len(self.buf)
+        self.buf += bytes(size)
+        struct.pack_into('<i', self.buf, position, position - vtable_position)
+
+        children = []
+        for _, fmt, value, offset in layout:
+            if fmt == 'offset':
+                children.append((position + offset, value))
+            else:
+                struct.pack_into('<' + fmt, self.buf, position + offset, value)
+        for field_position, child in children:
+            self._patch(field_position, self._write(child))
+        return position
+
+    def _patch(self, field_position: int, target: int):
+        struct.pack_into('<I', self.buf, field_position, target - field_position)
+
+    @staticmethod
+    def _size(fmt: str) -> int:
+        return 4 if fmt == 'offset' else struct.calcsize('<' + fmt)
+
+
+def _field(name: str, arrow_type: str) -> _Table:
+    type_id, type_table = {
+        'int64': (_TYPE_INT, _Table((0, 'i', 64), (1, '?', True))),
+        'float64': (_TYPE_FLOATING_POINT, _Table((0, 'h', _PRECISION_DOUBLE))),
+        'utf8': (_TYPE_UTF8, _Table()),
+        'timestamp': (_TYPE_TIMESTAMP, _Table((0, 'h', _TIME_UNIT_SECOND), (1, 'offset', _String('UTC'))))
+    }[arrow_type]
+    return _Table((0, 'offset', _String(name)), (1, '?', True), (2, 'B', type_id),
+                  (3, 'offset', type_table), (5, 'offset', _Vector([])))
+
+
+def _schema() -> _Table:
+    # Little-endian schema with every column nullable
+    return _Table((0, 'h', 0), (1, 'offset', _Vector([_field(name, arrow_type) for name, arrow_type in COLUMNS])))
+
+
+def _message(header_type: int, header: _Table, body_length: int) -> bytes:
+    metadata = _FlatBufferEncoder().encode(
+        _Table((0, 'h', _METADATA_V5), (1, 'B', header_type), (2, 'offset', header), (3, 'q', body_length)))
+    return _CONTINUATION + struct.pack('<i', len(metadata)) + metadata
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _validity(values: List[Any]) -> Tuple[bytes, int]:
+    # LSB-ordered bitmap, omitted (empty) when nothing is null
+    null_count = values.count(None)
+    if not null_count:
+        return b'', 0
+    bitmap = bytearray((len(values) + 7) // 8)
+    for index, value in enumerate(values):
+        if value is not None:
+            bitmap[index >> 3] |= 1 << (index & 7)
+    return bytes(bitmap), null_count
+
+
+def _column_buffers(values: List[Any], arrow_type: str) -> Tuple[int, List[bytes]]:
+    validity, null_count = _validity(values)
+    if arrow_type == 'utf8':
+        encoded = [value.encode('utf-8') if value is not None else b'' for value in values]
+        offsets = array('i', [0])
+        total = 0
+        for item in encoded:
+            total += len(item)
+            offsets.append(total)
+        return null_count, [validity, _little_endian(offsets), b''.join(encoded)]
+    typecode = 'd' if arrow_type == 'float64' else 'q'
+    fill = 0.0 if typecode == 'd' else 0
+    data = array(typecode, [fill if value is None else value for value in values])
+    return null_count, [validity, _little_endian(data)]
+
+
+class ArrowIPCWriter:
+    """Arrow IPC file (Feather v2) writer in pure Python, for when pyarrow is not installed.
+
+    Writes the schema, one uncompressed record batch per write_batch() call and
+    the footer that lets readers memory-map the file and load batches without
+    copying. Buffers are padded to 8 bytes.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, 'wb')
+        self.file.write(ARROW_MAGIC + b'\0\0')
+        self.blocks: List[Tuple[int, int, int]] = []
+        self.file.write(_message(_HEADER_SCHEMA, _schema(), 0))
+
+    def write_batch(self, columns: Dict[str, List[Any]]):
+        length = len(columns['id'])
+        nodes, buffers, body = [], [], bytearray()
+        for name, arrow_type in COLUMNS:
+            null_count, column_buffers = _column_buffers(columns[name], arrow_type)
+            nodes.append((length, null_count))
+            for data in column_buffers:
+                buffers.append((len(body), len(data)))
+                body += data
+                body += bytes(-len(body) % 8)
+        header = _Table((0, 'q', length), (1, 'offset', _StructVector('<qq', nodes)),
+                        (2, 'offset', _StructVector('<qq', buffers)))
+        message = _message(_HEADER_RECORD_BATCH, header, len(body))
+        self.blocks.append((self.file.tell(), len(message), len(body)))
+        self.file.write(message)
+        self.file.write(body)
+
+    def close(self):
+        self.file.write(_CONTINUATION + bytes(4))
+        footer = _FlatBufferEncoder().encode(_Table(
+            (0, 'h', _METADATA_V5), (1, 'offset', _schema()),
+            (2, 'offset', _StructVector('<qi4xq', [])),
+            (3, 'offset', _StructVector('<qi4xq', self.blocks))))
+        self.file.write(footer + struct.pack('<i', len(footer)) + ARROW_MAGIC)
+        self.file.close()
+
+
+class PyArrowWriter:
+    """Parquet (one row group per batch, zstd-compressed) or Arrow IPC file through pyarrow."""
+
+    def __init__(self, path: str, fmt: str):
+        types = {'int64': pyarrow.int64(), 'float64': pyarrow.float64(), 'utf8': pyarrow.string(),
+                 'timestamp': pyarrow.timestamp('s', tz='UTC')}
+        self.schema = pyarrow.schema([(name, types[arrow_type]) for name, arrow_type in COLUMNS])
+        if fmt == 'parquet':
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression=PARQUET_COMPRESSION)
+        else:
+            self.writer = pyarrow.ipc.new_file(path, self.schema)
+
+    def write_batch(self, columns: Dict[str, List[Any]]):
+        self.writer.write_batch(pyarrow.record_batch(
+            [pyarrow.array(columns[field.name], type=field.type) for field in self.schema], schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(path: str, fmt: Optional[str] = None, use_pyarrow: Optional[bool] = None):
+    # pyarrow when installed (use_pyarrow=False forces the pure-Python Arrow writer)
+    fmt = detect_format(path, fmt)
+    if use_pyarrow is None:
+        use_pyarrow = pyarrow is not None
+    if fmt == 'parquet' or use_pyarrow:
+        if pyarrow is None:
+            raise ValueError("use_pyarrow requires the pyarrow package")
+        return PyArrowWriter(path, fmt)
+    return ArrowIPCWriter(path)
+
+
+def export_transactions(transactions: Iterable[Dict[str, Any]], path: str, fmt: Optional[str] = None,
+                        batch_size: int = DEFAULT_BATCH_ROWS, use_pyarrow: Optional[bool] = None) -> int:
+    """Writes transactions to a typed columnar file batch_size rows at a time.
+
+    The format comes from fmt or the extension: .parquet, or .arrow / .feather /
+    .ipc for an Arrow IPC file. Only one batch is held in memory, so a parser
+    stream of any length can be exported. Returns the number of rows written.
+    """
+    writer = open_writer(path, fmt, use_pyarrow)
+    written = 0
+    batch = []
+    try:
+        for transaction in transactions:
+            batch.append(transaction)
+            if len(batch) == batch_size:
+                writer.write_batch(to_columns(batch))
+                written += len(batch)
+                batch = []
+        if batch or not written:
+            writer.write_batch(to_columns(batch))
+            written += len(batch)
+    finally:
+        writer.close()
+    return written
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import itertools
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, Iterable, TextIO
+from xml.sax.saxutils import escape, quoteattr
+
+
+# Relative frequencies and typical amounts (median RWF, spread, min, max) per type
+TRANSACTION_TYPES = {
+    'Transfer':         (0.38, 15000, 1.1, 100, 2000000),
+    'Payment':          (0.22, 8000, 1.0, 100, 1000000),
+    'Airtime Purchase': (0.14, 1000, 0.8, 100, 50000),
+    'Bill Payment':     (0.10, 20000, 0.8, 500, 500000),
+    'Deposit':          (0.08, 30000, 1.0, 500, 5000000),
+    'Withdrawal':       (0.08, 25000, 1.0, 500, 2000000),
+}
+
+STATUSES = [('Completed', 0.95), ('Pending', 0.03), ('Failed', 0.02)]
+
+# MTN (078/079) and Airtel (072/073) Rwanda mobile prefixes, weighted by market share
+PHONE_PREFIXES = [('+25078', 0.45), ('+25079', 0.20), ('+25072', 0.20), ('+25073', 0.15)]
+
+DESCRIPTIONS = {
+    'Transfer': ['Family support', 'Payment for lunch', 'School fees contribution', 'Rent share', 'Loan repayment'],
+    'Payment': ['Market shopping payment', 'Restaurant bill', 'Supermarket purchase', 'Taxi moto fare', 'Pharmacy'],
+    'Airtime Purchase': ['Airtime top-up', 'Data bundle purchase'],
+    'Bill Payment': ['Electricity bill (EUCL)', 'Water bill (WASAC)', 'TV subscription', 'Internet bill'],
+    'Deposit': ['Cash deposit at agent', 'Salary deposit', 'Bank to wallet transfer'],
+    'Withdrawal': ['Cash withdrawal at agent', 'ATM withdrawal'],
+}
+
+# Share of transactions per hour of day (Kigali time): quiet nights, busy days
+KIGALI_UTC_OFFSET = 2
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 7, 9, 9, 8, 8, 9, 8, 8, 8, 8, 9, 10, 9, 7, 5, 3, 2]
+
+FIELDS = ['type', 'amount', 'currency', 'sender', 'receiver', 'timestamp', 'status', 'reference', 'description']
+
+
+def _cumulative(weights: Iterable[float]):
+    return list(itertools.accumulate(weights))
+
+
+class TransactionGenerator:
+    """Deterministic stream of realistic MoMo transactions for a given seed."""
+
+    def __init__(self, seed: int = 42, accounts: int = 10000, start: str = '2024-01-01T00:00:00Z',
+                 transactions_per_day: float = 5000.0, duplicate_rate: float = 0.0):
+        self.rng = random.Random(seed)
+        self.start = datetime.strptime(start, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+        # Hour-of-day thinning rejects some arrivals, so draw candidates faster to compensate
+        acceptance = sum(HOURLY_WEIGHTS) / (len(HOURLY_WEIGHTS) * max(HOURLY_WEIGHTS))
+        self.mean_gap_seconds = 86400.0 / transactions_per_day * acceptance
+        self.duplicate_rate = duplicate_rate
+
+        self._types = list(TRANSACTION_TYPES)
+        self._type_weights = _cumulative(TRANSACTION_TYPES[t][0] for t in self._types)
+        self._status_weights = _cumulative(weight for _, weight in STATUSES)
+        self._prefix_weights = _cumulative(weight for _, weight in PHONE_PREFIXES)
+
+        # A fixed account pool with Zipf-like activity: a few numbers are very busy
+        self.phone_numbers = [self._random_phone_number() for _ in range(max(2, accounts))]
+        self._account_weights = _cumulative(1.0 / (rank + 1) ** 0.8 for rank in range(len(self.phone_numbers)))
+
+    def _pick(self, cumulative_weights):
+        return bisect(cumulative_weights, self.rng.random() * cumulative_weights[-1])
+
+    def _random_phone_number(self) -> str:
+        prefix = PHONE_PREFIXES[self._pick(self._prefix_weights)][0]
+        return f'{prefix}{self.rng.randrange(10**7):07d}'
+
+    def _pick_account(self) -> str:
+        return self.phone_numbers[min(self._pick(self._account_weights), len(self.phone_numbers) - 1)]
+
+    def _amount(self, transaction_type: str) -> float:
+        _, median, sigma, low, high = TRANSACTION_TYPES[transaction_type]
+        amount = self.rng.lognormvariate(math.log(median), sigma)
+        # MoMo amounts are whole RWF, usually rounded to the nearest 100
+        return float(min(high, max(low, round(amount / 100) * 100)))
+
+    def _next_timestamp(self, current: datetime) -> datetime:
+        candidate = current + timedelta(seconds=self.rng.expovariate(1.0 / self.mean_gap_seconds))
+        # Thin arrivals at quiet hours so the daily profile follows HOURLY_WEIGHTS
+        while self.rng.random() * max(HOURLY_WEIGHTS) > HOURLY_WEIGHTS[(candidate.hour + KIGALI_UTC_OFFSET) % 24]:
+            candidate += timedelta(seconds=self.rng.expovariate(1.0 / self.mean_gap_seconds))
+        return candidate
+
+    def generate(self, count: int) -> Iterator[Dict[str, Any]]:
+        current = self.start
+        previous = None
+        for transaction_id in range(1, count + 1):
+            if previous is not None and self.rng.random() < self.duplicate_rate:
+                # Re-delivered SMS: new record id, same reference and content
+                duplicate = dict(previous)
+                duplicate['id'] = transaction_id
+                yield duplicate
+                continue
+
+            current = self._next_timestamp(current)
+            transaction_type = self._types[self._pick(self._type_weights)]
+            sender = self._pick_account()
+            receiver = self._pick_account()
+            while receiver == sender:
+                receiver = self._pick_account()
+
+            previous = {
+                'id': transaction_id,
+                'type': transaction_type,
+                'amount': self._amount(transaction_type),
+                'currency': 'RWF',
+                'sender': sender,
+                'receiver': receiver,
+                'timestamp': current.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'status': STATUSES[self._pick(self._status_weights)][0],
+                'reference': f'TXN{transaction_id:09d}',
+                'description': self.rng.choice(DESCRIPTIONS[transaction_type])
+            }
+            yield previous
+
+
+def _format_value(field: str, value: Any) -> str:
+    if field == 'amount' and float(value).is_integer():
+        return str(int(value))
+    return escape(str(value))
+
+
+def write_xml(transactions: Iterable[Dict[str, Any]], output: TextIO, chunk_size: int = 1000) -> int:
+    # Same layout as data/raw/modified_sms_v2.xml; written in chunks, never held in memory
+    output.write('<?xml version="1.0" encoding="UTF-8"?>\n<sms_data>\n')
+    written = 0
+    chunk = []
+    for transaction in transactions:
+        chunk.append(f'    <transaction id={quoteattr(str(transaction["id"]))}>\n')
+        for field in FIELDS:
+            chunk.append(f'        <{field}>{_format_value(field, transaction[field])}</{field}>\n')
+        chunk.append('    </transaction>\n    \n')
+        written += 1
+        if written % chunk_size == 0:
+            output.write(''.join(chunk))
+            chunk = []
+    output.write(''.join(chunk))
+    output.write('</sms_data>\n')
+    return written
+
+
+def write_ndjson(transactions: Iterable[Dict[str, Any]], output: TextIO, chunk_size: int = 1000) -> int:
+    written = 0
+    chunk = []
+    for transaction in transactions:
+        chunk.append(json.dumps(transaction, ensure_ascii=False))
+        chunk.append('\n')
+        written += 1
+        if written % chunk_size == 0:
+            output.write(''.join(chunk))
+            chunk = []
+    output.write(''.join(chunk))
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic MoMo SMS transactions')
+    parser.add_argument('--count', type=float, default=1000, help='Number of transactions, e.g. 1e6 (default: 1000)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--accounts', type=int, default=10000, help='Size of the phone number pool (default: 10000)')
+    parser.add_argument('--start', default='2024-01-01T00:00:00Z', help='Timestamp of the first transaction')
+    parser.add_argument('--per-day', type=float, default=5000.0, help='Average transactions per day (default: 5000)')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help='Share of re-delivered messages (default: 0)')
+    parser.add_argument('--format', choices=['xml', 'ndjson'], default='xml', help='Output format (default: xml)')
+    parser.add_argument('--output', default='-', help='Output file, or - for stdout (default: -)')
+    args = parser.parse_args()
+
+    generator = TransactionGenerator(seed=args.seed, accounts=args.accounts, start=args.start,
+                                     transactions_per_day=args.per_day, duplicate_rate=args.duplicate_rate)
+    transactions = generator.generate(int(args.count))
+    writer = write_xml if args.format == 'xml' else write_ndjson
+
+    if args.output == '-':
+        writer(transactions, sys.stdout)
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        written = writer(transactions, f)
+    print(f"Wrote {written} transactions to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+import heapq
+from collections import deque
+from typing import List, Dict, Any, Tuple
+
+
+DIRECTIONS = ('out', 'in', 'both')
+
+
+class TransactionGraph:
+    """Sender -> receiver adjacency maps with per-edge transaction count and amount.
+
+    Every query starts from one number's edge map, so its cost depends on that
+    number's degree (or the size of the neighbourhood), never on the number of
+    transactions.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # outgoing[sender][receiver] and incoming[receiver][sender] share one [count, amount] edge
+        self.outgoing: Dict[str, Dict[str, List[float]]] = {}
+        self.incoming: Dict[str, Dict[str, List[float]]] = {}
+        self._edge_by_id: Dict[int, Tuple[str, str, float]] = {}
+        with store._lock:
+            for transaction in store.transactions:
+                self._add(transaction)
+            store.add_listener(self.on_change)
+
+    def __contains__(self, number: str) -> bool:
+        return number in self.outgoing or number in self.incoming
+
+    def _add(self, transaction: Dict[str, Any]):
+        sender, receiver = transaction.get('sender'), transaction.get('receiver')
+        if not sender or not receiver:
+            return
+        amount = float(transaction.get('amount') or 0)
+        edge = self.outgoing.setdefault(sender, {}).get(receiver)
+        if edge is None:
+            edge = self.outgoing[sender][receiver] = [0, 0.0]
+            self.incoming.setdefault(receiver, {})[sender] = edge
+        edge[0] += 1
+        edge[1] += amount
+        self._edge_by_id[transaction['id']] = (sender, receiver, amount)
+
+    def _remove(self, transaction_id: int):
+        previous = self._edge_by_id.pop(transaction_id, None)
+        if previous is None:
+            return
+        sender, receiver, amount = previous
+        edge = self.outgoing[sender][receiver]
+        edge[0] -= 1
+        edge[1] -= amount
+        if edge[0] == 0:
+            del self.outgoing[sender][receiver]
+            del self.incoming[receiver][sender]
+            if not self.outgoing[sender]:
+                del self.outgoing[sender]
+            if not self.incoming[receiver]:
+                del self.incoming[receiver]
+
+    def on_change(self, op: str, transaction: Dict[str, Any]):
+        # Store listener, called with the store lock held
+        if op != 'create':
+            self._remove(transaction['id'])
+        if op != 'delete':
+            self._add(transaction)
+
+    def _edges(self, number: str, direction: str) -> List[Tuple[str, str, List[float]]]:
+        # (counterparty, direction, edge) for one number
+        edges = []
+        if direction in ('out', 'both'):
+            edges.extend((other, 'out', edge) for other, edge in self.outgoing.get(number, {}).items())
+        if direction in ('in', 'both'):
+            edges.extend((other, 'in', edge) for other, edge in self.incoming.get(number, {}).items())
+        return edges
+
+    def top_counterparties(self, number: str, direction: str = 'out', by: str = 'amount',
+                           limit: int = 10) -> List[Dict[str, Any]]:
+        position = 1 if by == 'amount' else 0
+        with self.store._lock:
+            edges = self._edges(number, direction)
+            top = heapq.nlargest(limit, edges, key=lambda item: item[2][position])
+            return [{'number': other, 'direction': edge_direction, 'count': edge[0], 'amount': edge[1]}
+                    for other, edge_direction, edge in top]
+
+    def flow(self, source: str, target: str) -> Dict[str, Any]:
+        with self.store._lock:
+            forward = self.outgoing.get(source, {}).get(target, [0, 0.0])
+            backward = self.outgoing.get(target, {}).get(source, [0, 0.0])
+            return {
+                'from': source,
+                'to': target,
+                'sent': {'count': forward[0], 'amount': forward[1]},
+                'received': {'count': backward[0], 'amount': backward[1]},
+                'net_amount': forward[1] - backward[1]
+            }
+
+    def neighborhood(self, number: str, hops: int = 2, direction: str = 'both',
+                     max_nodes: int = 500) -> Dict[str, Any]:
+        # Breadth-first search; stops adding numbers once max_nodes have been reached
+        with self.store._lock:
+            distances = {number: 0}
+            queue = deque([number])
+            truncated = False
+            while queue:
+                current = queue.popleft()
+                if distances[current] == hops:
+                    continue
+                for other, _, _ in self._edges(current, direction):
+                    if other in distances:
+                        continue
+                    if len(distances) >= max_nodes:
+                        truncated = True
+                        break
+                    distances[other] = distances[current] + 1
+                    queue.append(other)
+
+            edges = [{'from': sender, 'to': receiver, 'count': edge[0], 'amount': edge[1]}
+                     for sender in distances
+                     for receiver, edge in self.outgoing.get(sender, {}).items() if receiver in distances]
+            return {
+                'number': number,
+                'hops': hops,
+                'nodes': [{'number': node, 'distance': distance} for node, distance in distances.items()],
+                'edges': edges,
+                'truncated': truncated
+            }
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, Optional, Tuple
+
+
+# Only settled transactions move money; pending and failed ones are ignored
+SETTLED_STATUS = 'Completed'
+
+
+class AccountLedger:
+    """One number's balance changes in (timestamp, id) order with running balances."""
+
+    __slots__ = ('keys', 'deltas', 'balances')
+
+    def __init__(self):
+        self.keys: List[Tuple[str, int]] = []
+        self.deltas: List[float] = []
+        # balances[i] is the balance after the first i + 1 changes (a prefix sum of deltas)
+        self.balances: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def insert(self, key: Tuple[str, int], delta: float):
+        position = bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.deltas.insert(position, delta)
+        self.balances.insert(position, 0.0)
+        # Appending in time order (the common case) only computes the new last entry
+        self._recompute_from(position)
+
+    def remove(self, key: Tuple[str, int]):
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+            del self.deltas[position]
+            del self.balances[position]
+            self._recompute_from(position)
+
+    def _recompute_from(self, position: int):
+        balance = self.balances[position - 1] if position else 0.0
+        for index in range(position, len(self.deltas)):
+            balance += self.deltas[index]
+            self.balances[index] = balance
+
+    @property
+    def balance(self) -> float:
+        return self.balances[-1] if self.balances else 0.0
+
+    def balance_at(self, timestamp: str) -> Tuple[float, int]:
+        # Balance after every change with timestamp <= the given one, and how many changes that is
+        position = bisect_right(self.keys, (timestamp, float('inf')))
+        return (self.balances[position - 1] if position else 0.0), position
+
+
+class BalanceLedger:
+    """Per-number running balances: senders are debited, receivers credited.
+
+    Current balance is O(1) and balance at a point in time one binary search.
+    Kept current through a store listener.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.accounts: Dict[str, AccountLedger] = {}
+        # id -> (key, sender, receiver, amount) of each posted transaction, to undo it
+        self._posted: Dict[int, Tuple[Tuple[str, int], str, str, float]] = {}
+        with store._lock:
+            for transaction in sorted(store.transactions, key=lambda t: (t.get('timestamp') or '', t['id'])):
+                self._post(transaction)
+            store.add_listener(self.on_change)
+
+    def __contains__(self, number: str) -> bool:
+        return number in self.accounts
+
+    def _account(self, number: str) -> AccountLedger:
+        account = self.accounts.get(number)
+        if account is None:
+            account = self.accounts[number] = AccountLedger()
+        return account
+
+    def _post(self, transaction: Dict[str, Any]):
+        sender, receiver = transaction.get('sender'), transaction.get('receiver')
+        if transaction.get('status') != SETTLED_STATUS or not sender or not receiver:
+            return
+        key = (transaction.get('timestamp') or '', transaction['id'])
+        amount = float(transaction.get('amount') or 0)
+        self._account(sender).insert(key, -amount)
+        self._account(receiver).insert(key, amount)
+        self._posted[transaction['id']] = (key, sender, receiver, amount)
+
+    def _unpost(self, transaction_id: int):
+        posted = self._posted.pop(transaction_id, None)
+        if posted is None:
+            return
+        key, sender, receiver, _ = posted
+        for number in (sender, receiver):
+            self.accounts[number].remove(key)
+            if not self.accounts[number]:
+                del self.accounts[number]
+
+    def on_change(self, op: str, transaction: Dict[str, Any]):
+        # Store listener, called with the store lock held
+        if op != 'create':
+            self._unpost(transaction['id'])
+        if op != 'delete':
+            self._post(transaction)
+
+    def balance(self, number: str, at: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self.store._lock:
+            account = self.accounts.get(number)
+            if account is None:
+                return None
+            if at is None:
+                return {'number': number, 'balance': account.balance, 'transactions': len(account)}
+            balance, count = account.balance_at(at)
+            return {'number': number, 'balance': balance, 'at': at, 'transactions': count}
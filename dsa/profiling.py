@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import os
+import io
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+from typing import Dict, Any, Optional
+
+
+# Setting this to a directory turns profiling on for the server and the dsa CLIs
+PROFILE_ENV_VAR = 'MOMO_PROFILE'
+
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 30
+TOP_FUNCTIONS = 40
+# From 3.12 cProfile hooks in through sys.monitoring, which covers every thread at once
+PROFILER_SEES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class StageProfiler:
+    """Per-stage wall time and call counts, plus cProfile and tracemalloc dumps.
+
+    Stages are measured by wrapping methods in place when profiling is enabled;
+    nothing is wrapped otherwise, so the disabled path costs nothing. Before Python
+    3.12 cProfile only sees the thread that enabled it, so every thread started
+    afterwards (request workers, the warm-up loader) gets its own profile, and the
+    dump merges them. From 3.12 one profile sees every thread.
+    """
+
+    def __init__(self, output_dir: str, name: str):
+        # cProfile, pstats and tracemalloc are imported here rather than at module level,
+        # so the server and CLIs only pay for them when profiling is turned on
+        import cProfile
+
+        self.output_dir = output_dir
+        self.name = name
+        self.stages: Dict[str, Dict[str, int]] = {}
+        self.profile = cProfile.Profile()
+        self.thread_profiles = []
+        self.started_at = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+
+    def start(self):
+        import tracemalloc
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        if not PROFILER_SEES_ALL_THREADS:
+            threading.setprofile(self._profile_thread)
+        self.profile.enable()
+        atexit.register(self.dump)
+
+    def stop(self):
+        import tracemalloc
+
+        atexit.unregister(self.dump)
+        threading.setprofile(None)
+        # Profile.disable() only unhooks the calling thread, so the profile functions of
+        # the other threads are cleared first; the disable()s then release each profile
+        if not PROFILER_SEES_ALL_THREADS:
+            _clear_thread_profile_functions()
+        with self._lock:
+            profiles = [self.profile] + self.thread_profiles
+        for profile in profiles:
+            profile.disable()
+        tracemalloc.stop()
+
+    def _profile_thread(self, frame, event, arg):
+        # Installed in each new thread by threading.setprofile; at its first event it
+        # replaces itself with a cProfile.Profile of that thread
+        import cProfile
+
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self._lock:
+            self.thread_profiles.append(profile)
+        profile.enable()
+
+    def instrument(self, owner, attribute: str, stage: str):
+        func = getattr(owner, attribute)
+        if getattr(func, '_profiled_stage', None):
+            return
+        stats = self.stages.setdefault(stage, {'calls': 0, 'total_ns': 0, 'max_ns': 0})
+        lock = self._lock
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                with lock:
+                    stats['calls'] += 1
+                    stats['total_ns'] += elapsed
+                    if elapsed > stats['max_ns']:
+                        stats['max_ns'] = elapsed
+
+        wrapper._profiled_stage = stage
+        setattr(owner, attribute, wrapper)
+
+    def _prefix(self) -> str:
+        return os.path.join(self.output_dir, f'{self.name}-{os.getpid()}')
+
+    def stage_report(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                stage: {
+                    'calls': stats['calls'],
+                    'total_seconds': stats['total_ns'] / 1e9,
+                    'mean_us': stats['total_ns'] / stats['calls'] / 1e3 if stats['calls'] else 0.0,
+                    'max_us': stats['max_ns'] / 1e3
+                }
+                for stage, stats in self.stages.items()
+            }
+        return {
+            'name': self.name,
+            'pid': os.getpid(),
+            'wall_seconds': (time.perf_counter_ns() - self.started_at) / 1e9,
+            'stages': stages
+        }
+
+    def dump(self) -> str:
+        # Safe to call repeatedly (e.g. on a signal); each call overwrites the files
+        import pstats
+        import tracemalloc
+
+        with self._dump_lock:
+            prefix = self._prefix()
+            
+            # Snapshot allocations first so the dump itself does not show up in them
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+                ])
+                current, peak = tracemalloc.get_traced_memory()
+                with open(f'{prefix}-allocations.txt', 'w', encoding='utf-8') as f:
+                    f.write(f"Traced memory: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n\n")
+                    for statistic in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                        f.write(f"{statistic}\n")
+            
+            # Profiles of other threads cannot be disabled from this one, so each is read as it runs
+            with self._lock:
+                profiles = [self.profile] + self.thread_profiles
+            text = io.StringIO()
+            stats = pstats.Stats(_ProfileSnapshot(profiles[0]), stream=text)
+            for profile in profiles[1:]:
+                stats.add(pstats.Stats(_ProfileSnapshot(profile)))
+            stats.dump_stats(f'{prefix}.pstats')
+            stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            with open(f'{prefix}-functions.txt', 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+            
+            with open(f'{prefix}-stages.json', 'w', encoding='utf-8') as f:
+                json.dump(self.stage_report(), f, indent=2)
+            
+            print(f"Profile written to {prefix}-*")
+            return prefix
+
+
+class _ProfileSnapshot:
+    # What pstats.Stats loads from: the calls a profile has recorded so far, without
+    # the disable() that Stats(profile) would call on it
+    def __init__(self, profile):
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self):
+        pass
+
+
+def _clear_thread_profile_functions():
+    # sys.setprofile(None) for every thread, as threading.setprofile_all_threads does from 3.12
+    import ctypes
+
+    api = ctypes.pythonapi
+    api.PyInterpreterState_Get.restype = ctypes.c_void_p
+    api.PyInterpreterState_ThreadHead.argtypes = [ctypes.c_void_p]
+    api.PyInterpreterState_ThreadHead.restype = ctypes.c_void_p
+    api.PyThreadState_Next.argtypes = [ctypes.c_void_p]
+    api.PyThreadState_Next.restype = ctypes.c_void_p
+    api._PyEval_SetProfile.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    thread_state = api.PyInterpreterState_ThreadHead(api.PyInterpreterState_Get())
+    while thread_state:
+        api._PyEval_SetProfile(thread_state, None, None)
+        thread_state = api.PyThreadState_Next(thread_state)
+
+
+_profiler: Optional[StageProfiler] = None
+
+
+def get_profiler() -> Optional[StageProfiler]:
+    return _profiler
+
+
+def enable_profiling(name: str, output_dir: Optional[str] = None) -> Optional[StageProfiler]:
+    # Returns None (and changes nothing) unless a directory is given or set in the environment
+    global _profiler
+    output_dir = output_dir or os.environ.get(PROFILE_ENV_VAR)
+    if not output_dir:
+        return None
+    if _profiler is None:
+        from xml_parser import SMSDataParser
+        from search_algorithms import TransactionSearch
+
+        _profiler = StageProfiler(output_dir, name)
+        _profiler.instrument(SMSDataParser, 'parse_xml', 'parse.parse_xml')
+        _profiler.instrument(SMSDataParser, '_extract_transaction_data', 'parse.extract_transaction_data')
+        _profiler.instrument(TransactionSearch, '__init__', 'index.build')
+        _profiler.start()
+    return _profiler
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+import heapq
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from transaction_store import TransactionStore
+from query_planner import QueryPlan, build_predicates, plan_query
+
+
+TRANSACTION_FIELDS = ('id', 'type', 'amount', 'currency', 'sender', 'receiver',
+                      'timestamp', 'status', 'reference', 'description')
+
+# Exact-match filters; amounts are filtered with min_amount / max_amount
+FILTER_FIELDS = ('type', 'status', 'sender', 'receiver', 'currency', 'reference')
+# Inclusive timestamp bounds: full ISO 8601 timestamps or prefixes ('2024-09' is all of September)
+TIME_FILTERS = ('from', 'to')
+# Every filter key a query accepts
+QUERY_FILTERS = FILTER_FIELDS + ('min_amount', 'max_amount') + TIME_FILTERS
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max')
+GROUP_BY_FIELDS = ('type', 'status', 'sender', 'receiver', 'currency')
+SORT_FIELDS = ('id', 'amount', 'timestamp')
+MAX_IDS = 500
+MAX_BATCH_QUERIES = 50
+MAX_PER_PAGE = 1000
+
+
+class QueryError(ValueError):
+    pass
+
+
+def parse_ids(raw_ids: Iterable[Any]) -> List[int]:
+    ids = []
+    for raw_id in raw_ids:
+        try:
+            ids.append(int(raw_id))
+        except (TypeError, ValueError):
+            raise QueryError(f"Invalid transaction ID: {raw_id}")
+    if len(ids) > MAX_IDS:
+        raise QueryError(f"At most {MAX_IDS} ids per request")
+    return ids
+
+
+def parse_fields(raw_fields: Optional[Any]) -> Optional[List[str]]:
+    # None means every field; accepts "id,amount" or ["id", "amount"]
+    if raw_fields is None:
+        return None
+    if isinstance(raw_fields, str):
+        raw_fields = [field.strip() for field in raw_fields.split(',') if field.strip()]
+    if not isinstance(raw_fields, list) or not raw_fields:
+        raise QueryError("fields must list at least one field")
+    for field in raw_fields:
+        if field not in TRANSACTION_FIELDS:
+            raise QueryError(f"Unknown field: {field}")
+    return list(dict.fromkeys(raw_fields))
+
+
+def project(transactions: List[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    # Applied to the final page only, so unrequested fields are never copied or encoded
+    if fields is None:
+        return transactions
+    return [{field: transaction.get(field) for field in fields} for transaction in transactions]
+
+
+def parse_sort(raw_sort: Optional[str]) -> Optional[Tuple[str, bool]]:
+    # "amount" sorts ascending, "-amount" descending; returns (field, descending)
+    if not raw_sort:
+        return None
+    descending = raw_sort.startswith('-')
+    field = raw_sort.lstrip('-')
+    if field not in SORT_FIELDS:
+        raise QueryError(f"Cannot sort by: {field}")
+    return field, descending
+
+
+def get_many(store: TransactionStore, ids: List[int]) -> Dict[str, Any]:
+    # Results keep the requested order; unknown ids are reported instead of failing the request
+    transactions = []
+    missing = []
+    for transaction_id in ids:
+        transaction = store.get(transaction_id)
+        if transaction is None:
+            missing.append(transaction_id)
+        else:
+            transactions.append(transaction)
+    return {"transactions": transactions, "missing": missing}
+
+
+def time_bounds(filters: Dict[str, Any]) -> Tuple[str, str]:
+    start = filters.get('from') or ''
+    end = filters.get('to')
+    if not isinstance(start, str) or not isinstance(end, (str, type(None))):
+        raise QueryError("from and to must be ISO 8601 timestamps")
+    # Every timestamp that starts with 'to' sorts below to + U+FFFF
+    return start, (end or '') + '\uffff'
+
+
+def _check_filter_names(filters: Dict[str, Any]):
+    unknown = set(filters) - set(QUERY_FILTERS)
+    if unknown:
+        raise QueryError(f"Unknown filter: {sorted(unknown)[0]}")
+
+
+def _parse_filters(filters: Dict[str, Any]):
+    # Splits filters into the (exact, amount_range, time_range) arguments of plan_query
+    _check_filter_names(filters)
+
+    exact = [(field, value) for field, value in filters.items() if field in FILTER_FIELDS]
+    try:
+        min_amount = float(filters['min_amount']) if 'min_amount' in filters else None
+        max_amount = float(filters['max_amount']) if 'max_amount' in filters else None
+    except (TypeError, ValueError):
+        raise QueryError("min_amount and max_amount must be numbers")
+    amount_range = (min_amount, max_amount) if min_amount is not None or max_amount is not None else None
+
+    time_range = None
+    if any(field in filters for field in TIME_FILTERS):
+        start, end = time_bounds(filters)
+        bounds = [f"{name} {filters[name]}" for name in TIME_FILTERS if filters.get(name)]
+        time_range = (start, end, ' '.join(['timestamp'] + bounds))
+    return exact, amount_range, time_range
+
+
+def plan(store: TransactionStore, filters: Dict[str, Any]) -> QueryPlan:
+    return plan_query(store, *_parse_filters(filters))
+
+
+def filter_transactions(transactions: List[Dict[str, Any]], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Filters a plain list, without indexes; stores go through plan()
+    results = transactions
+    for predicate in build_predicates(*_parse_filters(filters)):
+        results = predicate.apply(results)
+    return results if results is not transactions else list(transactions)
+
+
+def aggregate(transactions: List[Dict[str, Any]], functions: List[str],
+              group_by: Optional[str] = None) -> Dict[str, Any]:
+    for function in functions:
+        if function not in AGGREGATES:
+            raise QueryError(f"Unknown aggregate: {function}")
+    if group_by is None:
+        return _aggregate_amounts([t.get('amount', 0) for t in transactions], functions)
+    if group_by not in GROUP_BY_FIELDS:
+        raise QueryError(f"Cannot group by: {group_by}")
+
+    groups: Dict[Any, List[float]] = {}
+    for transaction in transactions:
+        groups.setdefault(transaction.get(group_by), []).append(transaction.get('amount', 0))
+    return {str(key): _aggregate_amounts(amounts, functions) for key, amounts in groups.items()}
+
+
+def _aggregate_amounts(amounts: List[float], functions: List[str]) -> Dict[str, Any]:
+    results = {}
+    for function in functions:
+        if function == 'count':
+            results['count'] = len(amounts)
+        elif function == 'sum':
+            results['sum'] = sum(amounts)
+        elif function == 'avg':
+            results['avg'] = sum(amounts) / len(amounts) if amounts else None
+        elif function == 'min':
+            results['min'] = min(amounts, default=None)
+        elif function == 'max':
+            results['max'] = max(amounts, default=None)
+    return results
+
+
+def paginate(transactions: List[Dict[str, Any]], page: int, per_page: int,
+             total: Optional[int] = None) -> Dict[str, Any]:
+    # With total given, transactions is already the requested page
+    if total is None:
+        total = len(transactions)
+        start_idx = (page - 1) * per_page
+        transactions = transactions[start_idx:start_idx + per_page]
+    return {
+        "transactions": transactions,
+        "pagination": {
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "total_pages": (total + per_page - 1) // per_page
+        }
+    }
+
+
+def select(store: TransactionStore, filters: Dict[str, Any], sort: Optional[Tuple[str, bool]] = None,
+           page: int = 1, per_page: int = 20, explain: bool = False) -> Dict[str, Any]:
+    """Returns one page of the transactions matching filters, optionally sorted.
+
+    Unfiltered sorts read the page straight from the field's sorted index.
+    Filters are evaluated as plan_query() decides; filtered sorts then keep only
+    the best page * per_page matches in a heap, so the cost is O(n log k)
+    rather than a full sort of every match. Without a sort, rows come in the
+    order of the index the plan reads. With explain, the result also carries
+    the plan with its estimated and actual row counts.
+    """
+    if page < 1 or per_page < 1:
+        raise QueryError("page and per_page must be at least 1")
+    start_idx = (page - 1) * per_page
+
+    if sort is not None and not filters:
+        field, descending = sort
+        index = store.sorted_index(field)
+        rows = [store.get(transaction_id) for transaction_id in index.ids(start_idx, per_page, descending)]
+        # A row deleted since the ids were read is skipped rather than returned as null
+        result = paginate([row for row in rows if row is not None], page, per_page, len(index))
+        if explain:
+            result['plan'] = {'driving_index': f'sorted_index({field})', 'estimated_rows_scanned': per_page,
+                              'rows_scanned': len(rows), 'filters': [], 'estimated_rows_matched': len(index)}
+        return result
+
+    query_plan = plan(store, filters)
+    matches = query_plan.execute()
+    if sort is None:
+        # Id order whatever index drove the query, so pages stay put as index statistics change
+        matches = sorted(matches, key=lambda t: t['id'])
+        result = paginate(matches, page, per_page)
+    else:
+        field, descending = sort
+        key = _sort_key(field)
+        select_k = heapq.nlargest if descending else heapq.nsmallest
+        top = select_k(start_idx + per_page, matches, key=key)
+        result = paginate(top[start_idx:], page, per_page, len(matches))
+    if explain:
+        result['plan'] = query_plan.explain()
+        if sort is not None:
+            result['plan']['sort'] = {'method': 'heap_top_k', 'k': start_idx + per_page}
+    return result
+
+
+def prepare_indexes(store: TransactionStore):
+    # Builds every index a query can read, instead of on the first query that needs each one
+    store.reference_index()
+    for field in SORT_FIELDS:
+        store.sorted_index(field)
+    for field in FILTER_FIELDS:
+        # reference filters use the reference index above
+        if field != 'reference':
+            store.value_index(field)
+    store.time_segments()
+
+
+def _sort_key(field: str):
+    if field == 'timestamp':
+        return lambda t: (t.get('timestamp') or '', t['id'])
+    if field == 'id':
+        return lambda t: t['id']
+    return lambda t: (t.get(field) if t.get(field) is not None else float('-inf'), t['id'])
+
+
+def run_query(store: TransactionStore, query: Dict[str, Any]) -> Dict[str, Any]:
+    """Executes one query object from POST /query/batch.
+
+    {"ids": [1, 2]} fetches by id; otherwise "filter" selects transactions, which
+    are returned a page at a time ("page", "per_page", "sort") or, when "aggregate" lists
+    functions of the amount, summarised (optionally per "group_by" value).
+    "fields" limits the keys of returned transactions; "explain": true adds the query plan.
+    """
+    if not isinstance(query, dict):
+        raise QueryError("Each query must be a JSON object")
+    fields = parse_fields(query.get('fields'))
+
+    if 'ids' in query:
+        if not isinstance(query['ids'], list):
+            raise QueryError("ids must be a list")
+        result = get_many(store, parse_ids(query['ids']))
+        result['transactions'] = project(result['transactions'], fields)
+        return result
+
+    filters = query.get('filter', {})
+    if not isinstance(filters, dict):
+        raise QueryError("filter must be an object")
+
+    functions = query.get('aggregate')
+    if functions is not None:
+        if isinstance(functions, str):
+            functions = [functions]
+        query_plan = plan(store, filters)
+        result = {"aggregates": aggregate(query_plan.execute(), functions, query.get('group_by'))}
+        if query.get('explain'):
+            result['plan'] = query_plan.explain()
+        return result
+
+    try:
+        page = int(query.get('page', 1))
+        per_page = int(query.get('per_page', 20))
+    except (TypeError, ValueError):
+        raise QueryError("page and per_page must be integers")
+    if per_page > MAX_PER_PAGE:
+        raise QueryError(f"per_page must be at most {MAX_PER_PAGE} in batch queries")
+    result = select(store, filters, parse_sort(query.get('sort')), page, per_page, bool(query.get('explain')))
+    result['transactions'] = project(result['transactions'], fields)
+    return result
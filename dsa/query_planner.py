@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+from typing import List, Dict, Any, Optional, Tuple
+
+from transaction_store import TransactionStore
+
+
+# Reaching a row through an index (id lookup plus list copy) costs about this many sequentially scanned rows
+INDEX_ROW_COST = 2.0
+
+
+class Predicate:
+    """One filter of a query with the number of rows an index says it matches.
+
+    kind is 'eq' (field == low), 'reference' (reference == low, read from the
+    unique by-reference index), 'amount' (low <= amount <= high, either side
+    optional) or 'time' (low <= timestamp <= high).
+    """
+
+    __slots__ = ('kind', 'field', 'low', 'high', 'label', 'access', 'estimated_rows')
+
+    def __init__(self, kind: str, field: str, low: Any, high: Any, label: str):
+        self.kind = kind
+        self.field = field
+        self.low = low
+        self.high = high
+        self.label = label
+        self.access = {'eq': f'value_index({field})', 'reference': 'reference_index',
+                       'amount': 'sorted_index(amount)', 'time': 'time_segments'}[kind]
+        self.estimated_rows = 0
+
+    def estimate(self, store: TransactionStore) -> int:
+        if self.kind == 'eq':
+            return store.value_index(self.field).count(self.low)
+        if self.kind == 'reference':
+            return int(store.get_by_reference(self.low) is not None)
+        if self.kind == 'amount':
+            return store.sorted_index('amount').count_between(self.low, self.high)
+        return store.time_segments().count_between(self.low, self.high)
+
+    def fetch(self, store: TransactionStore) -> List[Dict[str, Any]]:
+        # Exactly the rows matching this predicate, read from its index
+        if self.kind == 'time':
+            return store.time_range(self.low, self.high)
+        if self.kind == 'eq':
+            index = store.value_index(self.field)
+            with store._lock:
+                return index.get(self.low)
+        if self.kind == 'reference':
+            transaction = store.get_by_reference(self.low)
+            return [transaction] if transaction is not None else []
+        index = store.sorted_index('amount')
+        with store._lock:
+            return [store.get(transaction_id) for transaction_id in index.ids_between(self.low, self.high)]
+
+    def apply(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # One comprehension per predicate; much cheaper than testing every predicate per row in Python
+        if self.kind in ('eq', 'reference'):
+            field, value = self.field, self.low
+            return [t for t in rows if t.get(field) == value]
+        if self.kind == 'time':
+            start, end = self.low, self.high
+            return [t for t in rows if start <= (t.get('timestamp') or '') <= end]
+        if self.low is not None:
+            low = self.low
+            rows = [t for t in rows if t.get('amount', 0) >= low]
+        if self.high is not None:
+            high = self.high
+            rows = [t for t in rows if t.get('amount', 0) <= high]
+        return rows
+
+
+class QueryPlan:
+    """The access path chosen for one query and the order its other filters run in.
+
+    execute() records the rows each step actually saw next to the estimates,
+    which explain() reports.
+    """
+
+    def __init__(self, store: TransactionStore, total_rows: int, driver: Optional[Predicate],
+                 residual: List[Predicate], alternatives: List[Dict[str, Any]]):
+        self.store = store
+        self.total_rows = total_rows
+        self.driver = driver
+        self.residual = residual
+        self.alternatives = alternatives
+        self.rows_scanned: Optional[int] = None
+        self.steps: List[Dict[str, Any]] = []
+
+    @property
+    def driving_index(self) -> str:
+        return self.driver.access if self.driver is not None else 'full_scan'
+
+    def execute(self) -> List[Dict[str, Any]]:
+        rows = self.store.transactions if self.driver is None else self.driver.fetch(self.store)
+        self.rows_scanned = len(rows)
+        self.steps = []
+        for predicate in self.residual:
+            rows_in = len(rows)
+            rows = predicate.apply(rows)
+            self.steps.append({'rows_in': rows_in, 'rows_out': len(rows)})
+        return rows
+
+    def explain(self) -> Dict[str, Any]:
+        # Residual selectivities are combined as if the filters were independent
+        estimated = self.driver.estimated_rows if self.driver is not None else self.total_rows
+        filters = []
+        if self.driver is not None:
+            filters.append({'filter': self.driver.label, 'access': self.driver.access,
+                            'estimated_rows': self.driver.estimated_rows})
+        for position, predicate in enumerate(self.residual):
+            selectivity = predicate.estimated_rows / self.total_rows if self.total_rows else 0.0
+            estimated_in, estimated = estimated, estimated * selectivity
+            step = {'filter': predicate.label, 'access': 'scan', 'selectivity': round(selectivity, 4),
+                    'estimated_rows_in': round(estimated_in), 'estimated_rows_out': round(estimated)}
+            if position < len(self.steps):
+                step.update(self.steps[position])
+            filters.append(step)
+        return {
+            'driving_index': self.driving_index,
+            'estimated_rows_scanned': self.driver.estimated_rows if self.driver is not None else self.total_rows,
+            'rows_scanned': self.rows_scanned,
+            'filters': filters,
+            'estimated_rows_matched': round(estimated),
+            'alternatives': self.alternatives
+        }
+
+
+def build_predicates(exact: List[Tuple[str, Any]],
+                     amount_range: Optional[Tuple[Optional[float], Optional[float]]] = None,
+                     time_range: Optional[Tuple[str, str, str]] = None) -> List[Predicate]:
+    # exact holds (field, value) equality filters, amount_range (min, max) and time_range (start, end, label)
+    # References are unique, so their equality filter reads the by-reference index instead of a value index
+    predicates = [Predicate('reference' if field == 'reference' else 'eq', field, value, None, f'{field} = {value!r}')
+                  for field, value in exact]
+    if amount_range is not None:
+        low, high = amount_range
+        bounds = [f'amount >= {low:g}'] if low is not None else []
+        bounds += [f'amount <= {high:g}'] if high is not None else []
+        predicates.append(Predicate('amount', 'amount', low, high, ' and '.join(bounds)))
+    if time_range is not None:
+        start, end, label = time_range
+        predicates.append(Predicate('time', 'timestamp', start, end, label))
+    return predicates
+
+
+def plan_query(store: TransactionStore, exact: List[Tuple[str, Any]],
+               amount_range: Optional[Tuple[Optional[float], Optional[float]]] = None,
+               time_range: Optional[Tuple[str, str, str]] = None) -> QueryPlan:
+    """Chooses the cheapest way to evaluate a conjunction of filters.
+
+    Each filter's matching rows are counted from its index: per-value counts,
+    a binary search of the amount index or of the monthly time segments. The
+    cheapest of a full scan and reading one filter's rows from its index
+    drives the query; the remaining filters then run most selective first,
+    so each scans as few rows as possible. Indexes a filter needs are built
+    on its first use and maintained after that.
+    """
+    predicates = build_predicates(exact, amount_range, time_range)
+    total_rows = len(store)
+    for predicate in predicates:
+        predicate.estimated_rows = predicate.estimate(store)
+
+    alternatives = [{'access': 'full_scan', 'estimated_cost': total_rows}]
+    driver = None
+    best_cost = float(total_rows)
+    for predicate in predicates:
+        cost = predicate.estimated_rows * INDEX_ROW_COST
+        alternatives.append({'access': predicate.access, 'estimated_cost': round(cost)})
+        if cost < best_cost:
+            driver, best_cost = predicate, cost
+
+    residual = sorted((p for p in predicates if p is not driver), key=lambda p: p.estimated_rows)
+    return QueryPlan(store, total_rows, driver, residual, alternatives)
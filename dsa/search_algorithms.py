@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
 import os
-import time
 import random
-from xml_parser import SMSDataParser
+from timing import measure
+from sorted_index import SortedIndex
+from segments import SegmentedTimeIndex
+from value_index import ValueIndex
 from typing import List, Dict, Any, Optional
 
 
@@ -11,10 +13,99 @@ class TransactionSearch:
     def __init__(self, transactions: List[Dict[str, Any]]):
         self.transactions = transactions
         self.transaction_dict = self._build_dictionary()
+        # Built on first use by reference_index() / sorted_index() / value_index() / time_segments();
+        # maintained on every change after that, so an id-only workload never pays for them
+        self.reference_dict: Optional[Dict[str, Dict[str, Any]]] = None
+        self.sorted_indexes: Dict[str, SortedIndex] = {}
+        self.value_indexes: Dict[str, ValueIndex] = {}
+        self.time_index: Optional[SegmentedTimeIndex] = None
         
     def _build_dictionary(self) -> Dict[int, Dict[str, Any]]:
         return {transaction['id']: transaction for transaction in self.transactions}
     
+    def _build_reference_index(self) -> Dict[str, Dict[str, Any]]:
+        # First occurrence wins, matching the ingest-time deduplication
+        index = {}
+        for transaction in self.transactions:
+            reference = transaction.get('reference')
+            if reference and reference not in index:
+                index[reference] = transaction
+        return index
+    
+    def add_transaction(self, transaction: Dict[str, Any]):
+        self.transactions.append(transaction)
+        self.transaction_dict[transaction['id']] = transaction
+        if self.reference_dict is not None and transaction.get('reference'):
+            self.reference_dict.setdefault(transaction['reference'], transaction)
+        for sorted_index in self.sorted_indexes.values():
+            sorted_index.add(transaction)
+        for value_index in self.value_indexes.values():
+            value_index.add(transaction)
+        if self.time_index is not None:
+            self.time_index.add(transaction)
+    
+    def remove_transaction(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        transaction = self.transaction_dict.pop(transaction_id, None)
+        if transaction is None:
+            return None
+        for index, candidate in enumerate(self.transactions):
+            if candidate is transaction:
+                del self.transactions[index]
+                break
+        if self.reference_dict is not None and self.reference_dict.get(transaction.get('reference')) is transaction:
+            del self.reference_dict[transaction['reference']]
+        for sorted_index in self.sorted_indexes.values():
+            sorted_index.remove(transaction_id, transaction.get(sorted_index.field))
+        for value_index in self.value_indexes.values():
+            value_index.remove(transaction_id, transaction.get(value_index.field))
+        if self.time_index is not None:
+            self.time_index.remove(transaction)
+        return transaction
+    
+    def reindex_reference(self, transaction: Dict[str, Any], old_reference: Optional[str]):
+        if self.reference_dict is None:
+            return
+        if old_reference and self.reference_dict.get(old_reference) is transaction:
+            del self.reference_dict[old_reference]
+        if transaction.get('reference'):
+            self.reference_dict.setdefault(transaction['reference'], transaction)
+    
+    def reindex(self, transaction: Dict[str, Any], old_values: Dict[str, Any]):
+        # old_values holds the previous value of each field that was just updated
+        if 'reference' in old_values and old_values['reference'] != transaction.get('reference'):
+            self.reindex_reference(transaction, old_values['reference'])
+        for field, sorted_index in self.sorted_indexes.items():
+            if field in old_values and old_values[field] != transaction.get(field):
+                sorted_index.remove(transaction['id'], old_values[field])
+                sorted_index.add(transaction)
+        for field, value_index in self.value_indexes.items():
+            if field in old_values and old_values[field] != transaction.get(field):
+                value_index.remove(transaction['id'], old_values[field])
+                value_index.add(transaction)
+        if self.time_index is not None and 'timestamp' in old_values \
+                and old_values['timestamp'] != transaction.get('timestamp'):
+            self.time_index.update(transaction, old_values['timestamp'])
+    
+    def reference_index(self) -> Dict[str, Dict[str, Any]]:
+        if self.reference_dict is None:
+            self.reference_dict = self._build_reference_index()
+        return self.reference_dict
+    
+    def sorted_index(self, field: str) -> SortedIndex:
+        if field not in self.sorted_indexes:
+            self.sorted_indexes[field] = SortedIndex(field, self.transactions)
+        return self.sorted_indexes[field]
+    
+    def value_index(self, field: str) -> ValueIndex:
+        if field not in self.value_indexes:
+            self.value_indexes[field] = ValueIndex(field, self.transactions)
+        return self.value_indexes[field]
+    
+    def time_segments(self, lock=None) -> SegmentedTimeIndex:
+        if self.time_index is None:
+            self.time_index = SegmentedTimeIndex(self.transactions, lock)
+        return self.time_index
+    
     def linear_search_by_id(self, transaction_id: int) -> Optional[Dict[str, Any]]:
         for transaction in self.transactions:
             if transaction['id'] == transaction_id:
@@ -24,6 +115,9 @@ class TransactionSearch:
     def dictionary_lookup_by_id(self, transaction_id: int) -> Optional[Dict[str, Any]]:
         return self.transaction_dict.get(transaction_id)
     
+    def dictionary_lookup_by_reference(self, reference: str) -> Optional[Dict[str, Any]]:
+        return self.reference_index().get(reference)
+    
     def linear_search_by_amount_range(self, min_amount: float, max_amount: float) -> List[Dict[str, Any]]:
         results = []
         for transaction in self.transactions:
@@ -31,6 +125,16 @@ class TransactionSearch:
                 results.append(transaction)
         return results
     
+    def linear_search_by_time_range(self, start: str, end: str) -> List[Dict[str, Any]]:
+        return [transaction for transaction in self.transactions
+                if start <= (transaction.get('timestamp') or '') <= end]
+    
+    def segment_search_by_time_range(self, start: str, end: str) -> List[Dict[str, Any]]:
+        # Only months overlapping [start, end] are visited; results come in timestamp order
+        index = self.time_segments()
+        with index.lock:
+            return [self.transaction_dict[transaction_id] for transaction_id in index.ids_between(start, end)]
+    
     def linear_search_by_type(self, transaction_type: str) -> List[Dict[str, Any]]:
         results = []
         for transaction in self.transactions:
@@ -81,62 +185,26 @@ class PerformanceAnalyzer:
         if len(transactions) < 20:
             print("Warning: Less than 20 transactions available for meaningful comparison")
         
-        # Generate random transaction IDs for testing
+        # Generate random transaction IDs and amounts for testing
         available_ids = [t['id'] for t in transactions]
-        test_ids = random.choices(available_ids, k=num_tests)
-        
-        # Test Linear Search
-        linear_times = []
-        for test_id in test_ids:
-            start_time = time.time()
-            self.search_engine.linear_search_by_id(test_id)
-            end_time = time.time()
-            linear_times.append(end_time - start_time)
-        
-        # Test Dictionary Lookup
-        dict_times = []
-        for test_id in test_ids:
-            start_time = time.time()
-            self.search_engine.dictionary_lookup_by_id(test_id)
-            end_time = time.time()
-            dict_times.append(end_time - start_time)
-        
-        # Calculate statistics
-        linear_avg = sum(linear_times) / len(linear_times)
-        dict_avg = sum(dict_times) / len(dict_times)
+        test_ids = [(test_id,) for test_id in random.choices(available_ids, k=num_tests)]
+        test_amounts = [(random.choice(transactions)['amount'],) for _ in range(num_tests)]
         
-        # Test Binary Search (for amount-based searches)
-        binary_times = []
-        test_amounts = [random.choice(transactions)['amount'] for _ in range(num_tests)]
-        for amount in test_amounts:
-            start_time = time.time()
-            self.search_engine.binary_search_by_amount(amount)
-            end_time = time.time()
-            binary_times.append(end_time - start_time)
+        # Batched perf_counter_ns timing with warmup (see timing.measure)
+        linear = self._to_seconds(measure(self.search_engine.linear_search_by_id, test_ids))
+        dictionary = self._to_seconds(measure(self.search_engine.dictionary_lookup_by_id, test_ids))
+        binary = self._to_seconds(measure(self.search_engine.binary_search_by_amount, test_amounts))
         
-        binary_avg = sum(binary_times) / len(binary_times)
+        linear_avg = linear['average_time']
+        dict_avg = dictionary['average_time']
+        binary_avg = binary['average_time']
         
         results = {
             'total_transactions': len(transactions),
             'test_iterations': num_tests,
-            'linear_search': {
-                'average_time': linear_avg,
-                'total_time': sum(linear_times),
-                'min_time': min(linear_times),
-                'max_time': max(linear_times)
-            },
-            'dictionary_lookup': {
-                'average_time': dict_avg,
-                'total_time': sum(dict_times),
-                'min_time': min(dict_times),
-                'max_time': max(dict_times)
-            },
-            'binary_search': {
-                'average_time': binary_avg,
-                'total_time': sum(binary_times),
-                'min_time': min(binary_times),
-                'max_time': max(binary_times)
-            },
+            'linear_search': linear,
+            'dictionary_lookup': dictionary,
+            'binary_search': binary,
             'performance_comparison': {
                 'linear_vs_dict_speedup': linear_avg / dict_avg if dict_avg > 0 else float('inf'),
                 'linear_vs_binary_speedup': linear_avg / binary_avg if binary_avg > 0 else float('inf'),
@@ -147,6 +215,17 @@ class PerformanceAnalyzer:
         self.results = results
         return results
     
+    def _to_seconds(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'average_time': stats['mean_ns'] / 1e9,
+            'total_time': stats['mean_ns'] * stats['calls'] / 1e9,
+            'min_time': stats['min_ns'] / 1e9,
+            'p50_time': stats['p50_ns'] / 1e9,
+            'p99_time': stats['p99_ns'] / 1e9,
+            'max_time': stats['max_ns'] / 1e9,
+            'calls': stats['calls']
+        }
+    
     def print_performance_report(self):
         if not self.results:
             print("No performance data available. Run measure_search_performance() first.")
@@ -156,15 +235,17 @@ class PerformanceAnalyzer:
         print("SEARCH ALGORITHM PERFORMANCE ANALYSIS")
         print("=" * 60)
         print(f"Total Transactions: {self.results['total_transactions']}")
-        print(f"Test Iterations: {self.results['test_iterations']}")
+        print(f"Distinct Test Inputs: {self.results['test_iterations']}")
         print()
         
         # Linear Search Results
         linear = self.results['linear_search']
         print("LINEAR SEARCH (O(n)):")
         print(f"  Average Time: {linear['average_time']:.8f} seconds")
-        print(f"  Total Time: {linear['total_time']:.6f} seconds")
+        print(f"  Total Time: {linear['total_time']:.6f} seconds ({linear['calls']} calls)")
         print(f"  Min Time: {linear['min_time']:.8f} seconds")
+        print(f"  Median Time: {linear['p50_time']:.8f} seconds")
+        print(f"  P99 Time: {linear['p99_time']:.8f} seconds")
         print(f"  Max Time: {linear['max_time']:.8f} seconds")
         print()
         
@@ -172,8 +253,10 @@ class PerformanceAnalyzer:
         dict_lookup = self.results['dictionary_lookup']
         print("DICTIONARY LOOKUP (O(1)):")
         print(f"  Average Time: {dict_lookup['average_time']:.8f} seconds")
-        print(f"  Total Time: {dict_lookup['total_time']:.6f} seconds")
+        print(f"  Total Time: {dict_lookup['total_time']:.6f} seconds ({dict_lookup['calls']} calls)")
         print(f"  Min Time: {dict_lookup['min_time']:.8f} seconds")
+        print(f"  Median Time: {dict_lookup['p50_time']:.8f} seconds")
+        print(f"  P99 Time: {dict_lookup['p99_time']:.8f} seconds")
         print(f"  Max Time: {dict_lookup['max_time']:.8f} seconds")
         print()
         
@@ -181,8 +264,10 @@ class PerformanceAnalyzer:
         binary = self.results['binary_search']
         print("BINARY SEARCH (O(log n)):")
         print(f"  Average Time: {binary['average_time']:.8f} seconds")
-        print(f"  Total Time: {binary['total_time']:.6f} seconds")
+        print(f"  Total Time: {binary['total_time']:.6f} seconds ({binary['calls']} calls)")
         print(f"  Min Time: {binary['min_time']:.8f} seconds")
+        print(f"  Median Time: {binary['p50_time']:.8f} seconds")
+        print(f"  P99 Time: {binary['p99_time']:.8f} seconds")
         print(f"  Max Time: {binary['max_time']:.8f} seconds")
         print()
         
@@ -203,10 +288,25 @@ class PerformanceAnalyzer:
 
 
 def main():
+    import argparse
+    from xml_parser import SMSDataParser
+    from profiling import enable_profiling
+
     # Get the directory of this script
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
-    xml_file_path = os.path.join(project_root, 'data', 'raw', 'modified_sms_v2.xml')
+    
+    arg_parser = argparse.ArgumentParser(description='Search algorithm demonstrations and performance analysis')
+    arg_parser.add_argument('xml_file', nargs='?', default=os.path.join(project_root, 'data', 'raw', 'modified_sms_v2.xml'),
+                            help='XML file to load (default: data/raw/modified_sms_v2.xml)')
+    arg_parser.add_argument('--profile', metavar='DIR', help='Write parse/index profiles to DIR (or set MOMO_PROFILE)')
+    args = arg_parser.parse_args()
+    xml_file_path = args.xml_file
+    
+    profiler = enable_profiling('search_algorithms', args.profile)
+    if profiler:
+        # When run as a script this module is __main__, not the search_algorithms profiling imported
+        profiler.instrument(TransactionSearch, '__init__', 'index.build')
     
     # Parse XML data
     parser = SMSDataParser(xml_file_path)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, Optional, Tuple
+
+
+# Creates, updates and deletes held in the head before a background compaction starts
+COMPACT_THRESHOLD = 4096
+
+
+def month_of(timestamp: Optional[str]) -> str:
+    # Calendar month (YYYY-MM) of an ISO 8601 timestamp; '' for a missing one
+    return (timestamp or '')[:7]
+
+
+class TimeSegment:
+    """Sorted (timestamp, id) entries of one calendar month with their time bounds. Never modified."""
+
+    __slots__ = ('month', 'entries', 'min_timestamp', 'max_timestamp')
+
+    def __init__(self, month: str, entries: List[Tuple[str, int]]):
+        self.month = month
+        self.entries = tuple(entries)
+        self.min_timestamp = entries[0][0]
+        self.max_timestamp = entries[-1][0]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def overlaps(self, start: str, end: str) -> bool:
+        return self.min_timestamp <= end and self.max_timestamp >= start
+
+    def _range(self, start: str, end: str) -> Tuple[int, int]:
+        if start <= self.min_timestamp and self.max_timestamp <= end:
+            return 0, len(self.entries)
+        return bisect_left(self.entries, (start,)), bisect_right(self.entries, (end, float('inf')))
+
+    def entries_between(self, start: str, end: str) -> Tuple[Tuple[str, int], ...]:
+        low, high = self._range(start, end)
+        return self.entries if high - low == len(self.entries) else self.entries[low:high]
+
+    def count_between(self, start: str, end: str) -> int:
+        low, high = self._range(start, end)
+        return max(0, high - low)
+
+
+class SegmentedTimeIndex:
+    """Transaction ids partitioned into monthly segments by timestamp.
+
+    Sealed segments are immutable and carry min/max timestamps, so a time range
+    query skips every month outside the range and binary-searches the rest.
+    Changes land in a small mutable head (id -> timestamp of created or updated
+    transactions) and a tombstone set (deleted ids); a sealed entry is live only
+    while its id is in neither. When they reach compact_threshold, a background
+    thread rewrites the affected months into new sealed segments and swaps them
+    in, dropping deleted and superseded entries.
+    """
+
+    def __init__(self, transactions: List[Dict[str, Any]], lock=None, compact_threshold: int = COMPACT_THRESHOLD):
+        # Pass the owning store's lock so queries and compaction swaps are ordered against its writes
+        self.lock = lock or threading.RLock()
+        self.compact_threshold = compact_threshold
+        self.segments: Dict[str, TimeSegment] = {}
+        self.head: Dict[int, str] = {}
+        self.tombstones = set()
+        # Months whose sealed segment holds an entry that the head or a tombstone now overrides
+        self._dirty_months = set()
+        self._compactor: Optional[threading.Thread] = None
+        self.compactions = 0
+
+        by_month: Dict[str, List[Tuple[str, int]]] = {}
+        for transaction in transactions:
+            timestamp = transaction.get('timestamp') or ''
+            by_month.setdefault(month_of(timestamp), []).append((timestamp, transaction['id']))
+        for month, entries in by_month.items():
+            entries.sort()
+            self.segments[month] = TimeSegment(month, entries)
+
+    def add(self, transaction: Dict[str, Any]):
+        with self.lock:
+            self.head[transaction['id']] = transaction.get('timestamp') or ''
+            self._maybe_compact()
+
+    def update(self, transaction: Dict[str, Any], old_timestamp: Optional[str]):
+        with self.lock:
+            self.head[transaction['id']] = transaction.get('timestamp') or ''
+            self._dirty_months.add(month_of(old_timestamp))
+            self._maybe_compact()
+
+    def remove(self, transaction: Dict[str, Any]):
+        with self.lock:
+            self.head.pop(transaction['id'], None)
+            self.tombstones.add(transaction['id'])
+            self._dirty_months.add(month_of(transaction.get('timestamp')))
+            self._maybe_compact()
+
+    def ids_between(self, start: str, end: str) -> List[int]:
+        """Ids with start <= timestamp <= end, in (timestamp, id) order."""
+        with self.lock:
+            masked = self.head.keys() | self.tombstones
+            sealed = []
+            for month in sorted(self.segments):
+                segment = self.segments[month]
+                if not segment.overlaps(start, end):
+                    continue
+                entries = segment.entries_between(start, end)
+                if masked:
+                    sealed.extend(entry for entry in entries if entry[1] not in masked)
+                else:
+                    sealed.extend(entries)
+            recent = sorted((timestamp, transaction_id) for transaction_id, timestamp in self.head.items()
+                            if start <= timestamp <= end)
+            return [transaction_id for _, transaction_id in heapq.merge(sealed, recent)]
+
+    def count_between(self, start: str, end: str) -> int:
+        # Estimate for query planning: sealed plus head entries in range, overridden entries included
+        with self.lock:
+            sealed = sum(segment.count_between(start, end) for segment in self.segments.values()
+                         if segment.overlaps(start, end))
+            return sealed + sum(1 for timestamp in self.head.values() if start <= timestamp <= end)
+
+    def segments_scanned(self, start: str, end: str) -> int:
+        with self.lock:
+            return sum(1 for segment in self.segments.values() if segment.overlaps(start, end))
+
+    def _maybe_compact(self):
+        if len(self.head) + len(self.tombstones) < self.compact_threshold:
+            return
+        if self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(target=self.compact, name='segment-compactor', daemon=True)
+            self._compactor.start()
+
+    def compact(self) -> bool:
+        # Snapshot the head under the lock, build the new segments without it, swap them in under it
+        with self.lock:
+            if not self.head and not self.tombstones:
+                return False
+            head = dict(self.head)
+            tombstones = set(self.tombstones)
+            dirty, self._dirty_months = self._dirty_months, set()
+            months = dirty | {month_of(timestamp) for timestamp in head.values()}
+            previous = {month: self.segments.get(month) for month in months}
+
+        rebuilt: Dict[str, Optional[TimeSegment]] = {}
+        for month in months:
+            entries = []
+            if previous[month] is not None:
+                entries = [entry for entry in previous[month].entries
+                           if entry[1] not in head and entry[1] not in tombstones]
+            entries.extend((timestamp, transaction_id) for transaction_id, timestamp in head.items()
+                           if month_of(timestamp) == month)
+            entries.sort()
+            rebuilt[month] = TimeSegment(month, entries) if entries else None
+
+        with self.lock:
+            for month, segment in rebuilt.items():
+                if segment is None:
+                    self.segments.pop(month, None)
+                else:
+                    self.segments[month] = segment
+            # Entries changed again while compacting stay in the head, which still overrides them
+            for transaction_id, timestamp in head.items():
+                if self.head.get(transaction_id) == timestamp:
+                    del self.head[transaction_id]
+            self.tombstones -= tombstones
+            self.compactions += 1
+        return True
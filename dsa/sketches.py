@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import math
+import random
+import hashlib
+from collections import Counter
+from typing import List, Optional
+
+
+class HyperLogLog:
+    """Distinct-count sketch: 2**precision one-byte registers, ~1.04/sqrt(2**precision) relative error."""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+
+    def add(self, item: str):
+        value = int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little')
+        index = value >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        # Position of the leftmost 1-bit in the remaining bits
+        rank = remaining_bits - (value & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        histogram = Counter(self.registers)
+        estimate = alpha * m * m / sum(occurrences * 2.0 ** -rank for rank, occurrences in histogram.items())
+        zeros = histogram.get(0, 0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.num_registers)
+
+
+class KLLSketch:
+    """Streaming quantiles (Karnin, Lang, Liberty): O(k) memory, rank error about 1.7/k.
+
+    Items live in levels of compactors; an item at level h stands for 2**h
+    inputs. A full level is sorted and every other item is promoted.
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = 0):
+        self.k = k
+        self.compactors: List[List[float]] = []
+        self.size = 0
+        self.max_size = 0
+        self.count = 0
+        self.min_value: Optional[float] = None
+        self.max_value: Optional[float] = None
+        self._random = random.Random(seed)
+        self._grow()
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def update(self, value: float):
+        self.compactors[0].append(value)
+        self.size += 1
+        self.count += 1
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self):
+        for level, compactor in enumerate(self.compactors):
+            if len(compactor) >= self._capacity(level):
+                if level + 1 >= len(self.compactors):
+                    self._grow()
+                compactor.sort()
+                # Keep the last item of an odd-length level so no input is lost
+                leftover = [compactor.pop()] if len(compactor) % 2 else []
+                offset = self._random.randrange(2)
+                self.compactors[level + 1].extend(compactor[offset::2])
+                self.compactors[level] = leftover
+                self.size = sum(len(c) for c in self.compactors)
+                return
+
+    def merge(self, other: 'KLLSketch'):
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.count += other.count
+        if other.min_value is not None:
+            self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+            self.max_value = other.max_value if self.max_value is None else max(self.max_value, other.max_value)
+        self.size = sum(len(c) for c in self.compactors)
+        while self.size >= self.max_size:
+            self._compress()
+
+    def quantiles(self, fractions: List[float]) -> List[Optional[float]]:
+        if not self.count:
+            return [None] * len(fractions)
+        weighted = sorted((value, 1 << level) for level, compactor in enumerate(self.compactors) for value in compactor)
+        total_weight = sum(weight for _, weight in weighted)
+        results = []
+        for fraction in fractions:
+            if fraction <= 0:
+                results.append(self.min_value)
+                continue
+            if fraction >= 1:
+                results.append(self.max_value)
+                continue
+            target = fraction * total_weight
+            cumulative = 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    results.append(value)
+                    break
+        return results
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        return self.quantiles([fraction])[0]
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+from bisect import bisect_left, bisect_right, insort
+from typing import List, Dict, Any, Optional, Tuple
+
+
+class SortedIndex:
+    """Transaction ids ordered by one field, kept sorted as transactions change.
+
+    Entries are (key, id) pairs, so ties are broken by id and any entry can be
+    found again with a binary search given its old key.
+    """
+
+    def __init__(self, field: str, transactions: List[Dict[str, Any]]):
+        self.field = field
+        self.entries: List[Tuple[Any, int]] = sorted(self._entry(t) for t in transactions)
+
+    def _entry(self, transaction: Dict[str, Any]) -> Tuple[Any, int]:
+        return (self.sort_key(transaction.get(self.field)), transaction['id'])
+
+    def sort_key(self, value: Any) -> Any:
+        # Missing values sort first; timestamps are ISO 8601 strings, so they sort as text
+        if self.field == 'timestamp':
+            return value or ''
+        return value if value is not None else float('-inf')
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, transaction: Dict[str, Any]):
+        insort(self.entries, self._entry(transaction))
+
+    def remove(self, transaction_id: int, value: Any):
+        entry = (self.sort_key(value), transaction_id)
+        position = bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def ids(self, start: int, count: int, descending: bool = False) -> List[int]:
+        # Ids at positions start .. start + count of the ascending or descending order
+        if descending:
+            end = len(self.entries) - start
+            selected = self.entries[max(0, end - count):max(0, end)][::-1]
+        else:
+            selected = self.entries[start:start + count]
+        return [transaction_id for _, transaction_id in selected]
+
+    def _range(self, low: Optional[Any], high: Optional[Any]) -> Tuple[int, int]:
+        # Positions of the entries with low <= key <= high; None leaves that side open
+        start = bisect_left(self.entries, (self.sort_key(low),)) if low is not None else 0
+        end = bisect_right(self.entries, (self.sort_key(high), float('inf'))) if high is not None else len(self.entries)
+        return start, max(start, end)
+
+    def count_between(self, low: Optional[Any], high: Optional[Any]) -> int:
+        start, end = self._range(low, high)
+        return end - start
+
+    def ids_between(self, low: Optional[Any], high: Optional[Any]) -> List[int]:
+        start, end = self._range(low, high)
+        return [transaction_id for _, transaction_id in self.entries[start:end]]
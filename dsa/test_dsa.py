@@ -1,9 +1,29 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import json
 import time
+import random
+import gzip
+import lzma
+import struct
+import tempfile
+from datetime import datetime
 from xml_parser import SMSDataParser
+from xml_backends import available_backends
 from search_algorithms import TransactionSearch
+from bloom_filter import BloomFilter
+from data_generator import TransactionGenerator, write_xml
+from transaction_store import TransactionStore
+from query_engine import QueryError, run_query, select, filter_transactions
+from sketches import HyperLogLog, KLLSketch
+from analytics import AnalyticsIndex
+from graph_index import TransactionGraph
+from ledger import BalanceLedger
+from profiling import StageProfiler
+from anomaly import AnomalyDetector, BURST_LIMIT
+from columnar import export_transactions, pyarrow, ARROW_MAGIC, COLUMNS
 
 
 def test_xml_parsing():
@@ -158,6 +178,593 @@ def test_data_structures():
     print(f"  Memory overhead: {dict_size - list_size} bytes")
     print()
 
+def test_duplicate_detection():
+    print()
+    print("=" * 60)
+    print("DUPLICATE DETECTION TEST")
+    print("=" * 60)
+    
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    xml_file_path = os.path.join(project_root, 'data', 'raw', 'modified_sms_v2.xml')
+    
+    # Streaming ingest and full parse must agree on the deduplicated set
+    parser = SMSDataParser(xml_file_path)
+    streamed = list(parser.iter_transactions())
+    parsed = SMSDataParser(xml_file_path).parse_xml()
+    print(f"Streamed {len(streamed)} transactions, parsed {len(parsed)} transactions")
+    assert [t['id'] for t in streamed] == [t['id'] for t in parsed]
+    
+    # Reference index lookups; the index is only built by the first lookup
+    search_engine = TransactionSearch(parsed)
+    assert search_engine.reference_dict is None
+    reference = parsed[0]['reference']
+    assert search_engine.dictionary_lookup_by_reference(reference) is parsed[0]
+    print(f"Reference lookup for {reference}: ID {parsed[0]['id']}")
+    
+    # Changes made before the index exists are seen once it is built, and maintained after that
+    store = TransactionStore([dict(t) for t in parsed])
+    store.delete(parsed[1]['id'])
+    assert store.search_engine.reference_dict is None
+    assert store.get_by_reference(parsed[1]['reference']) is None
+    assert store.get_by_reference(parsed[2]['reference'])['id'] == parsed[2]['id']
+    created = store.create({'type': 'Transfer', 'amount': 10, 'sender': '+250788000001',
+                            'receiver': '+250788000002', 'reference': 'TXN_LAZY_INDEX'})
+    store.update(parsed[2]['id'], {'reference': 'TXN_LAZY_RENAMED'})
+    assert store.get_by_reference('TXN_LAZY_INDEX')['id'] == created['id']
+    assert store.get_by_reference('TXN_LAZY_RENAMED')['id'] == parsed[2]['id']
+    assert store.get_by_reference(parsed[2]['reference']) is None
+    
+    # Bloom filter never reports a false negative
+    bloom = BloomFilter(expected_items=1000, false_positive_rate=0.01)
+    references = [f"TXN{i:09d}" for i in range(1000)]
+    for ref in references:
+        bloom.add(ref)
+    assert all(ref in bloom for ref in references)
+    false_positives = sum(1 for i in range(1000, 11000) if f"TXN{i:09d}" in bloom)
+    print(f"Bloom filter: {bloom.size_in_bytes} bytes, {bloom.num_hashes} hashes, "
+          f"false positive rate {false_positives / 10000:.4f} (target 0.01)")
+    print()
+
+def test_data_generator():
+    print()
+    print("=" * 60)
+    print("DATA GENERATOR TEST")
+    print("=" * 60)
+    
+    # Same seed, same data
+    first = list(TransactionGenerator(seed=7).generate(500))
+    second = list(TransactionGenerator(seed=7).generate(500))
+    assert first == second
+    
+    # Generated XML round-trips through the parser unchanged
+    with tempfile.TemporaryDirectory() as workdir:
+        xml_file_path = os.path.join(workdir, 'generated.xml')
+        with open(xml_file_path, 'w', encoding='utf-8') as f:
+            write_xml(first, f)
+        parsed = list(SMSDataParser(xml_file_path).iter_transactions())
+    
+    assert parsed == first
+    print(f"Generated and re-parsed {len(parsed)} transactions")
+    print(f"Sample: {parsed[0]['type']} {parsed[0]['amount']} RWF "
+          f"{parsed[0]['sender']} -> {parsed[0]['receiver']} at {parsed[0]['timestamp']}")
+    print()
+
+def test_xml_backends():
+    print()
+    print("=" * 60)
+    print("XML BACKENDS TEST")
+    print("=" * 60)
+    
+    transactions = list(TransactionGenerator(seed=11).generate(2000))
+    transactions[3]['description'] = 'Rent & utilities <June> "paid" in café'
+    with tempfile.TemporaryDirectory() as workdir:
+        xml_file_path = os.path.join(workdir, 'generated.xml')
+        with open(xml_file_path, 'w', encoding='utf-8') as f:
+            write_xml(transactions, f)
+        
+        # Every backend reads the same file into the same records
+        for backend in available_backends():
+            parsed = list(SMSDataParser(xml_file_path, backend=backend).iter_transactions())
+            assert parsed == transactions, backend
+            print(f"{backend}: {len(parsed)} transactions")
+        
+        # The scanner hands over to a full parser mid-file for layouts it does not handle
+        with open(xml_file_path, encoding='utf-8') as f:
+            content = f.read()
+        position = content.index('<transaction id="1500"')
+        with open(xml_file_path, 'w', encoding='utf-8') as f:
+            f.write(content[:position] + '<!-- re-sent batch -->\n    ' + content[position:])
+        parser = SMSDataParser(xml_file_path, backend='scanner')
+        assert list(parser.iter_transactions()) == transactions
+        print(f"Scanner fell back to {parser.backend.name} without losing records")
+    print()
+
+def test_compressed_input():
+    print()
+    print("=" * 60)
+    print("COMPRESSED INPUT TEST")
+    print("=" * 60)
+    
+    transactions = list(TransactionGenerator(seed=17).generate(1000))
+    with tempfile.TemporaryDirectory() as workdir:
+        # Archives are read in place, whatever the file is called
+        for name, compress in [('sms.xml.gz', gzip.open), ('sms.xml.xz', lzma.open), ('sms.dat', gzip.open)]:
+            archive_path = os.path.join(workdir, name)
+            with compress(archive_path, 'wt', encoding='utf-8') as f:
+                write_xml(transactions, f)
+            parser = SMSDataParser(archive_path)
+            assert list(parser.iter_transactions()) == transactions
+            assert parser.parse_xml() == transactions
+            print(f"{name}: {os.path.getsize(archive_path)} bytes, {len(transactions)} transactions")
+        
+        # A truncated archive is reported as a parse error, not raised
+        with open(archive_path, 'rb') as f:
+            truncated = f.read()[:2000]
+        with open(archive_path, 'wb') as f:
+            f.write(truncated)
+        parser = SMSDataParser(archive_path)
+        assert parser.parse_xml() == [] and parser.transactions == []
+    print()
+
+def test_query_engine():
+    print()
+    print("=" * 60)
+    print("QUERY ENGINE TEST")
+    print("=" * 60)
+    
+    transactions = list(TransactionGenerator(seed=11).generate(1000))
+    store = TransactionStore(transactions)
+    
+    # Multi-get keeps the requested order and reports unknown ids
+    result = run_query(store, {"ids": [5, 3, 99999]})
+    assert [t['id'] for t in result['transactions']] == [5, 3]
+    assert result['missing'] == [99999]
+    
+    # Projection keeps only the requested fields
+    page = run_query(store, {"filter": {"status": "Completed"}, "per_page": 5, "fields": ["id", "amount"]})
+    assert all(set(t) == {'id', 'amount'} for t in page['transactions'])
+    
+    # Grouped aggregates agree with a filtered page
+    totals = run_query(store, {"aggregate": ["count", "sum"], "group_by": "type"})['aggregates']
+    transfers = run_query(store, {"filter": {"type": "Transfer"}, "per_page": 1000})
+    assert totals['Transfer']['count'] == transfers['pagination']['total']
+    for transaction_type, values in sorted(totals.items()):
+        print(f"{transaction_type}: {values['count']} transactions, {values['sum']:.0f} RWF")
+    
+    # Sorted index pages and heap top-k agree with a full sort, including after writes
+    run_query(store, {"sort": "-amount"})
+    store.update(transactions[0]['id'], {'amount': 10 ** 9})
+    store.delete(transactions[1]['id'])
+    expected = sorted(store.transactions, key=lambda t: (t['amount'], t['id']), reverse=True)
+    top = run_query(store, {"sort": "-amount", "page": 2, "per_page": 10})['transactions']
+    assert top == expected[10:20]
+    payments = [t for t in expected if t['type'] == 'Payment'][:5]
+    assert run_query(store, {"filter": {"type": "Payment"}, "sort": "-amount", "per_page": 5})['transactions'] == payments
+    print(f"Largest amount: {run_query(store, {'sort': '-amount', 'per_page': 1})['transactions'][0]['amount']:.0f} RWF")
+    
+    try:
+        run_query(store, {"filter": {"colour": "red"}})
+        assert False, "unknown filter accepted"
+    except QueryError as e:
+        print(f"Rejected invalid query: {e}")
+    print()
+
+def test_sketches():
+    print()
+    print("=" * 60)
+    print("APPROXIMATE ANALYTICS TEST")
+    print("=" * 60)
+    
+    # HyperLogLog distinct counts, including after merging overlapping halves
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(30000):
+        first.add(f"+25078{i:07d}")
+        second.add(f"+25078{i + 15000:07d}")
+    first.merge(second)
+    error = abs(first.count() - 45000) / 45000
+    print(f"HyperLogLog: {first.count()} distinct (exact 45000, error {error:.2%})")
+    assert error < 4 * first.relative_error
+    
+    # KLL quantiles stay within a small rank error of the exact answer
+    amounts = [t['amount'] for t in TransactionGenerator(seed=5).generate(20000)]
+    sketch = KLLSketch()
+    for amount in amounts:
+        sketch.update(amount)
+    ordered = sorted(amounts)
+    for fraction, estimate in zip([0.5, 0.95, 0.99], sketch.quantiles([0.5, 0.95, 0.99])):
+        rank = sum(1 for amount in ordered if amount < estimate) / len(ordered)
+        print(f"p{int(fraction * 100)} amount: {estimate:.0f} RWF (rank {rank:.3f})")
+        assert abs(rank - fraction) < 0.03
+    
+    # Buckets follow writes, including deletes
+    store = TransactionStore(list(TransactionGenerator(seed=5).generate(2000)))
+    analytics = AnalyticsIndex(store)
+    store.delete(store.transactions[0]['id'])
+    assert analytics.summary()['total']['count'] == len(store)
+    
+    # A write moving a transaction to another month rebuilds just the two buckets, and they match a scan
+    moved = store.transactions[1]
+    store.update(moved['id'], {'timestamp': '2019-01-15T08:00:00Z', 'amount': 777})
+    by_month = {}
+    for transaction in store.transactions:
+        by_month[transaction['timestamp'][:7]] = by_month.get(transaction['timestamp'][:7], 0) + 1
+    summary = analytics.summary()
+    assert {month['month']: month['count'] for month in summary['months']} == by_month
+    assert summary['total']['count'] == len(store)
+    
+    # Values the sketches cannot hash are refused before the store or any listener changes
+    count = len(store)
+    for bad in ({'sender': 12345}, {'type': None}, {'reference': 7}):
+        try:
+            store.create(dict({'type': 'Payment', 'amount': 10, 'sender': '+250700000001', 'receiver': '+250700000002'}, **bad))
+            assert False, f"accepted {bad}"
+        except ValueError:
+            pass
+        try:
+            store.update(moved['id'], bad)
+            assert False, f"accepted {bad}"
+        except ValueError:
+            pass
+    assert len(store) == count and analytics.summary()['total']['count'] == count
+    print(f"Analytics buckets: {len(analytics.buckets)}, total count {len(store)}")
+    print()
+
+def test_graph_index():
+    print()
+    print("=" * 60)
+    print("TRANSACTION GRAPH TEST")
+    print("=" * 60)
+    
+    store = TransactionStore(list(TransactionGenerator(seed=9, accounts=200).generate(5000)))
+    graph = TransactionGraph(store)
+    
+    # Incremental maintenance through updates and deletes
+    first = store.transactions[0]
+    store.update(first['id'], {'receiver': store.transactions[1]['receiver'], 'amount': 12345})
+    store.delete(store.transactions[2]['id'])
+    
+    # Top counterparties agree with a full scan
+    sender = first['sender']
+    totals = {}
+    for transaction in store.transactions:
+        if transaction['sender'] == sender:
+            totals[transaction['receiver']] = totals.get(transaction['receiver'], 0) + transaction['amount']
+    top = graph.top_counterparties(sender, limit=3)
+    assert [c['amount'] for c in top] == sorted(totals.values(), reverse=True)[:3]
+    print(f"{sender} pays {len(totals)} numbers; top: {top[0]['number']} ({top[0]['amount']:.0f} RWF)")
+    
+    flow = graph.flow(sender, top[0]['number'])
+    assert flow['sent']['amount'] == top[0]['amount']
+    neighborhood = graph.neighborhood(sender, hops=2)
+    print(f"2-hop neighbourhood: {len(neighborhood['nodes'])} numbers, {len(neighborhood['edges'])} edges")
+    print()
+
+def test_balance_ledger():
+    print()
+    print("=" * 60)
+    print("BALANCE LEDGER TEST")
+    print("=" * 60)
+    
+    store = TransactionStore(list(TransactionGenerator(seed=13, accounts=100).generate(3000)))
+    ledger = BalanceLedger(store)
+    store.update(store.transactions[0]['id'], {'amount': 777})
+    store.delete(store.transactions[1]['id'])
+    store.create({'type': 'Transfer', 'amount': 5000, 'sender': store.transactions[5]['sender'],
+                  'receiver': store.transactions[5]['receiver'], 'timestamp': '2023-01-01T00:00:00Z'})
+    
+    # Current and point-in-time balances agree with summing every transaction
+    def brute_force(number, at=None):
+        balance = 0.0
+        for t in store.transactions:
+            if t['status'] != 'Completed' or (at is not None and t['timestamp'] > at):
+                continue
+            if t['sender'] == number:
+                balance -= t['amount']
+            if t['receiver'] == number:
+                balance += t['amount']
+        return balance
+    
+    number = store.transactions[5]['sender']
+    own = sorted(t['timestamp'] for t in store.transactions if number in (t['sender'], t['receiver']))
+    middle = own[len(own) // 2]
+    assert abs(ledger.balance(number)['balance'] - brute_force(number)) < 1e-6
+    assert abs(ledger.balance(number, middle)['balance'] - brute_force(number, middle)) < 1e-6
+    print(f"{number}: balance {ledger.balance(number)['balance']:.0f} RWF, "
+          f"{ledger.balance(number, middle)['balance']:.0f} RWF at {middle}")
+    print()
+
+def test_time_segments():
+    print()
+    print("=" * 60)
+    print("TIME SEGMENTS TEST")
+    print("=" * 60)
+    
+    store = TransactionStore(list(TransactionGenerator(seed=19).generate(5000)))
+    index = store.time_segments()
+    index.compact_threshold = 200
+    months = ['2023-12', '2024-01', '2024-02', '2024-03']
+    
+    def brute_force(start, end):
+        return sorted((t['timestamp'], t['id']) for t in store.transactions if start <= t['timestamp'] <= end)
+    
+    # Random writes across months, with compactions running underneath
+    rng = random.Random(19)
+    for _ in range(1000):
+        choice = rng.random()
+        if choice < 0.4:
+            store.create({'type': 'Transfer', 'amount': 100, 'sender': '+250700000001', 'receiver': '+250700000002',
+                          'timestamp': f'{rng.choice(months)}-{rng.randint(10, 28)}T08:00:00Z'})
+        elif choice < 0.7:
+            transaction = rng.choice(store.transactions)
+            store.update(transaction['id'], {'timestamp': f'{rng.choice(months)}-0{rng.randint(1, 9)}T08:00:00Z'})
+        else:
+            store.delete(rng.choice(store.transactions)['id'])
+    index.compact()
+    
+    start, end = f'{months[1]}-05', f'{months[1]}-20T23:59:59Z'
+    assert [(t['timestamp'], t['id']) for t in store.time_range(start, end)] == brute_force(start, end)
+    assert [(t['timestamp'], t['id']) for t in store.time_range('', '\uffff')] == brute_force('', '\uffff')
+    print(f"{len(index.segments)} monthly segments, {index.compactions} compactions, head {len(index.head)}")
+    print(f"{start} .. {end}: {len(store.time_range(start, end))} transactions "
+          f"from {index.segments_scanned(start, end)} segment(s)")
+    print()
+
+def test_query_planner():
+    print()
+    print("=" * 60)
+    print("QUERY PLANNER TEST")
+    print("=" * 60)
+    
+    store = TransactionStore(list(TransactionGenerator(seed=23).generate(5000)))
+    sender, sender_type = store.transactions[0]['sender'], store.transactions[0]['type']
+    queries = [
+        {'sender': sender},
+        {'sender': sender, 'type': sender_type},
+        {'min_amount': 400000, 'status': 'Completed'},
+        {'from': '2024-01-01T06', 'to': '2024-01-01T07', 'type': 'Transfer'},
+        {'type': 'Payment', 'max_amount': 50000, 'from': '2024-01-01T20'},
+        {'status': 'Completed'}
+    ]
+    
+    # Writes after the indexes exist must be reflected in every plan
+    rng = random.Random(23)
+    for round_number in range(2):
+        for filters in queries:
+            result = select(store, filters, ('id', False), 1, 10000, explain=True)
+            expected = sorted(filter_transactions(store.transactions, filters), key=lambda t: t['id'])
+            assert result['transactions'] == expected, filters
+            plan = result['plan']
+            assert result['pagination']['total'] == len(expected)
+            if round_number == 0:
+                print(f"{str(filters):60} -> {plan['driving_index']:22} "
+                      f"scanned {plan['rows_scanned']:5} (est. {plan['estimated_rows_scanned']}), matched {len(expected)}")
+        for _ in range(300):
+            transaction = rng.choice(store.transactions)
+            store.update(transaction['id'], {'sender': sender, 'amount': rng.randint(100, 500000)})
+            store.delete(rng.choice(store.transactions)['id'])
+    
+    plan = select(store, {'sender': sender, 'type': sender_type}, explain=True)['plan']
+    assert plan['driving_index'] == 'value_index(sender)'
+    assert select(store, {'status': 'Completed'}, explain=True)['plan']['driving_index'] == 'full_scan'
+    
+    # Unsorted pages come back in id order whichever index drives the query
+    unsorted = select(store, {'sender': sender, 'type': sender_type}, None, 1, 10000)['transactions']
+    assert [t['id'] for t in unsorted] == sorted(t['id'] for t in unsorted)
+    
+    # Reference equality reads the unique reference index; no value index is built for it
+    reference = store.transactions[5]['reference']
+    result = select(store, {'reference': reference, 'status': store.transactions[5]['status']}, explain=True)
+    assert result['plan']['driving_index'] == 'reference_index' and result['transactions'] == [store.transactions[5]]
+    assert select(store, {'reference': 'TXN-NO-SUCH-REFERENCE'})['transactions'] == []
+    assert 'reference' not in store.search_engine.value_indexes
+    print()
+
+def test_anomaly_detection():
+    print()
+    print("=" * 60)
+    print("ANOMALY DETECTION TEST")
+    print("=" * 60)
+    
+    detector = AnomalyDetector(max_senders=50, max_pairs=50)
+    regular = {'type': 'Transfer', 'sender': '+250700000001', 'receiver': '+250700000002'}
+    flags = []
+    for minute in range(20):
+        flags += detector.observe(dict(regular, id=minute, amount=1000 + 10 * minute,
+                                       timestamp=f'2024-05-01T{minute // 2:02d}:{minute % 2 * 30:02d}:00Z'))
+    assert not flags
+    spike = detector.observe(dict(regular, id=100, amount=50000, timestamp='2024-05-01T12:00:00Z'))
+    assert [flag['kind'] for flag in spike] == ['amount_spike']
+    
+    # BURST_LIMIT + 1 transactions from one sender within a minute
+    burst = []
+    for second in range(BURST_LIMIT + 1):
+        burst += detector.observe({'id': 200 + second, 'sender': '+250700000003', 'receiver': f'+2507100000{second:02d}',
+                                   'amount': 500, 'timestamp': f'2024-05-01T13:00:{second:02d}Z'})
+    assert [flag['kind'] for flag in burst] == ['burst']
+    
+    there = detector.observe({'id': 300, 'sender': '+250700000004', 'receiver': '+250700000005',
+                              'amount': 80000, 'timestamp': '2024-05-02T08:00:00Z'})
+    back = detector.observe({'id': 301, 'sender': '+250700000005', 'receiver': '+250700000004',
+                             'amount': 78000, 'timestamp': '2024-05-02T09:30:00Z'})
+    assert not there and [flag['kind'] for flag in back] == ['round_trip']
+    
+    # API creates without a timestamp are stamped when received, not with one fixed time shared by
+    # all of them, so they neither look simultaneous nor land next to history from that time
+    history = [{'id': 1, 'type': 'Transfer', 'amount': 5000.0, 'sender': '+250700000007', 'receiver': '+250700000006',
+                'timestamp': '2024-09-27T11:00:00Z', 'reference': 'TXN-HISTORY-1'}]
+    history += [{'id': 2 + i, 'type': 'Transfer', 'amount': 5000.0, 'sender': '+250700000006',
+                 'receiver': f'+2507200000{i:02d}', 'timestamp': f'2024-09-27T11:59:{i:02d}Z',
+                 'reference': f'TXN-HISTORY-{2 + i}'} for i in range(BURST_LIMIT)]
+    store = TransactionStore(history)
+    store_detector = AnomalyDetector(store)
+    before = time.time()
+    created = [store.create({'type': 'Transfer', 'amount': 5000, 'sender': '+250700000006',
+                             'receiver': '+250700000007'}) for _ in range(3)]
+    assert store_detector.recent_flags()['flags'] == []
+    for transaction in created:
+        stamped = datetime.fromisoformat(transaction['timestamp'].replace('Z', '+00:00')).timestamp()
+        assert before - 1 <= stamped <= time.time() + 1
+    
+    # State stays bounded however many senders are seen
+    for transaction in TransactionGenerator(seed=29).generate(2000):
+        detector.observe(transaction)
+    assert len(detector.senders) <= 50 and len(detector.pairs) <= 50
+    
+    cursor = spike[0]['flag_id']
+    newer = detector.recent_flags(since=cursor, kind='round_trip')
+    assert newer['flags'][0]['transaction_id'] == 301
+    print(f"Observed {detector.observed} transactions, flags: {detector.counts}")
+    print(f"Tracking {len(detector.senders)} senders and {len(detector.pairs)} pairs")
+    print()
+
+def _flatbuffer_field(buf: bytes, table: int, slot: int):
+    # Position of a field of the FlatBuffers table at offset table, or None when it is absent
+    vtable = table - struct.unpack_from('<i', buf, table)[0]
+    if 4 + 2 * slot >= struct.unpack_from('<H', buf, vtable)[0]:
+        return None
+    offset = struct.unpack_from('<H', buf, vtable + 4 + 2 * slot)[0]
+    return table + offset if offset else None
+
+def _flatbuffer_child(buf: bytes, table: int, slot: int) -> int:
+    # Position of the table, vector or string a field's uoffset points to
+    position = _flatbuffer_field(buf, table, slot)
+    return position + struct.unpack_from('<I', buf, position)[0]
+
+def _read_arrow_file(data: bytes):
+    # Checks an Arrow IPC file's framing and footer without pyarrow; returns
+    # (column names, [(row count, body buffers, body bytes)] per record batch)
+    assert data.startswith(ARROW_MAGIC + b'\0\0') and data.endswith(ARROW_MAGIC)
+    footer_length = struct.unpack_from('<i', data, len(data) - len(ARROW_MAGIC) - 4)[0]
+    footer = data[len(data) - len(ARROW_MAGIC) - 4 - footer_length:len(data) - len(ARROW_MAGIC) - 4]
+    root = struct.unpack_from('<I', footer, 0)[0]
+    assert struct.unpack_from('<h', footer, _flatbuffer_field(footer, root, 0))[0] == 4  # MetadataVersion V5
+    fields = _flatbuffer_child(footer, _flatbuffer_child(footer, root, 1), 1)
+    names = []
+    for index in range(struct.unpack_from('<I', footer, fields)[0]):
+        field = fields + 4 + 4 * index
+        name = _flatbuffer_child(footer, field + struct.unpack_from('<I', footer, field)[0], 0)
+        names.append(footer[name + 4:name + 4 + struct.unpack_from('<I', footer, name)[0]].decode('utf-8'))
+    
+    blocks = _flatbuffer_child(footer, root, 3)
+    batches = []
+    for index in range(struct.unpack_from('<I', footer, blocks)[0]):
+        offset, metadata_length, body_length = struct.unpack_from('<qi4xq', footer, blocks + 4 + 24 * index)
+        assert data[offset:offset + 4] == b'\xff\xff\xff\xff' and offset % 8 == 0
+        assert struct.unpack_from('<i', data, offset + 4)[0] == metadata_length - 8
+        message = data[offset + 8:offset + metadata_length]
+        root = struct.unpack_from('<I', message, 0)[0]
+        assert message[_flatbuffer_field(message, root, 1)] == 3  # MessageHeader.RecordBatch
+        assert struct.unpack_from('<q', message, _flatbuffer_field(message, root, 3))[0] == body_length
+        header = _flatbuffer_child(message, root, 2)
+        rows = struct.unpack_from('<q', message, _flatbuffer_field(message, header, 0))[0]
+        buffers = _flatbuffer_child(message, header, 2)
+        body_buffers = [struct.unpack_from('<qq', message, buffers + 4 + 16 * i)
+                        for i in range(struct.unpack_from('<I', message, buffers)[0])]
+        assert all(start % 8 == 0 and start + length <= body_length for start, length in body_buffers)
+        body = data[offset + metadata_length:offset + metadata_length + body_length]
+        batches.append((rows, body_buffers, body))
+    return names, batches
+
+def test_columnar_export():
+    print()
+    print("=" * 60)
+    print("COLUMNAR EXPORT TEST")
+    print("=" * 60)
+    
+    transactions = list(TransactionGenerator(seed=31).generate(5000))
+    transactions[1]['amount'] = None
+    transactions[2]['description'] = 'Amafaranga – ✓'
+    # Without an offset a timestamp is UTC, whatever the host's time zone
+    transactions[3]['timestamp'] = '2024-05-01T10:00:00'
+    previous_tz = os.environ.get('TZ')
+    os.environ['TZ'] = 'Asia/Tokyo'
+    time.tzset()
+    with tempfile.TemporaryDirectory() as workdir:
+        json_path = os.path.join(workdir, 'transactions.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(transactions, f, indent=2, ensure_ascii=False)
+        
+        # The pure-Python writer, in batches smaller than the data
+        arrow_path = os.path.join(workdir, 'transactions.arrow')
+        assert export_transactions(iter(transactions), arrow_path, batch_size=2000, use_pyarrow=False) == 5000
+        with open(arrow_path, 'rb') as f:
+            data = f.read()
+        
+        # The footer, block index and record batch framing, checked without pyarrow
+        names, batches = _read_arrow_file(data)
+        assert names == [name for name, _ in COLUMNS]
+        assert [rows for rows, _, _ in batches] == [2000, 2000, 1000]
+        # timestamp is the 7th column; the id, amount and timestamp columns have 2 buffers, strings 3
+        timestamp_data = sum(2 if arrow_type in ('int64', 'float64', 'timestamp') else 3
+                             for _, arrow_type in COLUMNS[:6]) + 1
+        rows, buffers, body = batches[0]
+        start, _ = buffers[timestamp_data]
+        assert struct.unpack_from('<q', body, start + 3 * 8)[0] == 1714557600
+        print(f"JSON {os.path.getsize(json_path):,} bytes, Arrow IPC {len(data):,} bytes in {len(batches)} record batches")
+        
+        if pyarrow is None:
+            print("pyarrow not installed; skipping the read-back and Parquet checks")
+        else:
+            table = pyarrow.ipc.open_file(arrow_path).read_all()
+            table.validate(full=True)
+            rows = table.to_pylist()
+            assert len(rows) == 5000 and rows[1]['amount'] is None and rows[2]['description'] == 'Amafaranga – ✓'
+            assert [row['reference'] for row in rows] == [t['reference'] for t in transactions]
+            parquet_path = os.path.join(workdir, 'transactions.parquet')
+            export_transactions(transactions, parquet_path, batch_size=2000)
+            parquet = pyarrow.parquet.ParquetFile(parquet_path)
+            # Parquet has no seconds unit, so its timestamps come back as milliseconds with equal values
+            assert parquet.metadata.num_row_groups == 3 and parquet.read().to_pylist() == rows
+            print(f"Parquet {os.path.getsize(parquet_path):,} bytes in {parquet.metadata.num_row_groups} row groups")
+    if previous_tz is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = previous_tz
+    time.tzset()
+    print()
+
+def test_profiling():
+    print()
+    print("=" * 60)
+    print("PROFILING TEST")
+    print("=" * 60)
+    
+    import threading
+    
+    def profiled_on_worker_thread():
+        return sum(i * i for i in range(10000))
+    
+    # A thread that outlives stop() must stop being profiled too
+    stopped = threading.Event()
+    after_stop = {}
+    
+    def running_across_stop():
+        profiled_on_worker_thread()
+        stopped.wait()
+        after_stop['profile'] = sys.getprofile()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        profiler = StageProfiler(workdir, 'test')
+        profiler.start()
+        try:
+            worker = threading.Thread(target=profiled_on_worker_thread)
+            worker.start()
+            worker.join()
+            long_running = threading.Thread(target=running_across_stop)
+            long_running.start()
+            prefix = profiler.dump()
+        finally:
+            profiler.stop()
+            stopped.set()
+        long_running.join()
+        with open(f'{prefix}-functions.txt', encoding='utf-8') as f:
+            functions = f.read()
+        assert 'profiled_on_worker_thread' in functions
+        assert after_stop['profile'] is None and sys.getprofile() is None
+        print(f"Worker thread function found in the dump ({len(profiler.thread_profiles)} thread profile(s))")
+    print()
+
 def main():
     # Test XML parsing
     transactions = test_xml_parsing()
@@ -168,6 +775,45 @@ def main():
     # Test data structures
     test_data_structures()
     
+    # Test duplicate detection
+    test_duplicate_detection()
+    
+    # Test synthetic data generation
+    test_data_generator()
+    
+    # Test XML parser backends
+    test_xml_backends()
+    
+    # Test reading compressed exports
+    test_compressed_input()
+    
+    # Test batch query execution
+    test_query_engine()
+    
+    # Test probabilistic sketches
+    test_sketches()
+    
+    # Test counterparty graph
+    test_graph_index()
+    
+    # Test running balances
+    test_balance_ledger()
+    
+    # Test time-partitioned segments
+    test_time_segments()
+    
+    # Test index selection for filtered queries
+    test_query_planner()
+    
+    # Test streaming anomaly detection
+    test_anomaly_detection()
+    
+    # Test Arrow IPC / Parquet export
+    test_columnar_export()
+    
+    # Test profiling of threads other than the main one
+    test_profiling()
+    
     print()
     print("=" * 60)
     print("DSA TESTING COMPLETE")
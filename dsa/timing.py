@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import math
+import time
+from typing import Callable, Sequence, Dict, Any, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _run_batch(func: Callable, args_list: Sequence[tuple], batch_size: int, offset: int) -> int:
+    count = len(args_list)
+    batch = [args_list[(offset + i) % count] for i in range(batch_size)]
+    start = time.perf_counter_ns()
+    for args in batch:
+        func(*args)
+    return time.perf_counter_ns() - start
+
+
+def measure(func: Callable, args_list: Sequence[tuple] = ((),), warmup_batches: int = 2,
+            repeats: int = 30, min_batch_ns: int = 2_000_000, max_total_ns: int = 2_000_000_000) -> Dict[str, Any]:
+    """Time func over args_list with perf_counter_ns.
+
+    Calls are grouped into batches long enough (min_batch_ns) for the clock to
+    resolve sub-microsecond operations; percentiles are over per-call batch means.
+    """
+    # Calibrate the batch size by doubling until a batch is long enough to time
+    batch_size = 1
+    elapsed = _run_batch(func, args_list, batch_size, 0)
+    while elapsed < min_batch_ns and batch_size < 1 << 20:
+        batch_size *= 2
+        elapsed = _run_batch(func, args_list, batch_size, batch_size)
+
+    for i in range(warmup_batches):
+        _run_batch(func, args_list, batch_size, i * batch_size)
+
+    samples = []
+    total_ns = 0
+    for i in range(repeats):
+        elapsed = _run_batch(func, args_list, batch_size, i * batch_size)
+        samples.append(elapsed / batch_size)
+        total_ns += elapsed
+        if total_ns >= max_total_ns:
+            break
+
+    samples.sort()
+    mean_ns = sum(samples) / len(samples)
+    variance = sum((s - mean_ns) ** 2 for s in samples) / len(samples)
+    return {
+        'calls': batch_size * len(samples),
+        'batch_size': batch_size,
+        'repeats': len(samples),
+        'mean_ns': mean_ns,
+        'stdev_ns': math.sqrt(variance),
+        'min_ns': samples[0],
+        'p50_ns': percentile(samples, 0.50),
+        'p90_ns': percentile(samples, 0.90),
+        'p99_ns': percentile(samples, 0.99),
+        'max_ns': samples[-1],
+        'ops_per_sec': 1e9 / mean_ns if mean_ns > 0 else float('inf')
+    }
+
+
+def call_overhead_ns() -> float:
+    # Cost of the benchmark loop itself; lookups near this figure are loop-bound
+    def noop(*args):
+        return None
+    return measure(noop, ((1,),), repeats=10)['p50_ns']
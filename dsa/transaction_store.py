@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+import threading
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Callable
+
+from search_algorithms import TransactionSearch
+
+
+class DuplicateReferenceError(ValueError):
+    def __init__(self, reference: str, existing_id: int):
+        super().__init__(f"Transaction with reference {reference} already exists (ID {existing_id})")
+        self.reference = reference
+        self.existing_id = existing_id
+
+
+def _check_timestamp(value: Any):
+    # Sorted indexes, time segments and the ledger compare timestamps as ISO 8601 strings
+    try:
+        datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"timestamp must be an ISO 8601 string, got {value!r}") from None
+
+
+# Hashed, sketched and compared as text by the indexes and store listeners
+STRING_FIELDS = ('type', 'sender', 'receiver', 'status', 'reference')
+
+
+def _check_strings(data: Dict[str, Any]):
+    for field in STRING_FIELDS:
+        if field in data and not isinstance(data[field], str):
+            raise ValueError(f"{field} must be a string, got {data[field]!r}")
+
+
+class StoreBusyError(Exception):
+    # Raised by a write gate that cannot accept another write yet; retry_after is in seconds
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransactionStore:
+    """In-memory transaction data shared by all API requests.
+
+    Mirrors the UNIQUE constraint on Transactions.reference_number and keeps the
+    search indexes up to date incrementally instead of rebuilding them per write.
+    """
+
+    def __init__(self, transactions: List[Dict[str, Any]]):
+        self.search_engine = TransactionSearch(transactions)
+        self._lock = threading.RLock()
+        self._next_id = max((t['id'] for t in transactions if t.get('id') is not None), default=0) + 1
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._write_gates: List[Callable[[], None]] = []
+        # Number of changes applied so far; stores replaying the same changes agree on it
+        self.version = 0
+
+    @property
+    def transactions(self) -> List[Dict[str, Any]]:
+        return self.search_engine.transactions
+
+    def __len__(self) -> int:
+        return len(self.search_engine.transactions)
+
+    def add_listener(self, listener: Callable[[str, Dict[str, Any]], None]):
+        # Called as listener(op, transaction) after every change, with op one of
+        # 'create', 'update' or 'delete', while the store lock is still held
+        self._listeners.append(listener)
+
+    def add_write_gate(self, gate: Callable[[], None]):
+        # Called as gate() before every create, update or delete, without the store lock held.
+        # A gate may block to slow writers down or raise StoreBusyError to refuse the write
+        self._write_gates.append(gate)
+
+    def _admit_write(self):
+        for gate in self._write_gates:
+            gate()
+
+    def _notify(self, op: str, transaction: Dict[str, Any]):
+        self.version += 1
+        for listener in self._listeners:
+            listener(op, transaction)
+
+    def refresh(self):
+        # Hook for stores that receive changes made elsewhere; nothing to do here
+        pass
+
+    def reference_index(self):
+        index = self.search_engine.reference_dict
+        if index is None:
+            with self._lock:
+                index = self.search_engine.reference_index()
+        return index
+
+    def sorted_index(self, field: str):
+        # Built under the lock so no concurrent write is missed while it is constructed
+        index = self.search_engine.sorted_indexes.get(field)
+        if index is None:
+            with self._lock:
+                index = self.search_engine.sorted_index(field)
+        return index
+
+    def value_index(self, field: str):
+        index = self.search_engine.value_indexes.get(field)
+        if index is None:
+            with self._lock:
+                index = self.search_engine.value_index(field)
+        return index
+
+    def time_segments(self):
+        # Shares the store lock, so range queries and compaction swaps never interleave with a write
+        index = self.search_engine.time_index
+        if index is None:
+            with self._lock:
+                index = self.search_engine.time_segments(self._lock)
+        return index
+
+    def time_range(self, start: str, end: str) -> List[Dict[str, Any]]:
+        self.time_segments()
+        return self.search_engine.segment_search_by_time_range(start, end)
+
+    def get(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        return self.search_engine.dictionary_lookup_by_id(transaction_id)
+
+    def get_by_reference(self, reference: str) -> Optional[Dict[str, Any]]:
+        return self.reference_index().get(reference)
+
+    def _check_reference_available(self, reference: Optional[str], transaction_id: Optional[int] = None):
+        existing = self.search_engine.dictionary_lookup_by_reference(reference) if reference else None
+        if existing is not None and existing['id'] != transaction_id:
+            raise DuplicateReferenceError(reference, existing['id'])
+
+    def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        amount = float(data['amount'])
+        _check_strings(data)
+        if 'timestamp' in data:
+            _check_timestamp(data['timestamp'])
+        self._admit_write()
+
+        with self._lock:
+            new_id = self._next_id
+            reference = data.get('reference', f'TXN{new_id:09d}')
+            self._check_reference_available(reference)
+
+            transaction = {
+                'id': new_id,
+                'type': data['type'],
+                'amount': amount,
+                'currency': data.get('currency', 'RWF'),
+                'sender': data['sender'],
+                'receiver': data['receiver'],
+                # Without one, a transaction happened when it was received
+                'timestamp': data.get('timestamp') or datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'status': data.get('status', 'Completed'),
+                'reference': reference,
+                'description': data.get('description', '')
+            }
+
+            self.search_engine.add_transaction(transaction)
+            self._next_id = new_id + 1
+            self._notify('create', transaction)
+            return transaction
+
+    def update(self, transaction_id: int, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        self._admit_write()
+        with self._lock:
+            transaction = self.get(transaction_id)
+            if transaction is None:
+                return None
+
+            # Validate everything before touching the stored record; the id is immutable
+            updates = {}
+            for field, value in changes.items():
+                if field in transaction and field != 'id':
+                    updates[field] = float(value) if field == 'amount' else value
+
+            _check_strings(updates)
+            if 'timestamp' in updates:
+                _check_timestamp(updates['timestamp'])
+            if 'reference' in updates:
+                self._check_reference_available(updates['reference'], transaction_id)
+
+            old_values = {field: transaction.get(field) for field in updates}
+            transaction.update(updates)
+            self.search_engine.reindex(transaction, old_values)
+            self._notify('update', transaction)
+            return transaction
+
+    def delete(self, transaction_id: int) -> Optional[Dict[str, Any]]:
+        self._admit_write()
+        with self._lock:
+            transaction = self.search_engine.remove_transaction(transaction_id)
+            if transaction is not None:
+                self._notify('delete', transaction)
+            return transaction
+
+    def apply_change(self, op: str, transaction: Dict[str, Any]):
+        # Replays a change already validated by another store (e.g. a replica following its owner)
+        with self._lock:
+            existing = self.get(transaction['id'])
+            if op == 'delete':
+                if existing is not None:
+                    self.search_engine.remove_transaction(transaction['id'])
+            elif existing is None:
+                transaction = dict(transaction)
+                self.search_engine.add_transaction(transaction)
+                self._next_id = max(self._next_id, transaction['id'] + 1)
+            else:
+                old_values = {field: existing.get(field) for field in transaction}
+                existing.update(transaction)
+                self.search_engine.reindex(existing, old_values)
+                transaction = existing
+            self._notify(op, transaction)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+from typing import List, Dict, Any
+
+
+# Key for values that cannot be hashed (e.g. a list stored by an update); such rows match no filter
+_UNHASHABLE = object()
+
+
+class ValueIndex:
+    """Hash index from each value of one field to the transactions holding it.
+
+    Rows of a value are kept in insertion order. The per-value counts double as
+    the statistics the query planner estimates selectivity from.
+    """
+
+    def __init__(self, field: str, transactions: List[Dict[str, Any]]):
+        self.field = field
+        self.rows: Dict[Any, Dict[int, Dict[str, Any]]] = {}
+        for transaction in transactions:
+            self.add(transaction)
+
+    @staticmethod
+    def _key(value: Any, transaction_id: int) -> Any:
+        try:
+            hash(value)
+        except TypeError:
+            return (_UNHASHABLE, transaction_id)
+        return value
+
+    def __len__(self) -> int:
+        # Number of distinct values
+        return len(self.rows)
+
+    def add(self, transaction: Dict[str, Any]):
+        key = self._key(transaction.get(self.field), transaction['id'])
+        self.rows.setdefault(key, {})[transaction['id']] = transaction
+
+    def remove(self, transaction_id: int, value: Any):
+        key = self._key(value, transaction_id)
+        rows = self.rows.get(key)
+        if rows is not None:
+            rows.pop(transaction_id, None)
+            if not rows:
+                del self.rows[key]
+
+    def count(self, value: Any) -> int:
+        try:
+            return len(self.rows.get(value, ()))
+        except TypeError:
+            return 0
+
+    def get(self, value: Any) -> List[Dict[str, Any]]:
+        try:
+            return list(self.rows.get(value, {}).values())
+        except TypeError:
+            return []
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import re
+import gzip
+import lzma
+import importlib.util
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+BACKEND_ENV_VAR = 'MOMO_XML_BACKEND'
+# Child elements of <transaction>, in the order data/raw/modified_sms_v2.xml writes them
+TRANSACTION_FIELDS = ('type', 'amount', 'currency', 'sender', 'receiver',
+                      'timestamp', 'status', 'reference', 'description')
+RECORD_FIELDS = ('id',) + TRANSACTION_FIELDS
+SCANNER_CHUNK_SIZE = 1 << 20
+# Read size for the file and the decompressor, so small parser reads never reach the disk
+READ_BUFFER_SIZE = 1 << 20
+# Leading bytes of each supported archive format; anything else is read as plain XML
+COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd')
+)
+# Errors a damaged archive raises while decompressing
+DECOMPRESSION_ERRORS = (EOFError, gzip.BadGzipFile, lzma.LZMAError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+@lru_cache(maxsize=None)
+def _lxml_available() -> bool:
+    # lxml costs ~10ms to import and the default scanner never needs it, so only look it up here
+    return importlib.util.find_spec('lxml') is not None
+
+
+class UnsupportedLayout(Exception):
+    """Raised by the scanner for input outside the fixed layout it understands."""
+
+
+def detect_compression(path: str) -> Optional[str]:
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, compression in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+@contextmanager
+def open_xml(path: str) -> Iterator[BinaryIO]:
+    """Binary stream of the XML in path, decompressing .gz, .xz and .zst on the fly.
+
+    The format is detected from the file's leading bytes, not its name. Nothing
+    is written to disk; reads are buffered in READ_BUFFER_SIZE blocks on both
+    sides of the decompressor.
+    """
+    compression = detect_compression(path)
+    raw = open(path, 'rb', buffering=READ_BUFFER_SIZE)
+    try:
+        if compression is None:
+            yield raw
+            return
+        if compression == 'gzip':
+            decompressed = gzip.GzipFile(fileobj=raw, mode='rb')
+        elif compression == 'xz':
+            decompressed = lzma.LZMAFile(raw, mode='rb')
+        elif zstandard is not None:
+            decompressed = zstandard.ZstdDecompressor().stream_reader(raw, read_size=READ_BUFFER_SIZE)
+        else:
+            raise ValueError(f"{path} is zstd-compressed; reading it requires the zstandard package")
+        with io.BufferedReader(decompressed, buffer_size=READ_BUFFER_SIZE) as stream:
+            yield stream
+    finally:
+        raw.close()
+
+
+class ElementTreeBackend:
+    name = 'etree'
+
+    def records(self, source) -> Iterator[Dict[str, str]]:
+        # Yields {'id': ..., field: text} per <transaction>; missing fields are ''
+        context = ET.iterparse(source, events=('start', 'end'))
+        _, root = next(context)
+        for event, element in context:
+            if event != 'end' or element.tag != 'transaction':
+                continue
+            record = dict.fromkeys(TRANSACTION_FIELDS, '')
+            # One pass over the children; walking backwards lets the first occurrence win, as with find()
+            for child in reversed(element):
+                if child.tag in record:
+                    record[child.tag] = child.text or ''
+            record['id'] = element.get('id')
+            # Drop processed elements so the tree never grows
+            root.clear()
+            yield record
+
+
+class LxmlBackend:
+    name = 'lxml'
+
+    def records(self, source) -> Iterator[Dict[str, str]]:
+        from lxml import etree as lxml_etree
+        try:
+            for _, element in lxml_etree.iterparse(source, events=('end',), tag='transaction'):
+                record = dict.fromkeys(TRANSACTION_FIELDS, '')
+                for child in reversed(element):
+                    if child.tag in record:
+                        record[child.tag] = child.text or ''
+                record['id'] = element.get('id')
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+                yield record
+        except lxml_etree.XMLSyntaxError as e:
+            # Callers handle one exception type whichever backend is in use
+            raise ET.ParseError(str(e)) from e
+
+
+_PROLOG = re.compile(rb'(?:\xef\xbb\xbf)?(?:<\?xml[^>]*?encoding=["\']utf-8["\'][^>]*\?>)?\s*<([A-Za-z_][\w.-]*)>',
+                     re.IGNORECASE)
+_RECORD = re.compile(r'<transaction id="([^"<&]*)">\s*'
+                     + ''.join(rf'<{field}>([^<]*)</{field}>\s*' for field in TRANSACTION_FIELDS)
+                     + r'</transaction>')
+_RECORD_END = b'</transaction>'
+_ENTITY = re.compile(r'&(#x[0-9a-fA-F]+|#[0-9]+|amp|lt|gt|quot|apos);')
+_NAMED_ENTITIES = {'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"', 'apos': "'"}
+
+
+def _replace_entity(match) -> str:
+    name = match.group(1)
+    if name.startswith('#x'):
+        return chr(int(name[2:], 16))
+    if name.startswith('#'):
+        return chr(int(name[1:]))
+    return _NAMED_ENTITIES[name]
+
+
+def _unescape(value: str) -> str:
+    unescaped = _ENTITY.sub(_replace_entity, value)
+    if '&' in _ENTITY.sub('', value):
+        raise UnsupportedLayout('unknown entity reference')
+    return unescaped
+
+
+class ScannerBackend:
+    """Single-pass regex scanner over the raw file for the fixed <transaction> layout.
+
+    Reads 1 MiB chunks, decodes each once and matches whole records with one
+    compiled pattern, so no element objects are built. Anything it does not recognise (other
+    attributes, missing or reordered fields, comments, CDATA, other encodings)
+    raises UnsupportedLayout instead of being skipped.
+    """
+
+    name = 'scanner'
+
+    def records(self, source) -> Iterator[Dict[str, str]]:
+        stream = open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source
+        try:
+            head = stream.read(SCANNER_CHUNK_SIZE)
+            prolog = _PROLOG.match(head)
+            if prolog is None:
+                raise UnsupportedLayout('unrecognised XML declaration or root element')
+            closing_tag = b'</' + prolog.group(1) + b'>'
+            buffer = head[prolog.end():]
+            while True:
+                data = stream.read(SCANNER_CHUNK_SIZE)
+                buffer += data
+                cut = buffer.rfind(_RECORD_END)
+                if cut == -1 and data:
+                    continue
+                cut = cut + len(_RECORD_END) if cut != -1 else 0
+                yield from self._scan(buffer[:cut])
+                buffer = buffer[cut:]
+                if not data:
+                    break
+            if buffer.strip() != closing_tag:
+                raise UnsupportedLayout('unexpected content after the last transaction')
+        finally:
+            if stream is not source:
+                stream.close()
+
+    def _scan(self, block: bytes) -> Iterator[Dict[str, str]]:
+        # Blocks end right after a </transaction>, so they always decode whole
+        try:
+            text = block.decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise UnsupportedLayout(f'invalid UTF-8 ({e.reason})')
+        if '<!' in text or '<?' in text or '\r' in text:
+            raise UnsupportedLayout('comments, CDATA, processing instructions or CR line endings')
+        has_entities = '&' in text
+        position = 0
+        for match in _RECORD.finditer(text):
+            if match.start() != position and text[position:match.start()].strip():
+                raise UnsupportedLayout(f'unrecognised content at character {position} of a chunk')
+            position = match.end()
+            values = match.groups()
+            if has_entities:
+                values = [_unescape(value) if '&' in value else value for value in values]
+            yield dict(zip(RECORD_FIELDS, values))
+        if text[position:].strip():
+            raise UnsupportedLayout(f'unrecognised content at character {position} of a chunk')
+
+
+BACKENDS = {
+    'scanner': ScannerBackend,
+    'lxml': LxmlBackend,
+    'etree': ElementTreeBackend
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name in BACKENDS if name != 'lxml' or _lxml_available()]
+
+
+def get_backend(name: Optional[str] = None):
+    """Backend by name, or 'auto' (the default, overridable with MOMO_XML_BACKEND).
+
+    'auto' picks the scanner; the parser falls back to fallback_backend() when
+    the scanner meets a layout it does not handle.
+    """
+    name = (name or os.environ.get(BACKEND_ENV_VAR) or 'auto').lower()
+    if name == 'auto':
+        name = 'scanner'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown XML backend '{name}' (choose from auto, {', '.join(BACKENDS)})")
+    if name == 'lxml' and not _lxml_available():
+        raise ValueError("XML backend 'lxml' requires the lxml package (pip install lxml)")
+    return BACKENDS[name]()
+
+
+def fallback_backend():
+    # Full XML parser for input the scanner rejects: lxml when installed, else ElementTree
+    return LxmlBackend() if _lxml_available() else ElementTreeBackend()
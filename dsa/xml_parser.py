@@ -2,67 +2,146 @@
 
 import os
 import json
+import argparse
+import itertools
 import xml.etree.ElementTree as ET
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
+
+from bloom_filter import BloomFilter
+from xml_backends import (UnsupportedLayout, DECOMPRESSION_ERRORS, get_backend, fallback_backend,
+                          available_backends, detect_compression, open_xml)
+
+
+# Rough on-disk size of one <transaction> record, used to size the Bloom filter
+# when the caller does not know how many records a file holds
+ESTIMATED_RECORD_BYTES = 256
+# Upper end of what gzip/xz/zstd achieve on this layout, for sizing from a compressed file
+ESTIMATED_COMPRESSION_RATIO = 20
+
+
+class _ReferenceSet:
+    # Exact counterpart of BloomFilter.add() for inputs that fit in memory anyway
+    def __init__(self):
+        self.references = set()
+
+    def add(self, reference: str) -> bool:
+        if reference in self.references:
+            return True
+        self.references.add(reference)
+        return False
 
 
 class SMSDataParser:
-    def __init__(self, xml_file_path: str):
+    def __init__(self, xml_file_path: str, deduplicate: bool = True, backend: Optional[str] = None):
         self.xml_file_path = xml_file_path
+        self.deduplicate = deduplicate
+        # 'auto', 'scanner', 'lxml' or 'etree' (see xml_backends); None reads MOMO_XML_BACKEND
+        self.backend = get_backend(backend)
         self.transactions = []
+        self.duplicates_skipped = 0
         
     def parse_xml(self) -> List[Dict[str, Any]]:
 
         try:
-            # Parse the XML file
-            tree = ET.parse(self.xml_file_path)
-            root = tree.getroot()
-            
-            # Extract transaction data
-            for transaction in root.findall('transaction'):
-                transaction_data = self._extract_transaction_data(transaction)
-                if transaction_data:
+            # Extract transaction data, dropping re-delivered messages in the same pass
+            seen_references = _ReferenceSet() if self.deduplicate else None
+            for record in self._records():
+                transaction_data = self._extract_transaction_data(record)
+                if transaction_data and not self._is_duplicate(transaction_data, seen_references):
                     self.transactions.append(transaction_data)
             
             print(f"Successfully parsed {len(self.transactions)} transactions from XML")
+            if self.duplicates_skipped:
+                print(f"Skipped {self.duplicates_skipped} duplicate transactions (same reference)")
             return self.transactions
             
         except ET.ParseError as e:
             print(f"XML parsing error: {e}")
+            self.transactions = []
             return []
         except FileNotFoundError:
             print(f"XML file not found: {self.xml_file_path}")
+            self.transactions = []
             return []
         except Exception as e:
             print(f"Unexpected error during parsing: {e}")
+            self.transactions = []
             return []
     
-    def _extract_transaction_data(self, transaction_element) -> Dict[str, Any]:
+    def iter_transactions(self, expected_count: Optional[int] = None,
+                          false_positive_rate: float = 1e-6) -> Iterator[Dict[str, Any]]:
+        # Streaming counterpart of parse_xml(): constant memory regardless of file size.
+        # Duplicates are filtered with a Bloom filter, so a unique record is dropped
+        # with probability at most false_positive_rate; duplicates_skipped reports drops.
+        seen_references = None
+        if self.deduplicate:
+            if expected_count is None:
+                try:
+                    expected_count = os.path.getsize(self.xml_file_path) // ESTIMATED_RECORD_BYTES
+                    if detect_compression(self.xml_file_path):
+                        expected_count *= ESTIMATED_COMPRESSION_RATIO
+                except OSError:
+                    expected_count = 0
+            seen_references = BloomFilter(expected_count, false_positive_rate)
+        
+        try:
+            for record in self._records():
+                transaction_data = self._extract_transaction_data(record)
+                if transaction_data and not self._is_duplicate(transaction_data, seen_references):
+                    yield transaction_data
+                    
+        except ET.ParseError as e:
+            print(f"XML parsing error: {e}")
+        except FileNotFoundError:
+            print(f"XML file not found: {self.xml_file_path}")
+    
+    def _records(self) -> Iterator[Dict[str, str]]:
+        # Raw records in document order from the selected backend, decompressing on the fly.
+        # If the scanner meets a layout it does not handle, a full XML parser takes over
+        # where it stopped.
+        consumed = 0
+        try:
+            try:
+                with open_xml(self.xml_file_path) as stream:
+                    for record in self.backend.records(stream):
+                        consumed += 1
+                        yield record
+                return
+            except UnsupportedLayout as e:
+                fallback = fallback_backend()
+                print(f"{self.backend.name} backend cannot read {self.xml_file_path} ({e}); using {fallback.name}")
+                self.backend = fallback
+            with open_xml(self.xml_file_path) as stream:
+                yield from itertools.islice(self.backend.records(stream), consumed, None)
+        except DECOMPRESSION_ERRORS as e:
+            raise ET.ParseError(f"corrupt compressed input: {e}") from e
+    
+    def _is_duplicate(self, transaction_data: Dict[str, Any], seen_references) -> bool:
+        reference = transaction_data.get('reference')
+        if seen_references is None or not reference:
+            return False
+        if seen_references.add(reference):
+            self.duplicates_skipped += 1
+            return True
+        return False
+    
+    def _extract_transaction_data(self, record: Dict[str, str]) -> Dict[str, Any]:
         try:
-            # Extract basic transaction information
-            transaction_id = transaction_element.get('id')
-            transaction_type = self._get_element_text(transaction_element, 'type')
-            amount = self._get_element_text(transaction_element, 'amount')
-            currency = self._get_element_text(transaction_element, 'currency')
-            sender = self._get_element_text(transaction_element, 'sender')
-            receiver = self._get_element_text(transaction_element, 'receiver')
-            timestamp = self._get_element_text(transaction_element, 'timestamp')
-            status = self._get_element_text(transaction_element, 'status')
-            reference = self._get_element_text(transaction_element, 'reference')
-            description = self._get_element_text(transaction_element, 'description')
+            transaction_id = record['id']
+            amount = record['amount']
             
             # Validate and convert data types
             transaction_data = {
                 'id': int(transaction_id) if transaction_id else None,
-                'type': transaction_type,
+                'type': record['type'],
                 'amount': float(amount) if amount else 0.0,
-                'currency': currency or 'RWF',
-                'sender': sender,
-                'receiver': receiver,
-                'timestamp': timestamp,
-                'status': status,
-                'reference': reference,
-                'description': description
+                'currency': record['currency'] or 'RWF',
+                'sender': record['sender'],
+                'receiver': record['receiver'],
+                'timestamp': record['timestamp'],
+                'status': record['status'],
+                'reference': record['reference'],
+                'description': record['description']
             }
             
             return transaction_data
@@ -71,11 +150,6 @@ class SMSDataParser:
             print(f"Error extracting transaction data: {e}")
             return None
     
-    def _get_element_text(self, parent_element, tag_name: str) -> str:
-
-        element = parent_element.find(tag_name)
-        return element.text if element is not None and element.text else ""
-    
     def save_to_json(self, output_file_path: str) -> bool:
 
         try:
@@ -89,6 +163,21 @@ class SMSDataParser:
             print(f"Error saving to JSON: {e}")
             return False
     
+    def save_columnar(self, output_file_path: str, fmt: Optional[str] = None,
+                      batch_size: Optional[int] = None) -> bool:
+        # Streams iter_transactions() into a Parquet or Arrow IPC file one batch at a time.
+        # columnar pulls in pyarrow, which would otherwise dominate the API server's startup
+        from columnar import DEFAULT_BATCH_ROWS, export_transactions
+        try:
+            count = export_transactions(self.iter_transactions(), output_file_path, fmt,
+                                        batch_size or DEFAULT_BATCH_ROWS)
+            print(f"Successfully exported {count} transactions to {output_file_path}")
+            return True
+            
+        except Exception as e:
+            print(f"Error exporting to {output_file_path}: {e}")
+            return False
+    
     def get_transactions(self) -> List[Dict[str, Any]]:
 
         return self.transactions
@@ -114,14 +203,47 @@ class SMSDataParser:
 
 
 def main():
+    from anomaly import AnomalyDetector
+    from profiling import enable_profiling
 
     # Get the directory of this script
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
-    xml_file_path = os.path.join(project_root, 'data', 'raw', 'modified_sms_v2.xml')
+    
+    arg_parser = argparse.ArgumentParser(description='Parse MoMo SMS XML into JSON')
+    arg_parser.add_argument('xml_file', nargs='?', default=os.path.join(project_root, 'data', 'raw', 'modified_sms_v2.xml'),
+                            help='XML file to parse (default: data/raw/modified_sms_v2.xml)')
+    arg_parser.add_argument('--profile', metavar='DIR', help='Write parse profiles to DIR (or set MOMO_PROFILE)')
+    arg_parser.add_argument('--backend', choices=['auto'] + available_backends(),
+                            help='XML backend (default: auto, or set MOMO_XML_BACKEND)')
+    arg_parser.add_argument('--columnar', metavar='PATH',
+                            help='Stream the file into a .parquet or .arrow file instead of writing JSON')
+    arg_parser.add_argument('--anomalies', action='store_true',
+                            help='Stream the file through the anomaly detector and print flags instead of writing JSON')
+    args = arg_parser.parse_args()
+    xml_file_path = args.xml_file
+    
+    profiler = enable_profiling('xml_parser', args.profile)
+    if profiler:
+        # When run as a script this module is __main__, not the xml_parser profiling imported
+        profiler.instrument(SMSDataParser, 'parse_xml', 'parse.parse_xml')
+        profiler.instrument(SMSDataParser, '_extract_transaction_data', 'parse.extract_transaction_data')
     
     # Initialize parser
-    parser = SMSDataParser(xml_file_path)
+    parser = SMSDataParser(xml_file_path, backend=args.backend)
+    
+    if args.columnar:
+        parser.save_columnar(args.columnar)
+        return
+    
+    if args.anomalies:
+        detector = AnomalyDetector()
+        for transaction in parser.iter_transactions():
+            for flag in detector.observe(transaction):
+                print(f"[{flag['kind']}] transaction {flag['transaction_id']} from {flag['sender']}: {flag['detail']}")
+        counts = ', '.join(f"{kind}: {count}" for kind, count in detector.counts.items())
+        print(f"\nChecked {detector.observed} transactions ({counts})")
+        return
     
     # Parse XML
     transactions = parser.parse_xml()